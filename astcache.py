@@ -0,0 +1,188 @@
+#!python3
+"""Persistent on-disk cache of the syntax trees.
+
+The cache directory contains one file per parsed source. The file name
+is the hash of the source content, of the analyzer, and of the analyzer
+fingerprint (the sources of the tool and the language rules); hence,
+a changed source or a new version of the tool never gets the stale tree.
+The trees are stored in the compact form (see syntree.Node.pack())
+serialized by the marshal module.
+
+More processes can share the directory. The entries are written via
+temporary files and atomically renamed; hence, a reader sees either
+the complete entry or none. The mtime of the entry is the time of its last
+use. The evict() removes the least recently used entries when the cache
+is bigger than max_bytes.
+"""
+
+import felex
+import fesyn
+import glob
+import hashlib
+import marshal
+import os
+import syntree
+import tsyn
+
+
+# Source files of the tool that affect the syntax trees.
+tool_files = {
+    'feature': ['fesyn.py', 'felex.py', 'syntree.py', 'spantoken.py',
+                'diagnostic.py'],
+    'catch':   ['tsyn.py', 'tlex.py', 'syntree.py', 'spantoken.py',
+                'lineindex.py', 'diagnostic.py'],
+}
+
+
+def feature_tree(source):
+    """Returns the syntax tree of the .feature source (string or file).
+    """
+    return fesyn.SyntacticAnalyzerForFeature(source).Start()
+
+
+def catch_tree(source):
+    """Returns the syntax tree of the Catch source (string or file).
+    """
+    return tsyn.SyntacticAnalyzerForCatch(source).Start()
+
+
+analyzers = {'feature': feature_tree, 'catch': catch_tree}
+
+
+def fingerprint(kind):
+    """Returns the hash of the analyzer for the kind of the source.
+
+    It covers the source files of the analyzer and, for the features,
+    the compiled language rules (they can be extended without changing
+    the sources).
+    """
+    h = hashlib.sha1(kind.encode('utf-8'))
+    tooldir = os.path.dirname(os.path.abspath(__file__))
+    for fname in tool_files[kind]:
+        with open(os.path.join(tooldir, fname), 'rb') as f:
+            h.update(f.read())
+    if kind == 'feature':
+        h.update(felex.ruleTable.rex.pattern.encode('utf-8'))
+    return h.hexdigest()
+
+
+class ASTCache:
+    """Size-bounded cache of the syntax trees in the directory.
+
+    The instance holds only the settings; hence, it can be passed to other
+    processes.
+    """
+
+    suffix = '.ast'
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fingerprints = {}
+        os.makedirs(directory, exist_ok=True)
+
+
+    def __getstate__(self):
+        return (self.directory, self.max_bytes)
+
+
+    def __setstate__(self, state):
+        self.directory, self.max_bytes = state
+        self.fingerprints = {}
+
+
+    def key(self, kind, content):
+        """Returns the key of the entry for the source content (bytes).
+        """
+        if kind not in self.fingerprints:
+            self.fingerprints[kind] = fingerprint(kind)
+        h = hashlib.sha1(self.fingerprints[kind].encode('ascii'))
+        h.update(content)
+        return h.hexdigest()
+
+
+    def entry_name(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+
+    def load(self, key):
+        """Returns the syntax tree for the key, or None if not cached.
+        """
+        fname = self.entry_name(key)
+        try:
+            with open(fname, 'rb') as f:
+                packed = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None                 # missing or broken, parse again
+        try:
+            os.utime(fname)             # recently used
+        except OSError:
+            pass                        # evicted meanwhile, or read-only
+        try:
+            return [syntree.unpack(item) for item in packed]
+        except (ValueError, TypeError):
+            return None
+
+
+    def store(self, key, tree):
+        """Stores the syntax tree for the key.
+
+        The cache is only an optimization; hence, the failed writing
+        (like the full disk) is ignored.
+        """
+        fname = self.entry_name(key)
+        tmpname = '{}.{}.tmp'.format(fname, os.getpid())
+        data = marshal.dumps([node.pack() for node in tree])
+        try:
+            with open(tmpname, 'wb') as f:
+                f.write(data)
+            os.replace(tmpname, fname)
+        except OSError:
+            try:
+                os.remove(tmpname)
+            except OSError:
+                pass
+
+
+    def parse(self, fname, kind):
+        """Returns the syntax tree of the file; the kind is 'feature' or 'catch'.
+
+        The file is parsed only when its tree is not in the cache.
+        """
+        with open(fname, 'rb') as f:
+            content = f.read()
+        key = self.key(kind, content)
+        tree = self.load(key)
+        if tree is None:
+            # Parsed from the file (not from the content) to get the same
+            # tree and the same error messages as without the cache.
+            with open(fname, encoding='utf_8') as f:
+                tree = analyzers[kind](f)
+            self.store(key, tree)
+        return tree
+
+
+    def evict(self):
+        """Removes the least recently used entries above the max_bytes.
+
+        The entries may be removed by the other processes at the same time.
+        """
+        entries = []
+        total = 0
+        for fname in glob.glob(os.path.join(self.directory, '*' + self.suffix)):
+            try:
+                st = os.stat(fname)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, fname))
+            total += st.st_size
+
+        entries.sort()
+        for mtime_ns, size, fname in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(fname)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,144 @@
+#!python3
+"""Registry of the backends that generate the outputs from the feature tree.
+
+The feature is parsed only once; the same syntax tree is passed to all
+the requested backends (see f2c.py --emit catch,python,json,markdown). Each backend
+is the function write(tree, emit) that passes the lines of its output
+to the emit sink (like outfile.LineWriter). New backends are registered
+by the decorator:
+
+    @backends.register('name', '.ext', 'directory')
+    def write_name(tree, emit):
+        ...
+
+The output of the backend for features/X.feature is directory/X.ext.
+The protected backend generates the skeleton that is meant to be filled
+in manually; when its output exists, the new one is written
+to directory/X.skeleton instead (see f2c.output_names()).
+"""
+
+import collections
+import json
+import os
+
+import f2c
+import pyskeleton
+
+from syntree import Kind
+
+
+Backend = collections.namedtuple('Backend', ['name', 'extension', 'directory',
+                                             'protect', 'write'])
+
+# Name --> Backend, in the order of the registration.
+registry = collections.OrderedDict()
+
+
+def register(name, extension, directory, protect=False):
+    """Decorator that registers the write function as the named backend.
+    """
+    def decorator(write):
+        registry[name] = Backend(name, extension, directory, protect, write)
+        return write
+    return decorator
+
+
+def names_arg(value):
+    """Converts the --emit command-line argument to the tuple of backend names.
+    """
+    names = tuple(name.strip() for name in value.split(',') if name.strip())
+    for name in names:
+        if name not in registry:
+            raise ValueError('unknown backend {!r} (known: {})'.format(
+                             name, ', '.join(registry)))
+    if not names:
+        raise ValueError('no backend')
+    return names
+
+
+def output_name(name, fname_in, root='.'):
+    """Returns the name of the output of the backend for the input file.
+    """
+    backend = registry[name]
+    base = os.path.splitext(os.path.basename(fname_in))[0]
+    return os.path.join(root, backend.directory, base + backend.extension)
+
+#-----------------------------------------------------------------------
+
+@register('catch', '.cpp', 'tests', protect=True)
+def write_catch(tree, emit):
+    """The Catch test skeleton.
+    """
+    f2c.write_catch_source(tree, emit)
+
+
+@register('python', '_test.py', 'pytests', protect=True)
+def write_python(tree, emit):
+    """The Python unittest skeleton (collected also by pytest).
+    """
+    pyskeleton.PythonCodeGenerator().write_skeleton(tree, emit)
+
+
+@register('json', '.json', 'json')
+def write_json(tree, emit):
+    """The syntax tree with the spans (line indices from 0) as JSON.
+    """
+    emit(json.dumps([json_node(node) for node in tree], indent=1))
+
+
+def json_node(node):
+    d = collections.OrderedDict()
+    d['symbol'] = node.symbol
+    if node.kind == Kind.DESCRIPTION:
+        d['lines'] = node.children
+    else:
+        d['text'] = node.text
+    d['start'] = node.start
+    d['end'] = node.end
+    if node.kind != Kind.DESCRIPTION and node.children is not None:
+        d['children'] = [json_node(child) for child in node.children]
+    return d
+
+
+# Labels of the items in the markdown documentation.
+markdown_labels = {
+    Kind.TEST_CASE: 'Test',
+    Kind.SCENARIO: 'Scenario',
+    Kind.SECTION: 'Section',
+    Kind.GIVEN: 'Given',
+    Kind.AND_GIVEN: 'and',
+    Kind.WHEN: 'When',
+    Kind.AND_WHEN: 'and',
+    Kind.THEN: 'Then',
+    Kind.AND_THEN: 'and',
+}
+
+
+@register('markdown', '.md', 'docs')
+def write_markdown(tree, emit, level=0):
+    """The documentation -- headings for the story and the scenarios,
+    the nested lists for the steps.
+    """
+    for node in tree:
+        if node.kind == Kind.STORY:
+            emit('# Story: ' + node.text)
+            emit('')
+        elif node.kind == Kind.FEATURE:
+            emit('# Feature: ' + node.text)
+            emit('')
+        elif node.kind == Kind.DESCRIPTION:
+            lines = [line.strip() for line in node.children]
+            while lines and not lines[-1]:
+                lines.pop()
+            for line in lines:
+                emit(line)
+            emit('')
+        elif node.kind in (Kind.SCENARIO, Kind.TEST_CASE):
+            emit('## {}: {}'.format(markdown_labels[node.kind], node.text))
+            emit('')
+            write_markdown(node.children, emit, 0)
+            emit('')
+        else:
+            emit('{}- **{}** {}'.format('  ' * level, markdown_labels[node.kind],
+                                       node.text))
+            write_markdown(node.children, emit, level + 1)
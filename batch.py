@@ -0,0 +1,103 @@
+#!python3
+"""Batch conversion of more files, possibly in parallel processes.
+
+The f2c and c2f scripts build the list of tasks -- the (fname_in, fname_out)
+pairs -- and pass it with their conversion function to the run(). The other
+functions of the files are run via the parallel_map().
+"""
+
+import concurrent.futures
+import itertools
+import os
+
+
+def convert_file(convert, fname_in, fname_out):
+    """Calls convert(fname_in, fname_out) and returns the error or None.
+
+    The exception is converted to the message so that one broken file
+    does not stop the batch.
+    """
+    try:
+        convert(fname_in, fname_out)
+    except Exception as e:
+        return '{}: {}'.format(type(e).__name__, e)
+    return None
+
+
+def run(convert, tasks, jobs=None):
+    """Converts the files of the tasks using the convert function.
+
+    The jobs is the number of the processes; None means the number of CPUs,
+    1 means the conversion in this process. The convert must be a module-level
+    function (it is passed to the other processes). Generates the tuples
+    (fname_in, fname_out, error) in the order of the tasks, whatever order
+    the files were converted in. The error is None for the converted file.
+    """
+    tasks = list(tasks)
+    fnames_in = [fname_in for fname_in, fname_out in tasks]
+    fnames_out = [fname_out for fname_in, fname_out in tasks]
+    errors = parallel_map(convert_file, itertools.repeat(convert, len(tasks)),
+                          fnames_in, fnames_out, jobs=jobs)
+    yield from zip(fnames_in, fnames_out, errors)
+
+
+def parallel_map(function, *iterables, jobs=None):
+    """Generates the function results for the arguments like the map().
+
+    The jobs is the number of the processes as for the run(). The function
+    must be a module-level one, and its arguments and results must be
+    picklable. The results are generated in the order of the arguments.
+    """
+    args = list(zip(*iterables))
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(args))
+
+    if jobs <= 1:
+        for a in args:
+            yield function(*a)
+        return
+
+    # The arguments are sent to the processes in chunks to lower the overhead
+    # for many small files. The map() returns the results in the order
+    # of the arguments.
+    chunksize = max(1, len(args) // (jobs * 4))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(function, *zip(*args), chunksize=chunksize)
+
+
+def jobs_arg(value):
+    """Converts the --jobs command-line argument to the positive int.
+    """
+    jobs = int(value)
+    if jobs < 1:
+        raise ValueError('jobs must be positive')
+    return jobs
+
+
+def report(results, out=print):
+    """Logs the results of the run(), returns the list of the failed ones.
+
+    The file names are shown relative to their parent directory like
+    'features/xxx.feature'.
+    """
+    failed = []
+    for fname_in, fname_out, error in results:
+        out(short_name(fname_in), '-->', short_name(fname_out))
+        if error is not None:
+            failed.append((fname_in, error))
+
+    if failed:
+        out('-----------------------------------------------------------')
+        out('{} file(s) failed:'.format(len(failed)))
+        for fname_in, error in failed:
+            out(short_name(fname_in) + ':', error)
+    return failed
+
+
+def short_name(fname):
+    """Returns the name of the file with its directory, like 'tests/xxx.cpp'.
+    """
+    path, name = os.path.split(fname)
+    path, subdir = os.path.split(path)
+    return os.path.join(subdir, name)
@@ -1,101 +1,131 @@
 #!python3
 """Catch code to feature definitions."""
 
+import argparse
+import astcache
+import batch
+import functools
 import tsyn
 import glob
+import manifest
 import os
+import outfile
+import parsecache
+import sys
 import textwrap
+import watch
+
+# Source files of the tool that affect the generated feature descriptions.
+# When any of them changes, all the files are generated again.
+tool_files = ['c2f.py', 'outfile.py', 'tsyn.py', 'tlex.py', 'syntree.py',
+              'spantoken.py', 'lineindex.py', 'diagnostic.py']
+
 
 class FeatureDescriptionGenerator:
     """Converts a syntax tree to the feature definition.
 
-    Returns the list of text lines of the feature definition.
+    The lines of the feature definition are passed to the sink -- the function
+    called with one line (like list.append, or outfile.LineWriter). See
+    the write_feature() and extract() methods.
     """
 
     def __init__(self):
         """Default settings initialization.
         """
 
-    def extract(self, syntax_tree):
-        """Returns list of lines of the feature definition from a syntax_tree.
+    def write_feature(self, syntax_tree, emit):
+        """Passes the lines of the feature definition from a syntax_tree to the emit.
+
+        Called recursively with the same emit; each line is emitted only once.
+        The syntax_tree may also be the stream of the top-level items.
         """
-        out = []
         for item in syntax_tree:
             sym = item[0]
             if sym == 'story':
-                out.append('Story: ' + item[1])
+                emit('Story: ' + item[1])
 
             elif sym == 'feature':
-                out.append('Feature: ' + item[1])
+                emit('Feature: ' + item[1])
 
             elif sym == 'description':
-                out.append('')
-                out.append('\n'.join(item[1]))
+                emit('')
+                emit('\n'.join(item[1]))
 
             elif sym == 'test_case':
-                out.append('')
-                out.append('Test: ' + item[1])
-                out.extend(self.extract(item[2]))
+                emit('')
+                emit('Test: ' + item[1])
+                self.write_feature(item[2], emit)
 
             elif sym == 'section':
-                out.append('  Sec: ' + item[1])
-                out.extend(self.extract(item[2]))
+                emit('  Sec: ' + item[1])
+                self.write_feature(item[2], emit)
 
             elif sym == 'scenario':
-                out.append('')
-                out.append('Scenario: ' + item[1])
-                out.extend(self.extract(item[2]))
+                emit('')
+                emit('Scenario: ' + item[1])
+                self.write_feature(item[2], emit)
 
             elif sym == 'given':
-                out.append('  Given ' + item[1])
-                out.extend(self.extract(item[2]))
+                emit('  Given ' + item[1])
+                self.write_feature(item[2], emit)
 
             elif sym == 'and_given':
-                out.append('  and ' + item[1])
-                out.extend(self.extract(item[2]))
+                emit('  and ' + item[1])
+                self.write_feature(item[2], emit)
 
             elif sym == 'when':
-                out.append('  When ' + item[1])
-                out.extend(self.extract(item[2]))
+                emit('  When ' + item[1])
+                self.write_feature(item[2], emit)
 
             elif sym == 'and_when':
-                out.append('  and ' + item[1])
-                out.extend(self.extract(item[2]))
+                emit('  and ' + item[1])
+                self.write_feature(item[2], emit)
 
             elif sym == 'then':
-                out.append('  Then ' + item[1])
-                out.extend(self.extract(item[2]))
+                emit('  Then ' + item[1])
+                self.write_feature(item[2], emit)
 
             elif sym == 'and_then':
-                out.append('  and ' + item[1])
-                out.extend(self.extract(item[2]))
+                emit('  and ' + item[1])
+                self.write_feature(item[2], emit)
             else:
                 raise NotImplementedError('Symbol: ' + sym)
+
+
+    def extract(self, syntax_tree):
+        """Returns list of lines of the feature definition from a syntax_tree.
+        """
+        out = []
+        self.write_feature(syntax_tree, out.append)
         return out
 
 
-def catch_to_feature(fname_in, fname_out):
+
+def catch_to_feature(fname_in, fname_out, cache=None):
     """Converts the source of a Catch test to the feature definition.
+
+    The cache is the optional astcache.ASTCache (or parsecache.TreeCache)
+    with the syntax trees.
     """
     # Open the input file with the Catch sourceand the output file with
     # *.feature file or the *.catch if the feature file already exist.
+    # The existing output file is replaced only when the content changes.
     with open(fname_in, encoding='utf_8') as fin, \
-         open(fname_out, 'w', encoding='utf_8') as fout:
-
-        # Get the syntax tree for the feature description.
-        sa = tsyn.SyntacticAnalyzerForCatch(fin)
-        tree = sa.Start()
-
-        ##???
-        with open('syn.bak', 'w', encoding='utf-8') as f:
-            f.write(repr(tree))
-
-        # Generate the lines of the skeleton from the syntaxt tree.
+         outfile.OutputFile(fname_out) as fout:
+
+        # Get the stream of the syntax tree items, and generate the lines
+        # of the feature description from it. The lines of each scenario
+        # are written before the next one is parsed.
+        # The cached tree is complete, and it is used instead.
+        if cache is not None:
+            items = cache.parse(fname_in, 'catch')
+        else:
+            items = tsyn.SyntacticAnalyzerForCatch(fin).iter_items()
         fg = FeatureDescriptionGenerator()
-        lst = fg.extract(tree)
 
         # Some reference to the tool.
         script_name = os.path.realpath(__file__)
+        lst = []
         lst.append('')
         lst.append('----------------------------------------------------------')
         lst.append('This file was generated by ' + script_name)
@@ -107,30 +137,25 @@ def catch_to_feature(fname_in, fname_out):
                     'want to convert it to the Catch test source.'))
         lst.append('See https://github.com/pepr/BDDtool.git')
 
-        # Write the result to the output file.
-        fout.write('\n'.join(lst))
-
-
-
-if __name__ == '__main__':
-
-    # Input directory with generated *.h or *.skeleton files.
-    tests_dir = os.path.realpath('./tests')
-    if not os.path.isdir(tests_dir):
-        os.makedirs(tests_dir)
+        # Write the result to the output file. The lines of the body go
+        # straight to the file; they are not collected.
+        write = outfile.LineWriter(fout)
+        fg.write_feature(items, write)
+        for line in lst:
+            write(line)
 
-    # Output directory with *.feature definitions.
-    features_dir = os.path.realpath('./features')
-    if not os.path.isdir(features_dir):
-        os.makedirs(features_dir)
 
+def tasks(tests_dir, features_dir):
+    """Returns the sorted list of (fname_in, fname_out) for the Catch sources.
+    """
     # build the list of input files with *.h and *.hpp extensions, delete
     # the catch.hpp.
     flst = [fname for fname in glob.glob(os.path.join(tests_dir, '*.hpp'))
                       if not fname.endswith('catch.hpp')]
     flst.extend(glob.glob(os.path.join(tests_dir, '*.h')))
 
-    for fname_in in flst:
+    lst = []
+    for fname_in in sorted(flst):
         path, bname = os.path.split(fname_in)
         name, ext = os.path.splitext(bname)
 
@@ -139,16 +164,80 @@ if __name__ == '__main__':
         fname_out = os.path.join(features_dir, name + '.feature')
         if os.path.isfile(fname_out):
             fname_out = os.path.join(features_dir, name + '.catch')
+        lst.append((fname_in, fname_out))
+    return lst
 
-        # Generate the output file.
-        path, name = os.path.split(fname_in)
-        path, subdir = os.path.split(path)
-        src = os.path.join(subdir, name)
 
-        path, name = os.path.split(fname_out)
-        path, subdir = os.path.split(path)
-        dest = os.path.join(subdir, name)
+if __name__ == '__main__':
 
-        print(src, '-->', dest)
+    parser = argparse.ArgumentParser(
+        description='Converts the Catch sources in tests/ to features/*.feature.')
+    parser.add_argument('-j', '--jobs', type=batch.jobs_arg, default=None,
+                        help='number of processes (default: number of CPUs)')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='convert all the files, even the unchanged ones')
+    parser.add_argument('--cache-dir',
+                        help='directory of the syntax tree cache (shared by the runs)')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='convert the files again whenever they change')
+    args = parser.parse_args()
+
+    # Input directory with generated *.h or *.skeleton files.
+    tests_dir = os.path.realpath('./tests')
+    if not os.path.isdir(tests_dir):
+        os.makedirs(tests_dir)
+
+    # Output directory with *.feature definitions.
+    features_dir = os.path.realpath('./features')
+    if not os.path.isdir(features_dir):
+        os.makedirs(features_dir)
 
-        catch_to_feature(fname_in, fname_out)
\ No newline at end of file
+    # The manifest remembers the converted sources. Only the changed ones
+    # are converted again (unless forced).
+    tooldir = os.path.dirname(os.path.realpath(__file__))
+    fingerprint = manifest.fingerprint(
+        [os.path.join(tooldir, fname) for fname in tool_files],
+        vars(FeatureDescriptionGenerator()))
+    mf = manifest.Manifest(os.path.join(features_dir, '.c2f.manifest'),
+                           fingerprint)
+    if args.force:
+        mf.clear()
+    lst = tasks(tests_dir, features_dir)
+    selected = mf.select(lst)
+
+    # The optional cache of the syntax trees is passed with the conversion
+    # function to the processes.
+    convert = catch_to_feature
+    cache = None
+    if args.cache_dir:
+        cache = astcache.ASTCache(args.cache_dir)
+        convert = functools.partial(catch_to_feature, cache=cache)
+
+    # Generate the output files. The errors are reported at the end.
+    results = batch.run(convert, selected, args.jobs)
+    failed = batch.report(mf.confirm(results))
+    mf.save()
+    if cache is not None:
+        cache.evict()
+    if len(selected) < len(lst):
+        print('{} file(s) up to date.'.format(len(lst) - len(selected)))
+
+    if args.watch:
+        # Only the touched sources are converted, and in this process;
+        # hence, the modules with the compiled lexer tables stay loaded,
+        # and the trees are kept in the memory (backed by the --cache-dir
+        # cache).
+        convert = functools.partial(catch_to_feature,
+                                    cache=parsecache.TreeCache(disk_cache=cache))
+
+        def on_change(paths):
+            changed = {os.path.abspath(path) for path in paths}
+            lst = [task for task in tasks(tests_dir, features_dir)
+                   if os.path.abspath(task[0]) in changed]
+            results = batch.run(convert, mf.select(lst, prune=False), 1)
+            batch.report(mf.confirm(results))
+            mf.save()
+
+        watch.run([tests_dir], ['*.hpp', '*.h'], on_change)
+
+    sys.exit(1 if failed else 0)
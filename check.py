@@ -0,0 +1,122 @@
+#!python3
+"""Checks that the Catch sources still match the feature descriptions.
+
+    python check.py [-j JOBS] [--merge-scenarios]
+
+Each features/X.feature is paired with tests/X.cpp (or .hpp, .h). Both files
+are parsed in parallel processes, and their normalized syntax trees are
+compared (see treediff). One line is printed for each pair; the differences
+are listed below it. No file is written. The exit code is 1 when some
+pair differs or cannot be compared.
+"""
+
+import argparse
+import glob
+import itertools
+import os
+import sys
+
+import batch
+import fesyn
+import syntree
+import treediff
+import tsyn
+
+from parsecache import catch_extensions
+
+
+def pairs(features_dir, tests_dir):
+    """Returns the sorted list of (fname_feature, fname_catch) for the features.
+
+    The fname_catch is None when the Catch source does not exist.
+    """
+    lst = []
+    for fname_feature in sorted(glob.glob(os.path.join(features_dir, '*.feature'))):
+        name = os.path.splitext(os.path.basename(fname_feature))[0]
+        fname_catch = None
+        for ext in catch_extensions:
+            fname = os.path.join(tests_dir, name + ext)
+            if os.path.isfile(fname):
+                fname_catch = fname
+                break
+        lst.append((fname_feature, fname_catch))
+    return lst
+
+
+def compare(fname_feature, fname_catch, merge=False):
+    """Returns (changes, error) for the pair of the files.
+
+    The changes is the list of treediff.Change objects. The exception
+    is converted to the error message (as in the batch.convert_file()).
+    With the merge, the scenarios of the feature are merged first -- as for
+    the skeleton generated by f2c.py --merge-scenarios.
+    """
+    try:
+        with open(fname_feature, encoding='utf-8') as f:
+            feature_tree = fesyn.SyntacticAnalyzerForFeature(f).Start()
+        with open(fname_catch, encoding='utf-8') as f:
+            catch_tree = tsyn.SyntacticAnalyzerForCatch(f).Start()
+    except Exception as e:
+        return None, '{}: {}'.format(type(e).__name__, e)
+    if merge:
+        feature_tree = syntree.merge_scenarios(feature_tree)
+    return treediff.diff(feature_tree, catch_tree), None
+
+
+def run(lst, jobs=None, merge=False):
+    """Compares the pairs, generates (fname_feature, fname_catch, changes, error).
+
+    The missing Catch source is reported as the error.
+    """
+    present = [(f, c) for f, c in lst if c is not None]
+    results = batch.parallel_map(compare, [f for f, c in present],
+                                 [c for f, c in present],
+                                 itertools.repeat(merge), jobs=jobs)
+    results = dict(zip(present, results))
+    for fname_feature, fname_catch in lst:
+        if fname_catch is None:
+            yield fname_feature, None, None, 'missing Catch source'
+        else:
+            changes, error = results[(fname_feature, fname_catch)]
+            yield fname_feature, fname_catch, changes, error
+
+
+def report(results, out=print):
+    """Logs the results of the run(), returns the numbers (differing, failed).
+    """
+    differing = failed = checked = 0
+    for fname_feature, fname_catch, changes, error in results:
+        checked += 1
+        names = batch.short_name(fname_feature)
+        if fname_catch is not None:
+            names += ' <-> ' + batch.short_name(fname_catch)
+        if error is not None:
+            out(names + ':', error)
+            failed += 1
+        elif changes:
+            out(names + ':', '{} difference(s)'.format(len(changes)))
+            for change in changes:
+                out('   ', str(change))
+            differing += 1
+        else:
+            out(names + ': ok')
+
+    out('-----------------------------------------------------------')
+    out('{} pair(s) checked, {} differ, {} failed.'.format(checked, differing,
+                                                          failed))
+    return differing, failed
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Checks that tests/*.cpp match features/*.feature.')
+    parser.add_argument('-j', '--jobs', type=batch.jobs_arg, default=None,
+                        help='number of processes (default: number of CPUs)')
+    parser.add_argument('--merge-scenarios', action='store_true',
+                        help='the skeletons were generated with the merged scenarios')
+    args = parser.parse_args()
+
+    differing, failed = report(run(pairs('./features', './tests'), args.jobs,
+                                   args.merge_scenarios))
+    sys.exit(1 if differing or failed else 0)
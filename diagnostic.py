@@ -0,0 +1,47 @@
+#!python3
+"""Structured diagnostics reported by the syntactic analyzers.
+"""
+
+import collections
+
+
+class Diagnostic(collections.namedtuple('Diagnostic',
+        ['source_name', 'line', 'column', 'expected', 'symbol', 'value',
+         'message'])):
+    """One problem found in the source.
+
+    The expected is the tuple of the expected symbols (empty when the problem
+    is not about an unexpected symbol), the symbol and the value describe
+    the actual token. The message is the human readable form.
+    """
+
+    __slots__ = ()
+
+    def __str__(self):
+        return self.message
+
+
+    def moved(self, line, column):
+        """Returns the copy of the diagnostic for the new position.
+
+        Used when the source in front of the problem was edited. The value
+        of the lexical error token contains the position, too.
+        """
+        value = self.value
+        if self.symbol == 'error' and isinstance(value, str):
+            value = value.replace('{}:{}:'.format(self.line, self.column),
+                                  '{}:{}:'.format(line, column), 1)
+        message = self.message.replace(repr(self.value), repr(value), 1)
+        old = 'line {}, column {}'.format(self.line, self.column)
+        new = 'line {}, column {}'.format(line, column)
+        return self._replace(line=line, column=column, value=value,
+                             message=message.replace(old, new, 1))
+
+
+class ParseError(RuntimeError):
+    """Syntax error with the structured diagnostic attached.
+    """
+
+    def __init__(self, diagnostic):
+        RuntimeError.__init__(self, diagnostic.message)
+        self.diagnostic = diagnostic
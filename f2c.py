@@ -1,15 +1,56 @@
 #!python3
 """Feature to Catch skeleton."""
 
+import argparse
+import astcache
+import backends
+import batch
+import functools
 import fesyn
 import glob
+import manifest
 import os
+import outfile
+import parsecache
+import shard
+import sys
+import syntree
 import textwrap
+import watch
+
+# Source files of the tool that affect the generated skeletons. When any
+# of them changes, all the skeletons are generated again.
+tool_files = ['f2c.py', 'backends.py', 'pyskeleton.py', 'outfile.py', 'fesyn.py',
+              'felex.py', 'syntree.py', 'spantoken.py', 'diagnostic.py']
+
+
+class Indents(dict):
+    """Cached indentation prefixes -- indents[il] for the indentation level.
+
+    Each prefix is built only once, not for each generated line.
+    """
+
+    def __init__(self, unit):
+        self.unit = unit
+
+
+    def __missing__(self, il):
+        prefix = self[il] = self.unit * il
+        return prefix
+
+
+# The prefixes for the Catch sources (shared; the strings are immutable).
+indents = Indents(' ' * 4)
+
 
 class CatchCodeGenerator:
     """Converts a syntax tree to the Catch skeleton.
 
-    Returns the list of text lines of the skeleton. See the skeleton() method.
+    The lines of the skeleton are passed to the sink -- the function called
+    with one line (like list.append, or outfile.LineWriter). The recursion
+    for the nested items passes the same sink; hence, each line is emitted
+    only once, and it can go straight to the output file. See
+    the write_skeleton() and skeleton() methods.
     """
 
     def __init__(self):
@@ -20,160 +61,271 @@ class CatchCodeGenerator:
         self.rpar = '" )'        # space before the closing parenthesis
 
 
-    def append_comment(self, lst, text):
-        lst.append('// ' + text)
+    def append_comment(self, emit, text):
+        emit('// ' + text)
 
 
-    def append_description(self, lst, descr_list):
-        lst.append('//')
+    def append_description(self, emit, descr_list):
+        emit('//')
         for line in descr_list:
             if line:
-                lst.append('// ' + line )
+                emit('// ' + line )
             else:
-                lst.append('//')
+                emit('//')
 
 
-    def append_heading(self, il, lst, keyword, identifier):
-        lst.append(' '*4*il + keyword + self.lpar + identifier + self.rpar + ' {')
+    def append_heading(self, il, emit, keyword, identifier):
+        emit(indents[il] + keyword + self.lpar + identifier + self.rpar + ' {')
 
 
-    def append_hint(self, il, lst, text):
+    def append_hint(self, il, emit, text):
         if self.hint_flag:
-            lst.append(' '*4*il + '// ' + text)
+            emit(indents[il] + '// ' + text)
 
 
-    def append_require(self, il, lst):
-        lst.append(' '*4*il + 'REQUIRE(false);')
-        lst.append('')
+    def append_require(self, il, emit):
+        emit(indents[il] + 'REQUIRE(false);')
+        emit('')
 
 
-    def append_closing(self, il, lst):
-        lst.append(' '*4*il + '}')
+    def append_closing(self, il, emit):
+        emit(indents[il] + '}')
 
 
-    def skeleton(self, syntax_tree, il=0):
-        """Returns list of lines of the skeleton from a syntax_tree.
+    def write_skeleton(self, syntax_tree, emit, il=0):
+        """Passes the lines of the skeleton from a syntax_tree to the emit.
 
         The il stands for the initial Indentation Level. Called recursively.
+        The syntax_tree may also be the stream of the top-level items.
         """
-        indent = ' ' * 4 * il
-        out = []
         for item in syntax_tree:
             sym = item[0]
             if sym == 'story':
-                self.append_comment(out, 'Story: ' + item[1])
+                self.append_comment(emit, 'Story: ' + item[1])
 
             elif sym == 'feature':
-                self.append_comment(out, 'Feature: ' + item[1])
+                self.append_comment(emit, 'Feature: ' + item[1])
 
             elif sym == 'description':
-                self.append_description(out, item[1])
+                self.append_description(emit, item[1])
 
             elif sym == 'test_case':
-                out.append('')
-                self.append_heading(il, out, 'TEST_CASE', item[1])
-                out.append('')
-                out.extend(self.skeleton(item[2], il+1))
-                self.append_closing(il, out)
+                emit('')
+                self.append_heading(il, emit, 'TEST_CASE', item[1])
+                emit('')
+                self.write_skeleton(item[2], emit, il+1)
+                self.append_closing(il, emit)
 
             elif sym == 'section':
-                self.append_heading(il, out, 'SECTION', item[1])
-                self.append_hint(il+1, out,
-                                    'perform the operation and assert the state')
-                self.append_require(il+1, out)
-                out.extend(self.skeleton(item[2], il+1))
-                self.append_closing(il, out)
+                self.append_heading(il, emit, 'SECTION', item[1])
+                self.append_hint(il+1, emit,
+                                 'perform the operation and assert the state')
+                self.append_require(il+1, emit)
+                self.write_skeleton(item[2], emit, il+1)
+                self.append_closing(il, emit)
 
             elif sym == 'scenario':
-                out.append('')
-                self.append_heading(il, out, 'SCENARIO', item[1])
-                out.append('')
-                out.extend(self.skeleton(item[2], il+1))
-                self.append_closing(il, out)
+                emit('')
+                self.append_heading(il, emit, 'SCENARIO', item[1])
+                emit('')
+                self.write_skeleton(item[2], emit, il+1)
+                self.append_closing(il, emit)
 
             elif sym == 'given':
-                self.append_heading(il, out, 'GIVEN', item[1])
-                self.append_hint(il+1, out, 'set up initial state')
-                self.append_require(il+1, out)
-                out.extend(self.skeleton(item[2], il+1))
-                self.append_closing(il, out)
+                self.append_heading(il, emit, 'GIVEN', item[1])
+                self.append_hint(il+1, emit, 'set up initial state')
+                self.append_require(il+1, emit)
+                self.write_skeleton(item[2], emit, il+1)
+                self.append_closing(il, emit)
 
             elif sym == 'and_given':
-                self.append_heading(il, out, 'GIVEN', item[1])
-                self.append_hint(il+1, out, 'set up initial state')
-                self.append_require(il+1, out)
-                out.extend(self.skeleton(item[2], il+1))
-                self.append_closing(il, out)
+                self.append_heading(il, emit, 'GIVEN', item[1])
+                self.append_hint(il+1, emit, 'set up initial state')
+                self.append_require(il+1, emit)
+                self.write_skeleton(item[2], emit, il+1)
+                self.append_closing(il, emit)
 
             elif sym == 'when':
-                self.append_heading(il, out, 'WHEN', item[1])
-                self.append_hint(il+1, out, 'perform operation')
-                self.append_require(il+1, out)
-                out.extend(self.skeleton(item[2], il+1))
-                self.append_closing(il, out)
+                self.append_heading(il, emit, 'WHEN', item[1])
+                self.append_hint(il+1, emit, 'perform operation')
+                self.append_require(il+1, emit)
+                self.write_skeleton(item[2], emit, il+1)
+                self.append_closing(il, emit)
 
             elif sym == 'and_when':
-                self.append_heading(il, out, 'AND_WHEN', item[1])
-                self.append_hint(il+1, out, 'perform operation')
-                self.append_require(il+1, out)
-                out.extend(self.skeleton(item[2], il+1))
-                self.append_closing(il, out)
+                self.append_heading(il, emit, 'AND_WHEN', item[1])
+                self.append_hint(il+1, emit, 'perform operation')
+                self.append_require(il+1, emit)
+                self.write_skeleton(item[2], emit, il+1)
+                self.append_closing(il, emit)
 
             elif sym == 'then':
-                self.append_heading(il, out, 'THEN', item[1])
-                self.append_hint(il+1, out, 'assert expected state')
-                self.append_require(il+1, out)
-                out.extend(self.skeleton(item[2], il+1))
-                self.append_closing(il, out)
+                self.append_heading(il, emit, 'THEN', item[1])
+                self.append_hint(il+1, emit, 'assert expected state')
+                self.append_require(il+1, emit)
+                self.write_skeleton(item[2], emit, il+1)
+                self.append_closing(il, emit)
 
             elif sym == 'and_then':
-                self.append_heading(il, out, 'AND_THEN', item[1])
-                self.append_hint(il+1, out, 'assert expected state')
-                self.append_require(il+1, out)
-                out.extend(self.skeleton(item[2], il+1))
-                self.append_closing(il, out)
+                self.append_heading(il, emit, 'AND_THEN', item[1])
+                self.append_hint(il+1, emit, 'assert expected state')
+                self.append_require(il+1, emit)
+                self.write_skeleton(item[2], emit, il+1)
+                self.append_closing(il, emit)
 
             else:
                 raise NotImplementedError('Symbol: ' + sym)
+
+
+    def skeleton(self, syntax_tree, il=0):
+        """Returns list of lines of the skeleton from a syntax_tree.
+
+        The il stands for the initial Indentation Level.
+        """
+        out = []
+        self.write_skeleton(syntax_tree, out.append, il)
         return out
 
 
-def feature_to_catch_skeleton(fname_in, fname_out):
+
+def write_catch_source(items, emit):
+    """Passes the lines of the whole Catch source to the emit.
+
+    The items are the syntax tree or the stream of its top-level items.
+    The skeleton is enclosed by the Catch include and by the reference
+    to the tool.
+    """
+    # Each generated .cpp file with the test must start with Catch include.
+    emit('#include "catch.hpp"')
+    emit('')
+
+    CatchCodeGenerator().write_skeleton(items, emit)
+
+    # Some reference to the tool.
+    script_name = os.path.realpath(__file__)
+    emit('')
+    emit('// ----------------------------------------------------------')
+    emit('// The skeleton was generated by ' + script_name + '.')
+    emit('// Then the skeleton was updated manually.')
+    emit('// See https://github.com/pepr/BDDtool.git')
+
+
+def feature_to_catch_skeleton(fname_in, fname_out, cache=None, merge=False):
     """Converts the source of the feature structure to the Catch source skeleton.
+
+    The cache is the optional astcache.ASTCache (or parsecache.TreeCache)
+    with the syntax trees. With the merge, the scenarios with the same
+    first step are merged (see syntree.merge_scenarios()).
     """
     # Open the input file with the feature description and the output file
-    # for the Catch source skeleton.
+    # for the Catch source skeleton. The existing output file is replaced
+    # only when the content changes; hence, the unchanged sources are not
+    # recompiled.
     with open(fname_in, encoding='utf_8') as fin, \
-         open(fname_out, 'w', encoding='utf_8') as fout:
+         outfile.OutputFile(fname_out) as fout:
+
+        # Get the stream of the syntax tree items for the feature description,
+        # and generate the lines of the skeleton from it. The skeleton
+        # of each scenario is written before the next one is parsed.
+        # The cached tree is complete, and it is used instead.
+        if cache is not None:
+            items = cache.parse(fname_in, 'feature')
+        else:
+            items = fesyn.SyntacticAnalyzerForFeature(fin).iter_items()
+        if merge:
+            items = syntree.merge_scenarios(items)
+
+        # The lines go straight to the file; they are not collected.
+        write_catch_source(items, outfile.LineWriter(fout))
+
+
+def feature_to_outputs(fname_in, fname_out, emit=('catch',), cache=None,
+                       merge=False):
+    """Parses the feature once and writes the outputs of all the backends.
+
+    The fname_out is the output of the first backend of the emit; the names
+    of the other outputs are derived from it (see outputs()). The cache
+    is the optional astcache.ASTCache (or parsecache.TreeCache) with
+    the syntax trees. With the merge, all the backends get the tree
+    with the merged scenarios.
+    """
+    if cache is not None:
+        tree = cache.parse(fname_in, 'feature')
+    else:
+        with open(fname_in, encoding='utf_8') as fin:
+            tree = fesyn.SyntacticAnalyzerForFeature(fin).Start()
+    if merge:
+        tree = syntree.merge_scenarios(tree)
+
+    for name, fname in outputs(fname_in, fname_out, emit):
+        with outfile.OutputFile(fname) as fout:
+            backends.registry[name].write(tree, outfile.LineWriter(fout))
+
+
+def outputs(fname_in, fname_out, emit):
+    """Returns the list of (backend name, fname) of all the outputs of the task.
+
+    The fname_out is the output of the first backend of the emit (see tasks()).
+    """
+    root = os.path.dirname(os.path.dirname(fname_out))
+    return [(emit[0], fname_out)] + output_names(fname_in, emit[1:], root)
+
 
-        # Each generated .cpp file with the test must start with Catch include.
-        lst = []
-        lst.append('#include "catch.hpp"')
-        lst.append('')
+def output_names(fname_in, emit, root='.'):
+    """Returns the list of (backend name, fname_out) for the feature.
+    """
+    lst = []
+    for name in emit:
+        fname_out = backends.output_name(name, fname_in, root)
 
-        # Get the syntax tree for the feature description.
-        sa = fesyn.SyntacticAnalyzerForFeature(fin)
-        tree = sa.Start()
-        ##print(tree)
+        # If the file for the skeleton (like the cpp file) does not exist,
+        # it will be generated. Otherwise, the .skeleton extension is used
+        # -- the manually filled-in skeleton is never overwritten.
+        if backends.registry[name].protect and os.path.isfile(fname_out):
+            fname_out = os.path.splitext(fname_out)[0] + '.skeleton'
+        lst.append((name, fname_out))
+    return lst
 
-        # Generate the lines of the skeleton from the syntax tree.
-        cg = CatchCodeGenerator()
-        lst.extend(cg.skeleton(tree))
 
-        # Some reference to the tool.
-        script_name = os.path.realpath(__file__)
-        lst.append('')
-        lst.append('// ----------------------------------------------------------')
-        lst.append('// The skeleton was generated by ' + script_name + '.')
-        lst.append('// Then the skeleton was updated manually.')
-        lst.append('// See https://github.com/pepr/BDDtool.git')
+def tasks(features_dir, tests_dir, emit=('catch',)):
+    """Returns the sorted list of (fname_in, fname_out) for the features.
 
-        # Write the result to the output file.
-        fout.write('\n'.join(lst))
+    The fname_out is the output of the first backend of the emit. The outputs
+    are placed in the backend directories next to the tests_dir.
+    """
+    root = os.path.dirname(os.path.normpath(tests_dir))
+    lst = []
+    for fname_in in sorted(glob.glob(os.path.join(features_dir, '*.feature'))):
+        lst.append((fname_in, output_names(fname_in, emit[:1], root)[0][1]))
+    return lst
 
 
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser(
+        description='Converts features/*.feature to the Catch skeletons in tests/.')
+    parser.add_argument('-j', '--jobs', type=batch.jobs_arg, default=None,
+                        help='number of processes (default: number of CPUs)')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='convert all the files, even the unchanged ones')
+    parser.add_argument('--cache-dir',
+                        help='directory of the syntax tree cache (shared by the runs)')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='convert the files again whenever they change')
+    parser.add_argument('--emit', type=backends.names_arg, default=('catch',),
+                        help='comma separated backends, each feature is parsed '
+                             'once (default: catch; known: {})'.format(
+                             ', '.join(backends.registry)))
+    parser.add_argument('--merge-scenarios', action='store_true',
+                        help='merge the scenarios with the same first step '
+                             'into one with the branching sections')
+    parser.add_argument('--shards', type=batch.jobs_arg, default=None,
+                        help='pack the Catch skeletons of all the features '
+                             'into SHARDS translation units in shards/')
+    args = parser.parse_args()
+    if args.shards and args.emit != ('catch',):
+        parser.error('--shards generates only the Catch skeletons')
+
     # Input directory with *.feature definitions.
     features_dir = './features'
     if not os.path.isdir(features_dir):
@@ -184,28 +336,72 @@ if __name__ == '__main__':
     if not os.path.isdir(tests_dir):
         os.makedirs(tests_dir)
 
-    for fname_in in glob.glob(os.path.join(features_dir, '*.feature')):
-        path, bname = os.path.split(fname_in)
-        name, ext = os.path.splitext(bname)
-
-        # If the cpp  file for the skeleton does not exist, it will be
-        # generated as the .cpp file. Otherwise, the .skeleton extension is used.
-        fname_out = os.path.join(tests_dir, name + '.cpp')
-        if os.path.isfile(fname_out):
-            fname_out = os.path.join(tests_dir, name + '.skeleton')
-
-        # Generate the skeleton.
-        path, name = os.path.split(fname_in)
-        path, subdir = os.path.split(path)
-        src = os.path.join(subdir, name)
-
-        path, name = os.path.split(fname_out)
-        path, subdir = os.path.split(path)
-        dest = os.path.join(subdir, name)
-
-        print(src, '-->', dest)
-
-        feature_to_catch_skeleton(fname_in, fname_out)
+    # Output directories of the other backends.
+    for name in args.emit:
+        d = backends.registry[name].directory
+        if not os.path.isdir(d):
+            os.makedirs(d)
+
+    # The optional cache of the syntax trees (shared by the processes).
+    cache = None
+    if args.cache_dir:
+        cache = astcache.ASTCache(args.cache_dir)
+
+    if args.shards:
+        # All the features are packed into the shards in their own directory
+        # (generated only, see the shard module); the manifest is not used,
+        # the unchanged shards are not rewritten.
+        shards_dir = './shards'
+        if not os.path.isdir(shards_dir):
+            os.makedirs(shards_dir)
+
+        def convert_shards(jobs, cache=cache):
+            fnames = sorted(glob.glob(os.path.join(features_dir, '*.feature')))
+            return shard.run(fnames, args.shards, shards_dir, jobs, cache,
+                             args.merge_scenarios, tests_dir)
+
+        failed = convert_shards(args.jobs)
+    else:
+        # The manifest remembers the converted features. Only the changed ones
+        # are converted again (unless forced).
+        tooldir = os.path.dirname(os.path.realpath(__file__))
+        fingerprint = manifest.fingerprint(
+            [os.path.join(tooldir, fname) for fname in tool_files],
+            dict(vars(CatchCodeGenerator()), emit=args.emit,
+                 merge=args.merge_scenarios))
+        # All the outputs of the backends are remembered; hence, the missing
+        # one is generated again.
+        def task_outputs(fname_in, fname_out):
+            return [fname for name, fname in outputs(fname_in, fname_out, args.emit)]
+
+        mf = manifest.Manifest(os.path.join(tests_dir, '.f2c.manifest'), fingerprint,
+                               task_outputs)
+        if args.force:
+            mf.clear()
+        lst = tasks(features_dir, tests_dir, args.emit)
+        selected = mf.select(lst)
+
+        # The optional cache of the syntax trees is passed with the conversion
+        # function to the processes. The Catch skeleton alone is generated
+        # from the stream of the items (unless merged); more backends share
+        # the whole tree.
+        convert = feature_to_catch_skeleton
+        if args.emit != ('catch',):
+            convert = functools.partial(feature_to_outputs, emit=args.emit)
+        if args.merge_scenarios:
+            convert = functools.partial(convert, merge=True)
+        if cache is not None:
+            convert = functools.partial(convert, cache=cache)
+
+        # Generate the skeletons. The errors are reported at the end.
+        results = batch.run(convert, selected, args.jobs)
+        failed = batch.report(mf.confirm(results))
+        mf.save()
+        if len(selected) < len(lst):
+            print('{} file(s) up to date.'.format(len(lst) - len(selected)))
+
+    if cache is not None:
+        cache.evict()
 
     # If the TestMain.cpp does not exist, generate it.
     fname_test_main = os.path.join(tests_dir, 'TestMain.cpp')
@@ -214,8 +410,32 @@ if __name__ == '__main__':
         with open(fname_test_main, 'w', encoding='utf-8') as f:
             f.write('#define CATCH_CONFIG_MAIN\n')
             f.write('#include "catch.hpp"')
-
-        path, name = os.path.split(fname_test_main)
-        path, subdir = os.path.split(path)
-        dest = os.path.join(subdir, name)
-        print('Generated:', dest)
\ No newline at end of file
+        print('Generated:', batch.short_name(fname_test_main))
+
+    # The changes are converted in this process; hence, the modules with
+    # the compiled lexer tables stay loaded, and the trees are kept
+    # in the memory (backed by the --cache-dir cache).
+    if args.watch:
+        trees = parsecache.TreeCache(disk_cache=cache)
+
+    if args.watch and args.shards:
+        # All the shards are generated again; only the touched features
+        # are parsed again, the other trees are taken from the memory.
+        watch.run([features_dir], ['*.feature'],
+                  lambda paths: convert_shards(1, trees))
+
+    elif args.watch:
+        # Only the touched features are converted.
+        convert = functools.partial(convert, cache=trees)
+
+        def on_change(paths):
+            changed = {os.path.abspath(path) for path in paths}
+            lst = [task for task in tasks(features_dir, tests_dir, args.emit)
+                   if os.path.abspath(task[0]) in changed]
+            results = batch.run(convert, mf.select(lst, prune=False), 1)
+            batch.report(mf.confirm(results))
+            mf.save()
+
+        watch.run([features_dir], ['*.feature'], on_change)
+
+    sys.exit(1 if failed else 0)
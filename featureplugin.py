@@ -0,0 +1,136 @@
+#!python3
+"""The pytest plugin that collects the scenarios directly from the .feature files.
+
+    pytest -p featureplugin [--feature-cache-dir DIR] features/
+
+(or pytest_plugins = ['featureplugin'] in the conftest.py)
+
+No test modules are generated. The .feature files are parsed via
+the parsecache; with the --feature-cache-dir, the trees are also kept
+in the on-disk astcache shared by the runs. Each path from the scenario
+to its last step (the branches are run separately, like the Catch sections)
+is one test item. The steps are run by the functions registered
+by the decorators -- usually in the modules imported by the conftest.py:
+
+    from featureplugin import given, when, then
+
+    @given('an empty vector')
+    def empty_vector(ctx):
+        ctx.v = []
+
+The ctx is the new types.SimpleNamespace for each test item. The and_given
+step is run by the given function, etc. The missing step function
+fails the test like the REQUIRE(false) of the Catch skeleton.
+"""
+
+import types
+
+import astcache
+import parsecache
+import pytest
+
+from pyskeleton import helper_prefixes, step_paths
+from syntree import Kind
+
+
+# (kind, text) --> the step function
+step_functions = {}
+
+
+def step(kind, text):
+    """Decorator that registers the step function for the kind and the text.
+
+    The whitespace in the text is collapsed as in the syntax tree.
+    """
+    def decorator(function):
+        step_functions[(kind, ' '.join(text.split()))] = function
+        return function
+    return decorator
+
+
+def given(text):
+    return step('given', text)
+
+
+def when(text):
+    return step('when', text)
+
+
+def then(text):
+    return step('then', text)
+
+
+def section(text):
+    return step('section', text)
+
+#-----------------------------------------------------------------------
+
+trees_key = pytest.StashKey()
+
+
+def pytest_addoption(parser):
+    parser.addoption('--feature-cache-dir',
+                     help='directory of the syntax tree cache (shared by the runs)')
+
+
+def pytest_configure(config):
+    cache_dir = config.getoption('feature_cache_dir')
+    if cache_dir:
+        trees = parsecache.TreeCache(disk_cache=astcache.ASTCache(cache_dir))
+    else:
+        trees = parsecache.cache
+    config.stash[trees_key] = trees
+
+
+def pytest_collect_file(file_path, parent):
+    if file_path.suffix == '.feature':
+        return FeatureFile.from_parent(parent, path=file_path)
+
+
+class FeatureFile(pytest.File):
+    """The .feature file with the scenarios and the test cases.
+    """
+
+    def collect(self):
+        tree = self.config.stash[trees_key].parse(str(self.path), 'feature')
+        for node in tree:
+            if node.kind not in (Kind.SCENARIO, Kind.TEST_CASE):
+                continue
+            paths = list(step_paths(node.children))
+            if len(paths) <= 1:
+                yield ScenarioItem.from_parent(self, name=node.text,
+                                               steps=paths[0] if paths else (),
+                                               start=node.start)
+                continue
+            for path in paths:
+                name = '{}[{}]'.format(node.text,
+                                       ' / '.join(s.text for s in path))
+                yield ScenarioItem.from_parent(self, name=name, steps=path,
+                                               start=node.start)
+
+
+class ScenarioItem(pytest.Item):
+    """One path through the scenario -- the steps run one by one.
+    """
+
+    def __init__(self, *, steps, start, **kwargs):
+        super().__init__(**kwargs)
+        self.steps = steps
+        self.start = start
+
+
+    def runtest(self):
+        if not self.steps:
+            pytest.fail('no steps', pytrace=False)
+        ctx = types.SimpleNamespace()
+        for node in self.steps:
+            kind = helper_prefixes[node.kind]
+            function = step_functions.get((kind, ' '.join(node.text.split())))
+            if function is None:
+                pytest.fail('step not implemented: {} {!r}'.format(kind, node.text),
+                            pytrace=False)
+            function(ctx)
+
+
+    def reportinfo(self):
+        return self.path, self.start, 'scenario: {}'.format(self.name)
@@ -2,7 +2,11 @@
 """Lexical analysis for the xxx.feature source files.
 """
 
+import collections
 import re
+import types
+
+from spantoken import SpanToken
 
 # The .feature files contain human-readable sentences. It is line oriented
 # in the sense that each line has a specific meaning. The first words
@@ -17,7 +21,7 @@ import re
 # The first words may have more forms (think or about more human languages
 # or about various free language expressions where the alternatives improve
 # readability of the text). The important subpaterns only are only described
-# below. The related full patterns are constructed in the build_rex_closures()
+# below. The related full patterns are constructed in the buildRuleTable()
 # below.
 #
 # NOTE: The language independent elements (like 'emptyline' or 'ccommentstart'
@@ -67,48 +71,29 @@ humanLanguageDependentRules = [
 
 #-----------------------------------------------------------------------
 
-def build_rex_closures(pattern, lexsym):
-    """Builds the pair of closures for the regex pattern.
-    """
-
-    def match_rex(line):
-        # Actually returns a match object that can be interpreted
-        # in a boolean context as True/False (matches/does not match).
-        rex = re.compile(pattern, re.IGNORECASE)
-        return rex.match(line)
-
-    def result_rex(line):
-        m = match_rex(line)             # see the match_rex() above
-
-        text = ''
-        if 'text' in m.groupdict():
-            text = m.group('text')      # the matched text
+# The compiled rules are immutable; hence, one instance can be shared
+# by all iterators (also from more threads).
+RuleTable = collections.namedtuple('RuleTable', ['rex', 'groups'])
 
-        tags = None
-        if lexsym in ('scenario', 'test_case'):
-            tags = m.group('tags')
-
-        ##print( (lexsym, text, tags) )
-        return lexsym, text, tags
 
-    return match_rex, result_rex
+def buildRuleTable():
+    """Builds the single compiled regex for classifying the lines.
 
-#-----------------------------------------------------------------------
-
-def buildRegexMatchFunctions():
-    """Builds the list of (match_fn, result_fn) closures for regular expressions.
+    All the rules are joined into one alternation of named groups. The groups
+    are tried in the order of the rules; hence, the first matching rule wins
+    exactly as if the rules were tried one by one. The name of the outer
+    group (the m.lastgroup) identifies the rule. Returns the RuleTable with
+    the compiled regex and the read-only mapping of the group name
+    to (lexsym, text_group, tags_group) where the group names may be None.
     """
-    # As a container can be iterated by several iterators, both the container
-    # and the iterator must be passed (not captured inside the closures).
-    # The rules are defined by the global one; hence, captured inside.
-    functions = []
-
     # Human-language independent patterns first. The order may be important.
-    functions.append(build_rex_closures(r'^\s*$', 'emptyline'))
-    functions.append(build_rex_closures(r'^\s*/\*(?P<text>.*?)\*/\s*$', 'ccommentoneliner'))
-    functions.append(build_rex_closures(r'^\s*/\*(?P<text>.*?)$', 'ccommentstart'))
-    functions.append(build_rex_closures(r'^(?P<text>.*?)\*/\s*$', 'ccommentend'))
-    functions.append(build_rex_closures(r'^\s*//(?P<text>.*?)$', 'cppcomment'))
+    rules = [
+        (r'^\s*$', 'emptyline'),
+        (r'^\s*/\*(?P<text>.*?)\*/\s*$', 'ccommentoneliner'),
+        (r'^\s*/\*(?P<text>.*?)$', 'ccommentstart'),
+        (r'^(?P<text>.*?)\*/\s*$', 'ccommentend'),
+        (r'^\s*//(?P<text>.*?)$', 'cppcomment'),
+    ]
 
     # Human-language dependent patterns.
     for pat, lexsym in humanLanguageDependentRules:
@@ -117,11 +102,30 @@ def buildRegexMatchFunctions():
                       r'\s*(?P<text>.*?)\s*(?P<tags>(\[\w+\])*)\s*$'
         else:
             pattern = r'^\s*' + pat + r'\s*(?P<text>.*?)\s*$'
-
-        functions.append(build_rex_closures(pattern, lexsym))
-
-
-    return functions
+        rules.append((pattern, lexsym))
+
+    # The group names must be unique in the joined regex. The inner 'text'
+    # and 'tags' groups get the prefix of the rule group.
+    alternatives = []
+    groupinfo = {}
+    for n, (pattern, lexsym) in enumerate(rules):
+        name = 'r{}'.format(n)
+        text_group = tags_group = None
+        if '(?P<text>' in pattern:
+            text_group = name + '_text'
+            pattern = pattern.replace('(?P<text>', '(?P<' + text_group + '>')
+        if '(?P<tags>' in pattern:
+            tags_group = name + '_tags'
+            pattern = pattern.replace('(?P<tags>', '(?P<' + tags_group + '>')
+        alternatives.append('(?P<{}>{})'.format(name, pattern))
+        groupinfo[name] = (lexsym, text_group, tags_group)
+
+    rex = re.compile('|'.join(alternatives), re.IGNORECASE)
+    return RuleTable(rex, types.MappingProxyType(groupinfo))
+
+
+# The rules are built only once when the module is imported.
+ruleTable = buildRuleTable()
 
 #-----------------------------------------------------------------------
 
@@ -131,36 +135,81 @@ class Iterator:
 
     def __init__(self, container, startlineno):
         self.container = container
+        self.rules = ruleTable  # shared, compiled only once
+        self.rewind(startlineno)
+
+
+    def rewind(self, startlineno=0):
+        """Restarts the iteration over the (possibly reloaded) container.
+        """
         self.lineno = startlineno
 
-        self.lines = self.container.lines
-        self.len = len(self.lines)
         self.source_name = self.container.source_name
 
         self.status = 0         # of the finite automaton
         self.symbol = None
-        self.value = None
-        self.lexem = None
+        self.lexem = None       # the whole line
+        self.vstart = None      # span of the value inside the line
+        self.vend = None
         self.tags = None        # for scenario/test
 
-        self.regex_match_fns = buildRegexMatchFunctions()
+
+    def reset(self, source):
+        """Reuses the iterator (and its container) for another source.
+        """
+        self.container.reset(source)
+        self.rewind(0)
 
 
     def __iter__(self):
         return self
 
 
+    def offset(self, token):
+        """Returns the line index (from 0) of the token returned as the last one.
+        """
+        if token[2] is None:
+            return self.lineno      # end of data, behind the last line
+        return self.lineno - 1
+
+
+    def position(self, token):
+        """Returns (line, column) of the token returned as the last one.
+
+        The column is the one of the first non-space char of the line.
+        """
+        lexem = token[2]
+        if lexem is None:
+            return self.lineno, 1
+        return self.lineno, len(lexem) - len(lexem.lstrip()) + 1
+
+
+    def resumable(self):
+        """Checks whether the iteration started at the line of the last token
+        returns the same tokens as this iterator.
+
+        The lines are classified independently of each other.
+        """
+        return True
+
+
     def notImplemented(self, msg=''):
         raise NotImplementedError('status={}: {!r}'.format(self.status, msg))
 
 
     def lextoken(self):
         """Forms lexical token from the member variables.
+
+        The value is kept as the span in the line. It is sliced from the line
+        only when accessed.
         """
 
         # Form the lexical token.
         tags = self.tags if self.tags else None
-        token = (self.symbol, self.value, self.lexem, tags)
+        start = None if self.lexem is None else 0
+        end = None if self.lexem is None else len(self.lexem)
+        token = SpanToken(self.symbol, self.lexem, start, end,
+                          self.vstart, self.vend, tags)
 
         # Warn if symbol was not recognized.
         if self.symbol is None:
@@ -168,8 +217,9 @@ class Iterator:
 
         # Reset the variables.
         self.symbol = None
-        self.value = None
         self.lexem = None
+        self.vstart = None
+        self.vend = None
         self.tags = None
 
         # Return the result.
@@ -183,25 +233,33 @@ class Iterator:
         while self.status != 1000:
 
             # Get the next character or set the status for the end of data
-            if self.lineno < self.len:
-                line = self.lines[self.lineno]
+            line = self.container.line(self.lineno)
+            if line is not None:
                 self.lexem = line       # whole line is the lexem
                 self.lineno += 1        # advanced to the next one
             else:
                 # End of data.
+                self.lexem = None
                 self.status = 800
 
             #============================   initial state, nothing known
             if self.status == 0:
                 assert self.symbol is None
-                for match_fn, result_fn in self.regex_match_fns:
-                    if match_fn(line):
-                        self.symbol, self.value, self.tags = result_fn(line)
-                        return self.lextoken()
+                m = self.rules.rex.match(line)
+                if m:
+                    lexsym, text_group, tags_group = self.rules.groups[m.lastgroup]
+                    self.symbol = lexsym
+                    if text_group:
+                        self.vstart, self.vend = m.span(text_group)
+                    else:
+                        self.vstart = self.vend = 0     # empty value
+                    self.tags = m.group(tags_group) if tags_group else None
+                    return self.lextoken()
 
                 # Other lines are considered just 'line'.
                 self.symbol = 'line'
-                self.value = line.rstrip()
+                self.vstart = 0
+                self.vend = len(line.rstrip())
 
                 return self.lextoken()
 
@@ -223,14 +281,30 @@ class Container:
     """Iterable container for lexical parsing of the *.feature source.
 
     The source is passed or as a multiline string, or as an open file,
-    processed by lines.
+    processed by lines, or as the list of lines (with the newlines).
+    The lines of the file are read only when the iterator gets to them;
+    hence, only the current line is kept in the memory, and the file
+    can be iterated only once, from the beginning.
     """
 
     def __init__(self, source):
-        if hasattr(source, 'readlines'):
+        self.reset(source)
+
+
+    def reset(self, source):
+        """Replaces the source. New iterators will process the new lines.
+        """
+        self.file = None
+        if hasattr(source, 'readline'):
             # It is a file object opened for reading lines in text mode.
-            self.lines = source.readlines()
+            self.file = source
+            self.lines = None
+            self.nread = 0                      # lines read from the file
             self.source_name = source.name      # filename
+        elif isinstance(source, list):
+            # The lines are already split (shared, not copied).
+            self.lines = source
+            self.source_name = '<str>'
         elif source == '':
             # It is an empty string.
             self.lines = []
@@ -242,6 +316,22 @@ class Container:
             self.lines.append(lines[-1])
             self.source_name = '<str>'
 
+
+    def line(self, lineno):
+        """Returns the line (with the newline) at the index from 0,
+        or None behind the last line.
+        """
+        if self.file is None:
+            return self.lines[lineno] if lineno < len(self.lines) else None
+        if lineno != self.nread:
+            raise ValueError('the lines of the file are read only once, in order')
+        line = self.file.readline()
+        if not line:
+            return None
+        self.nread += 1
+        return line
+
+
     def __iter__(self):
         return Iterator(self, 0)
 
@@ -4,32 +4,51 @@
 Notice that some of the method of the SyntacticAnalyzerForFeature class
 start with capital letters. This is not ignorance of the usual style.
 The methods implement recursive parsing of the related nonterminals.
+The repetitions are implemented as loops; only the nesting of the syntax
+tree uses the call stack, and its depth is limited by max_depth.
+
+In the recovery mode (recover=True), the syntax error does not stop
+the analysis. It is recorded in the diagnostics list, and the analysis
+continues from the next scenario or test case.
 """
 
 import felex
 import re
 import textwrap
 
+from diagnostic import Diagnostic, ParseError
+
+from syntree import Kind, Node, kind_of
+
 
 class SyntacticAnalyzerForFeature:
 
-    def __init__(self, source):
-        self.source = source
+    def __init__(self, source, max_depth=100, recover=False, start=0):
+        self.source = source        # string, file, or the list of lines
+        self.max_depth = max_depth  # of the nested items in the syntax tree
+        self.recover = recover      # collect the errors instead of raising
+        self.diagnostics = []       # of the errors in the recovery mode
 
         self.lextoken = None    # tuple with elements (extracted to...)
         self.sym   = None       # symbol like 'scenario'
         self.text  = None       # value like 'abc'
         self.lexem = None       # lexem like 'Scenario: abc [tag1][tag2]'
         self.tags  = None       # extra_info like '[tag1][tag2]'
+        self.prev_end = start   # line index behind the last non-empty line
 
-        self.it = iter(felex.Container(self.source))
+        # The analysis may start at the line of a top-level item
+        # (see the incremental module).
+        self.it = felex.Iterator(felex.Container(self.source), start)
         self.lex()              # getting the first token ready
-        self.syntax_tree = []   # syntax tree as the list of tuples with lists...
+        self.syntax_tree = []   # syntax tree as the list of syntree.Node
+                                # (only the pending items in iter_items())
 
 
     def lex(self):
         """Get the next lexical token.
         """
+        if self.lextoken is not None and self.sym != 'emptyline':
+            self.prev_end = self.it.lineno  # end of the consumed line
         try:
             self.lextoken = next(self.it)
             ##print(self.lextoken)
@@ -38,37 +57,122 @@ class SyntacticAnalyzerForFeature:
             pass
 
 
+    def error(self, expected_symbols, msg):
+        """Raises the ParseError with the diagnostic for the current token.
+
+        The msg is the format with the placeholders for the source name,
+        the line, and the column. The symbol and the value are appended.
+        """
+        line_no, column = self.it.position(self.lextoken)
+        source_name = self.it.source_name
+        msg = msg.format(source_name, line_no, column)
+        msg += '{!r}, {!r}\n'.format(self.sym, self.text)
+        raise ParseError(Diagnostic(source_name, line_no, column,
+                                    expected_symbols, self.sym, self.text, msg))
+
+
+    def recover_from(self, diagnostic):
+        """Records the diagnostic and skips to the next top-level item.
+
+        Used only in the recovery mode. The partially parsed item stays
+        in the syntax tree.
+        """
+        self.diagnostics.append(diagnostic)
+        self.synchronize()
+
+
+    def synchronize(self):
+        """Skips the tokens up to the next scenario or test case.
+        """
+        while self.sym not in ('test_case', 'scenario', '$'):
+            self.lex()
+
+
     def expect(self, *expected_symbols):
         """Checks the symbol and gets the next one or reports error.
         """
         if self.sym in expected_symbols:
             self.lex()
         else:
-            line_no = self.it.lineno
-            source_name = self.it.source_name
-            msg = 'Expected symbol(s): {}\n'.format(expected_symbols)
-            msg += ('Unexpected content in {!r} at line {}:\n'
-                    '{!r}, {!r}\n').format(
-                        source_name, line_no, self.sym, self.text)
-            raise RuntimeError(msg)
+            self.error(expected_symbols,
+                       'Expected symbol(s): {}\n'.format(expected_symbols)
+                       + 'Unexpected content in {!r} at line {}, column {}:\n')
+
+
+    def node(self, upperlst):
+        """Appends the node for the current token to the upperlst.
+
+        Returns the node. Its children are filled, and its end is set
+        later by the caller.
+        """
+        node = Node(kind_of[self.sym], self.text, [],
+                    self.it.offset(self.lextoken))
+        upperlst.append(node)
+        return node
+
+
+    def set_end(self, chain):
+        """Sets the end of the nodes of the chain nested one to another.
+        """
+        for node in chain:
+            node.end = self.prev_end
+
+
+    def check_depth(self, depth):
+        """Reports error if the syntax tree is nested too deeply.
+        """
+        if depth > self.max_depth:
+            self.error((), 'Nesting deeper than {} levels in '.format(
+                                self.max_depth)
+                            + '{!r} at line {}, column {}:\n')
 
 
     #-------------------------------------------------------------------------
     def Start(self):
         """Implements the start nonterminal.
+
+        In the recovery mode, the (possibly partial) tree is returned
+        also for the broken source. See the diagnostics for the problems.
         """
-        self.Feature_or_story()
-        self.Test_case_or_scenario_serie()
-        self.expect('$')
+        self.syntax_tree = list(self.iter_items())
         return self.syntax_tree
 
 
+    def iter_items(self):
+        """Generates the top-level items of the syntax tree as they are parsed.
+
+        The story/feature item and the description come first, then each
+        test case or scenario as soon as its subtree is complete. The analyzer
+        does not keep the generated items, and the lines of the file source
+        are read only when needed (see felex.Container); hence, the memory
+        is bounded by the biggest item, not by the whole source.
+        """
+        self.Feature_or_story()
+        yield from self.pending_items()
+        while True:
+            yield from self.Test_case_or_scenario_serie()
+            try:
+                self.expect('$')
+                break
+            except ParseError as e:
+                if not self.recover:
+                    raise
+                self.recover_from(e.diagnostic)
+
+
+    def pending_items(self):
+        """Returns the completed top-level items, and forgets them.
+        """
+        items = self.syntax_tree
+        self.syntax_tree = []
+        return items
+
+
     def Empty_lines(self):
         """Nonterminal for the sequence of zero or more 'emptyline' tokens.
         """
-        if self.sym == 'emptyline':
+        while self.sym == 'emptyline':
             self.lex()
-            self.Empty_lines()
 
 
     #-------------------------------------------------------------------------
@@ -77,78 +181,87 @@ class SyntacticAnalyzerForFeature:
         """
         self.Empty_lines()
         if self.sym in ('story', 'feature'):
-            self.syntax_tree.append((self.sym, self.text))
+            node = self.node(self.syntax_tree)
+            node.children = None        # no body, only the description
             self.lex()
+            node.end = self.prev_end
             self.Empty_lines()
+            start = self.it.offset(self.lextoken)
             descr_lst = []
             self.Description(descr_lst)
             if descr_lst:
-                self.syntax_tree.append( ('description', descr_lst) )
+                self.syntax_tree.append(Node(Kind.DESCRIPTION, None, descr_lst,
+                                             start, self.prev_end))
 
 
     def Description(self, descr_lst):
         """Nonterminal for description lines of the story/feature.
         """
-        if self.sym in ('emptyline', 'line'):
-            # The emptylines were skipped before calling this method for
-            # the first time. However, next emptylines may be a part
-            # of this description.
-            descr_lst.append(self.text)
-            self.lex()
-            self.Description(descr_lst)
-        elif self.sym in ('given', 'when', 'then', 'and', 'but', 'section'):
-            # False recognition inside the description. The element must
-            # be consumed as line (including the keyword); hence,
-            # the lexem but with the newline stripped out.
-            descr_lst.append(self.lexem.rstrip())
+        while True:
+            if self.sym in ('emptyline', 'line'):
+                # The emptylines were skipped before calling this method for
+                # the first time. However, next emptylines may be a part
+                # of this description.
+                descr_lst.append(self.text)
+            elif self.sym in ('given', 'when', 'then', 'and', 'but', 'section'):
+                # False recognition inside the description. The element must
+                # be consumed as line (including the keyword); hence,
+                # the lexem but with the newline stripped out.
+                descr_lst.append(self.lexem.rstrip())
+            else:
+                break
             self.lex()
-            self.Description(descr_lst)
 
 
     def Test_case_or_scenario_serie(self):
         """Nonterminal for a serie of test-case or scenario definitions.
+
+        Generates the items as they are completed.
         """
         self.Empty_lines()
-        if self.sym == 'test_case':
-            self.Test_case()
-            self.Test_case_or_scenario_serie()
-        elif self.sym == 'scenario':
-            self.Scenario()
-            self.Test_case_or_scenario_serie()
+        while self.sym in ('test_case', 'scenario'):
+            try:
+                if self.sym == 'test_case':
+                    self.Test_case()
+                else:
+                    self.Scenario()
+            except ParseError as e:
+                if not self.recover:
+                    raise
+                self.recover_from(e.diagnostic)
+            self.Empty_lines()          # the next item is known when yielding
+            yield from self.pending_items()
 
 
     #-------------------------------------------------------------------------
     def Test_case(self, item=None):
         """Nonterminal for one TEST_CASE.
         """
-        bodylst = []
-        item = [self.sym, self.text, bodylst]     # 'test_case', 'id', body
-        self.syntax_tree.append(tuple(item))
+        node = self.node(self.syntax_tree)  # 'test_case', 'id', body
 
         self.lex()
         self.Empty_lines()
         if self.sym == 'section':
-            self.Section_serie(bodylst)
+            self.Section_serie(node.children)
+        node.end = self.prev_end
 
 
     def Section_serie(self, upperlst):
         """Zero or more SECTION items (at the same level).
         """
-        self.Empty_lines()      # necessary for the recursion
-        if self.sym == 'section':
+        self.Empty_lines()
+        while self.sym == 'section':
             self.Section(upperlst)
             self.Empty_lines()
-            self.Section_serie(upperlst)
 
 
     def Section(self, upperlst):
         """Nonterminal for one SECTION definition.
         """
         assert self.sym == 'section'
-        bodylst = []                     # body of the section item
-        item = [self.sym, self.text, bodylst] # 'section', 'id', body
-        upperlst.append(tuple(item))     # ready to be appended
+        node = self.node(upperlst)      # 'section', 'id', body
         self.lex()
+        node.end = self.prev_end
 
 
     #-------------------------------------------------------------------------
@@ -156,32 +269,30 @@ class SyntacticAnalyzerForFeature:
         """Nonterminal for one Scenario.
         """
         assert self.sym == 'scenario'
-        bodylst = []
-        item = [self.sym, self.text, bodylst]
-        self.syntax_tree.append(tuple(item))
+        node = self.node(self.syntax_tree)  # 'scenario', 'id', body
 
         self.lex()
         self.Empty_lines()
         if self.sym == 'given':
-            self.Given_serie(bodylst) # nested to the body of the scenario
+            self.Given_serie(node.children) # nested to the body of the scenario
+        node.end = self.prev_end
 
 
     def Given_serie(self, upperlst):
         """Zero or more GIVEN items (at the same level).
         """
-        self.Empty_lines()      # neccessary for the recursion
-        if self.sym == 'given':
+        self.Empty_lines()
+        while self.sym == 'given':
             self.Given(upperlst)
-            self.Given_serie(upperlst)
+            self.Empty_lines()
 
 
     def Given(self, upperlst):
         """Nonterminal for one GIVEN definition.
         """
         assert self.sym == 'given'
-        bodylst = []                     # body of the given item
-        item = [self.sym, self.text, bodylst] # 'given', 'id', body
-        upperlst.append(tuple(item))     # ready to be appended
+        node = self.node(upperlst)      # 'given', 'id', body
+        bodylst = node.children
 
         self.lex()
         self.Empty_lines()
@@ -193,107 +304,116 @@ class SyntacticAnalyzerForFeature:
         elif self.sym == 'but':         # but s transformed to and_given
             self.sym = 'and_given'      # symbol transformation
             self.And_given(bodylst)     # nested to the given
-        elif self.sym == 'given':
-            self.Given(upperlst)        # nested to the scenario body
+        node.end = self.prev_end
+        # The next 'given' (nested to the scenario body) is processed
+        # by the Given_serie loop.
 
 
     def And_given(self, upperlst):
-        """Nonterminal for one AND_GIVEN definition.
+        """Nonterminal for the chain of AND_GIVEN definitions.
+
+        Each next and_given is nested to the previous one. The chain
+        is processed by the loop.
         """
-        assert self.sym == 'and_given'
-        bodylst = []                            # body of the given item
-        item = [self.sym, self.text, bodylst]   # 'and_given', 'id', body
-        upperlst.append(tuple(item))            # ready to be appended
+        depth = 3                       # scenario, given, and_given
+        chain = []                      # the nodes get the common end
+        while True:
+            assert self.sym == 'and_given'
+            self.check_depth(depth)
+            node = self.node(upperlst)              # 'and_given', 'id', body
+            bodylst = node.children
+            chain.append(node)
 
-        self.lex()
-        self.Empty_lines()
-        if self.sym == 'when':
-            self.When(bodylst)          # nested to the given
-        elif self.sym == 'and':
-            self.sym = 'and_given'      # symbol transformation
-            self.And_given(bodylst)     # nested to the given
-        elif self.sym == 'but':         # but s transformed to and_given
-            self.sym = 'and_given'      # symbol transformation
-            self.And_given(bodylst)     # nested to the given
+            self.lex()
+            self.Empty_lines()
+            if self.sym == 'when':
+                self.When(bodylst, depth + 1)   # nested to the given
+                break
+            elif self.sym in ('and', 'but'):    # but s transformed to and_given
+                self.sym = 'and_given'          # symbol transformation
+                upperlst = bodylst              # nested to the given
+                depth += 1
+            else:
+                break
+        self.set_end(chain)
 
 
     def When_serie(self, upperlst):
         """Nonterminal for a serie of WHEN definitions.
         """
-        self.Empty_lines()      # neccessary for the recursion
-        if self.sym == 'when':
+        self.Empty_lines()
+        while self.sym == 'when':
             self.When(upperlst)
-            self.When_serie(upperlst)
+            self.Empty_lines()
 
 
-    def When(self, upperlst):
+    def When(self, upperlst, depth=3):
         """Nonterminal for one WHEN definition.
         """
         assert self.sym == 'when'
-        bodylst = []                    # of the when item
-        item = [self.sym, self.text, bodylst] # 'when', 'id', body
-        upperlst.append(tuple(item))    # when appended to the upperlst
+        self.check_depth(depth)
+        node = self.node(upperlst)      # 'when', 'id', body
+        bodylst = node.children
 
         self.lex()
         self.Empty_lines()
         if self.sym == 'then':
-            self.Then(bodylst)          # always nested to WHEN
-        elif self.sym == 'and':
-            self.sym = 'and_when'       # symbol transformation
-            self.And_when(bodylst)      # nested to WHEN
-        elif self.sym == 'but':         # but s transformed to and_when
-            self.sym = 'and_when'       # symbol transformation
-            self.And_when(bodylst)      # nested to the WHEN
+            self.Then(bodylst, depth + 1)   # always nested to WHEN
+        elif self.sym in ('and', 'but'):    # but s transformed to and_when
+            self.sym = 'and_when'           # symbol transformation
+            self.And_when(bodylst, depth + 1)   # nested to WHEN
+        node.end = self.prev_end
 
 
-    def And_when(self, upperlst):
-        """Nonterminal for one AND_WHEN definition.
-        """
-        assert self.sym == 'and_when'
-        bodylst = []                     # of the when item
-        item = [self.sym, self.text, bodylst] # 'when'/'and_when', 'id', body
-        upperlst.append(tuple(item))     # when appended to the upperlst
+    def And_when(self, upperlst, depth):
+        """Nonterminal for the chain of AND_WHEN definitions.
 
-        self.lex()
-        self.Empty_lines()
-        if self.sym == 'then':
-            self.Then(bodylst)          # always nested to WHEN
-        elif self.sym == 'and':
-            self.sym = 'and_when'       # symbol transformation
-            self.And_when(bodylst)      # nested to WHEN
-        elif self.sym == 'but':         # but s transformed to and_when
-            self.sym = 'and_when'       # symbol transformation
-            self.And_when(bodylst)      # nested to the WHEN
-
-
-    def Then(self, upperlst):
-        """Nonterminal for one THEN definition.
+        Each next and_when is nested to the previous one. The chain
+        is processed by the loop.
         """
-        assert self.sym == 'then'
-        bodylst = []
-        item = [self.sym, self.text, bodylst] # 'then'/'and_then', 'id', body
-        upperlst.append(tuple(item))     # appended to the upper then-item
+        chain = []                      # the nodes get the common end
+        while True:
+            assert self.sym == 'and_when'
+            self.check_depth(depth)
+            node = self.node(upperlst)      # 'and_when', 'id', body
+            bodylst = node.children
+            chain.append(node)
 
-        self.lex()
-        self.Empty_lines()
-        if self.sym == 'and':
-            self.sym = 'and_then'       # symbol transformation
-            self.And_then(bodylst)      # nested to the previous then-item
-
-
-    def And_then(self, upperlst):
-        """Nonterminal for one AND_THEN definition.
+            self.lex()
+            self.Empty_lines()
+            if self.sym == 'then':
+                self.Then(bodylst, depth + 1)   # always nested to WHEN
+                break
+            elif self.sym in ('and', 'but'):    # but s transformed to and_when
+                self.sym = 'and_when'           # symbol transformation
+                upperlst = bodylst              # nested to the WHEN
+                depth += 1
+            else:
+                break
+        self.set_end(chain)
+
+
+    def Then(self, upperlst, depth):
+        """Nonterminal for one THEN definition followed by the AND_THEN chain.
+
+        Each and_then is nested to the previous then-item. The chain
+        is processed by the loop.
         """
-        assert self.sym == 'and_then'
-        bodylst = []
-        item = [self.sym, self.text, bodylst] # 'then'/'and_then', 'id', body
-        upperlst.append(tuple(item))    # appended to the upper then-item
+        assert self.sym == 'then'
+        chain = []                      # the nodes get the common end
+        while True:
+            self.check_depth(depth)
+            node = self.node(upperlst)  # 'then'/'and_then', 'id', body
+            chain.append(node)
 
-        self.lex()
-        self.Empty_lines()
-        if self.sym == 'and':
+            self.lex()
+            self.Empty_lines()
+            if self.sym != 'and':
+                break
             self.sym = 'and_then'       # symbol transformation
-            self.And_then(bodylst)      # nested to the previous then-item
+            upperlst = node.children    # nested to the previous then-item
+            depth += 1
+        self.set_end(chain)
 
 
 #-----------------------------------------------------------------------
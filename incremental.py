@@ -0,0 +1,244 @@
+#!python3
+"""Incremental reparsing of the edited sources.
+
+    src = incremental.FeatureSource(text)
+    src.edit((4, 10), (4, 15), 'new text')      # (line, character) from 0
+    src.tree, src.diagnostics
+
+The top-level items (scenarios and test cases) are independent of each
+other. Each one starts with its header (Scenario:, SCENARIO(...), ...)
+and ends in front of the next header. After the edit, only the items
+around the edited part are parsed again. The analysis starts at the header
+of the item that contains the beginning of the edit. It stops at the first
+header behind the edit that was a header also before the edit; the items
+from there are the old ones with the spans moved. The story/feature item
+and the description are parsed again only when the edit is in front of
+the first header.
+
+The lexical analysis of the feature files is line oriented; only
+the edited lines are split again. The Catch lexer starts at the offset of
+the first reparsed item.
+
+The tree is updated in place. The reused items are the same Node objects;
+the spans of the ones behind the edit are moved.
+"""
+
+import fesyn
+import tsyn
+
+from lineindex import LineIndex
+from syntree import Kind
+
+
+header_kinds = (Kind.SCENARIO, Kind.TEST_CASE)
+head_kinds = (Kind.STORY, Kind.FEATURE)
+
+
+class IncrementalSource:
+    """The source with its syntax tree and diagnostics, updated by the edits.
+
+    The subclasses define the units of the spans (lines or chars).
+    The resumable set contains the starts of the headers where the analysis
+    can start: the analyzer was between the top-level items there, and the
+    lexer did not depend on the previous tokens. The reparsed attribute
+    is the number of the top-level items parsed by the last edit (or reset).
+    """
+
+    def __init__(self, text, recover=True):
+        self.recover = recover
+        self.reset(text)
+
+
+    def reset(self, text):
+        """Replaces the whole source and parses it.
+        """
+        self.set_text(text)
+        self.tree = []
+        self.diagnostics = []
+        self.resumable = set()
+        self.reparse(0, 0, 0)
+
+
+    def reparse(self, start, old_end, new_end, intact=None):
+        """Parses the edited part again and reuses the rest of the tree.
+
+        The source[start:old_end] was replaced by the source[start:new_end]
+        (lines or chars). The headers in front of the intact position
+        (the start by default) were not touched by the edit. Without
+        the recovery mode, the ParseError leaves the empty tree; the next
+        edit parses the whole source.
+        """
+        tree = self.tree
+        self.tree = []
+        self.diagnostics = []
+        delta = new_end - old_end
+        if intact is None:
+            intact = start
+
+        # The items in front of the last resumable header before the edit
+        # are kept.
+        first = 0                       # index of the first reparsed item
+        begin = 0                       # and its start
+        headers = {}                    # old start --> index of the item
+        for i, node in enumerate(tree):
+            if node.kind in header_kinds and node.start in self.resumable:
+                if node.start < intact:
+                    first, begin = i, node.start
+                elif node.start >= old_end:
+                    headers[node.start] = i
+        items = tree[:first]
+        resumable = {pos for pos in self.resumable if pos <= begin}
+        diagnostics = self.kept_diagnostics(begin) if begin > 0 else []
+
+        sa = self.analyzer(begin)
+        self.reparsed = 0
+        resumed = None
+        for node in sa.iter_items():
+            items.append(node)
+            self.reparsed += 1
+            if sa.sym in ('scenario', 'test_case') and sa.it.resumable():
+                pos = sa.it.offset(sa.lextoken)
+                # The description may follow the story/feature item.
+                if node.kind not in head_kinds and pos >= new_end \
+                   and pos - delta in headers:
+                    resumed = pos - delta
+                    break
+                resumable.add(pos)
+        diagnostics.extend(sa.diagnostics)
+
+        if resumed is not None:
+            reused = tree[headers[resumed]:]
+            if delta:
+                for node in reused:
+                    node.move(delta)
+            items.extend(reused)
+            resumable.update(pos + delta for pos in self.resumable
+                             if pos >= resumed)
+            diagnostics.extend(self.moved_diagnostics(resumed, resumed + delta))
+        self.tree = items
+        self.resumable = resumable
+        self.diagnostics = diagnostics
+
+#-----------------------------------------------------------------------
+
+class FeatureSource(IncrementalSource):
+    """The .feature source kept as the list of lines; the spans are lines.
+    """
+
+    def set_text(self, text):
+        self.old_diagnostics = []
+        lines = text.split('\n')
+        self.lines = [line + '\n' for line in lines[:-1]]
+        self.lines.append(lines[-1])
+
+
+    @property
+    def text(self):
+        return ''.join(self.lines)
+
+
+    def analyzer(self, start):
+        return fesyn.SyntacticAnalyzerForFeature(self.lines,
+                                                 recover=self.recover,
+                                                 start=start)
+
+
+    def clamp(self, position):
+        """Returns (line, character) limited to the existing text.
+        """
+        line, character = position
+        if line >= len(self.lines):
+            line = len(self.lines) - 1
+            character = len(self.lines[line])
+        return line, min(character, len(self.lines[line].rstrip('\n')))
+
+
+    def edit(self, start, end, text):
+        """Replaces the text between the (line, character) positions.
+        """
+        (l1, c1), (l2, c2) = self.clamp(start), self.clamp(end)
+        lines = self.lines
+        pieces = (lines[l1][:c1] + text + lines[l2][c2:]).split('\n')
+        new_lines = [piece + '\n' for piece in pieces[:-1]]
+        if l2 == len(lines) - 1:
+            new_lines.append(pieces[-1])    # the last line has no newline
+        lines[l1:l2 + 1] = new_lines
+        self.old_diagnostics = self.diagnostics
+        self.reparse(l1, l2 + 1, l1 + len(new_lines))
+
+
+    def kept_diagnostics(self, begin):
+        # The problem reported at the header belongs to the previous item.
+        return [d for d in self.old_diagnostics if d.line - 1 <= begin]
+
+
+    def moved_diagnostics(self, old_pos, new_pos):
+        return [d.moved(d.line + new_pos - old_pos, d.column)
+                for d in self.old_diagnostics if d.line - 1 > old_pos]
+
+#-----------------------------------------------------------------------
+
+class CatchSource(IncrementalSource):
+    """The Catch source kept as the string; the spans are char offsets.
+    """
+
+    def __init__(self, text, recover=True, engine='skim'):
+        self.engine = engine
+        IncrementalSource.__init__(self, text, recover)
+
+
+    def set_text(self, text):
+        self.text = text
+        self.index = LineIndex(text)
+        self.old_text = text
+        self.old_diagnostics = []
+
+
+    def analyzer(self, start):
+        sa = tsyn.SyntacticAnalyzerForCatch(self.text, self.engine,
+                                            recover=self.recover, start=start)
+        sa.it.container.index = self.index      # kept up to date by edit()
+        return sa
+
+
+    def edit(self, start, end, text):
+        """Replaces the text between the (line, character) positions.
+        """
+        a = min(self.index.offset(start[0] + 1, start[1] + 1), len(self.text))
+        b = min(self.index.offset(end[0] + 1, end[1] + 1), len(self.text))
+        self.old_text = self.text
+        self.old_diagnostics = self.diagnostics
+        self.text = self.text[:a] + text + self.text[b:]
+        self.index.replace(a, b, text)
+
+        # The header on the edited line may be broken by the edit.
+        self.reparse(a, b, a + len(text), a - start[1])
+
+
+    def kept_diagnostics(self, begin):
+        # The problem reported at the header belongs to the previous item.
+        pos = position(self.old_text, begin)
+        return [d for d in self.old_diagnostics if (d.line, d.column) <= pos]
+
+
+    def moved_diagnostics(self, old_pos, new_pos):
+        old_line, old_column = position(self.old_text, old_pos)
+        new_line, new_column = position(self.text, new_pos)
+        lst = []
+        for d in self.old_diagnostics:
+            if (d.line, d.column) > (old_line, old_column):
+                column = d.column
+                if d.line == old_line:
+                    column += new_column - old_column
+                lst.append(d.moved(d.line + new_line - old_line, column))
+        return lst
+
+
+def position(text, offset):
+    """Returns (line, column) of the offset, both from 1.
+
+    Used only for a few offsets; the LineIndex of the old text
+    is not kept.
+    """
+    return (text.count('\n', 0, offset) + 1,
+            offset - text.rfind('\n', 0, offset))
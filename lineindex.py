@@ -0,0 +1,64 @@
+#!python3
+"""Line and column lookup for offsets in a source string.
+"""
+
+import bisect
+
+
+class LineIndex:
+    """Table of the newline offsets of the source.
+
+    The table is built in one pass using str.find(). The position()
+    then finds the line via bisection; hence, the lexical analyzers need not
+    count the lines char by char.
+    """
+
+    def __init__(self, source):
+        self.newlines = []
+        pos = source.find('\n')
+        while pos >= 0:
+            self.newlines.append(pos)
+            pos = source.find('\n', pos + 1)
+
+
+    def lineno(self, offset):
+        """Returns the line number (from 1) of the char at the offset.
+        """
+        return bisect.bisect_left(self.newlines, offset) + 1
+
+
+    def position(self, offset):
+        """Returns (line, column) of the char at the offset, both from 1.
+        """
+        n = bisect.bisect_left(self.newlines, offset)
+        linestart = self.newlines[n - 1] + 1 if n > 0 else 0
+        return n + 1, offset - linestart + 1
+
+
+    def offset(self, line, column):
+        """Returns the offset of the (line, column), both from 1.
+
+        The inverse of the position(). The line behind the last one
+        is the end of the source.
+        """
+        if line <= 1:
+            return column - 1
+        return self.newlines[min(line, len(self.newlines) + 1) - 2] + column
+
+
+    def replace(self, start, end, text):
+        """Updates the table for the source[start:end] replaced by the text.
+
+        Only the newlines behind the edit are moved; the source is not
+        scanned again.
+        """
+        lo = bisect.bisect_left(self.newlines, start)
+        hi = bisect.bisect_left(self.newlines, end)
+        delta = len(text) - (end - start)
+        inserted = []
+        pos = text.find('\n')
+        while pos >= 0:
+            inserted.append(start + pos)
+            pos = text.find('\n', pos + 1)
+        self.newlines[lo:] = inserted + [pos + delta
+                                         for pos in self.newlines[hi:]]
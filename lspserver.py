@@ -0,0 +1,469 @@
+#!python3
+"""Long-running language server for the .feature files and the Catch sources.
+
+The server speaks the subset of the Language Server Protocol (JSON-RPC with
+the Content-Length headers) over the stdio or over the Unix socket:
+
+    python lspserver.py                     (stdio)
+    python lspserver.py --socket PATH       (Unix socket, more clients)
+
+The opened documents are parsed in the recovery mode and their trees are kept
+in the memory. After the change, only the edited part of the document is
+parsed again (see the incremental module). The other files (the counterparts
+for the go-to-definition) are parsed via the parsecache. Supported:
+
+    initialize, shutdown, exit
+    textDocument/didOpen, didChange (incremental), didClose
+    textDocument/publishDiagnostics (sent by the server)
+    textDocument/documentSymbol
+    textDocument/definition -- from a scenario or a step to the corresponding
+                               Catch block, and back
+
+The characters in the positions are counted as the code points (not as
+the UTF-16 code units); they differ only for the chars outside of the BMP.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import urllib.parse
+import urllib.request
+
+import incremental
+import parsecache
+
+from diagnostic import Diagnostic
+from lineindex import LineIndex
+from parsecache import catch_extensions, source_kind
+from syntree import Kind
+
+
+# LSP SymbolKind values for the syntax tree items.
+symbol_kinds = {
+    Kind.STORY: 2,          # Module
+    Kind.FEATURE: 2,
+    Kind.TEST_CASE: 5,      # Class
+    Kind.SCENARIO: 5,
+    Kind.SECTION: 6,        # Method
+    Kind.GIVEN: 12,         # Function
+    Kind.AND_GIVEN: 12,
+    Kind.WHEN: 12,
+    Kind.AND_WHEN: 12,
+    Kind.THEN: 12,
+    Kind.AND_THEN: 12,
+}
+
+sources = {'feature': incremental.FeatureSource,
+           'catch':   incremental.CatchSource}
+
+
+def uri_to_path(uri):
+    return urllib.request.url2pathname(urllib.parse.urlparse(uri).path)
+
+
+def path_to_uri(path):
+    return 'file://' + urllib.request.pathname2url(os.path.abspath(path))
+
+
+def counterparts(path):
+    """Returns the candidate names of the corresponding file.
+
+    The features/X.feature corresponds to tests/X.cpp (.hpp, .h), and
+    vice versa -- the same layout as used by f2c and c2f.
+    """
+    d, bname = os.path.split(os.path.abspath(path))
+    name, ext = os.path.splitext(bname)
+    parent = os.path.dirname(d)
+    if ext == '.feature':
+        return [os.path.join(parent, 'tests', name + e) for e in catch_extensions]
+    return [os.path.join(parent, 'features', name + '.feature')]
+
+#-----------------------------------------------------------------------
+
+class Document:
+    """The text of the document, its syntax tree, and its diagnostics.
+    """
+
+    def __init__(self, uri, text, tree=None):
+        self.uri = uri
+        self.kind = source_kind(uri_to_path(uri))
+        self.tree = tree
+        self.diagnostics = []
+        if tree is None:
+            self.source = sources[self.kind]('')
+            self.update(text)
+        else:
+            self.source = None      # already parsed (taken from the cache)
+            self.index = LineIndex(text)
+
+
+    def update(self, text, range=None):
+        """Replaces the text and parses the changed part of the document.
+
+        The range is the LSP range of the replaced text; None for the whole
+        text.
+        """
+        try:
+            if range is None:
+                self.source.reset(text)
+            else:
+                start, end = range['start'], range['end']
+                self.source.edit((start['line'], start['character']),
+                                 (end['line'], end['character']), text)
+            self.tree = self.source.tree
+            self.diagnostics = self.source.diagnostics
+        except Exception as e:
+            # The lexical errors and the unsupported constructs.
+            msg = '{}: {}'.format(type(e).__name__, e)
+            self.tree = []
+            self.diagnostics = [Diagnostic(None, 1, 1, (), None, None, msg)]
+        self.index = getattr(self.source, 'index', None)
+
+
+    def position(self, offset_or_line):
+        """Returns the LSP position of the start of the node span.
+        """
+        if self.kind == 'feature':
+            return {'line': offset_or_line, 'character': 0}
+        line, column = self.index.position(offset_or_line)
+        return {'line': line - 1, 'character': column - 1}
+
+
+    def range(self, node):
+        start = self.position(node.start)
+        end = self.position(node.end if node.end is not None else node.start)
+        return {'start': start, 'end': end}
+
+
+    def contains(self, node, line, character):
+        """Checks whether the node span contains the LSP position.
+        """
+        if node.start is None:
+            return False
+        r = self.range(node)
+        pos = (line, character)
+        start = (r['start']['line'], r['start']['character'])
+        end = (r['end']['line'], r['end']['character'])
+        if self.kind == 'feature':
+            return start[0] <= line < max(end[0], start[0] + 1)
+        return start <= pos < end
+
+
+    def lsp_diagnostics(self):
+        lst = []
+        for d in self.diagnostics:
+            pos = {'line': max(d.line - 1, 0),
+                   'character': max(d.column - 1, 0)}
+            lst.append({'range': {'start': pos, 'end': pos},
+                        'severity': 1, 'source': 'bddtool',
+                        'message': d.message.strip()})
+        return lst
+
+
+    def symbols(self, nodes=None):
+        """Returns the list of the LSP DocumentSymbol for the tree.
+        """
+        lst = []
+        for node in self.tree if nodes is None else nodes:
+            if node.kind not in symbol_kinds or node.start is None:
+                continue
+            r = self.range(node)
+            children = node.children if node.children is not None else []
+            lst.append({'name': node.text or '', 'detail': node.symbol,
+                        'kind': symbol_kinds[node.kind],
+                        'range': r,
+                        'selectionRange': {'start': r['start'],
+                                           'end': r['start']},
+                        'children': self.symbols(children)})
+        return lst
+
+
+    def path_at(self, line, character):
+        """Returns the list of the nested nodes at the LSP position.
+        """
+        path = []
+        nodes = self.tree
+        while nodes:
+            for node in nodes:
+                if node.kind in symbol_kinds and node.children is not None \
+                   and self.contains(node, line, character):
+                    path.append(node)
+                    nodes = node.children
+                    break
+            else:
+                break
+        return path
+
+#-----------------------------------------------------------------------
+
+def find_path(tree, texts):
+    """Returns the nodes of the tree that best match the texts of the path.
+
+    The deepest node with the same texts on the path is returned with its
+    ancestors. The kinds are not compared (AND_GIVEN in the feature is
+    GIVEN in Catch).
+    """
+    found = []
+    nodes = tree
+    for text in texts:
+        for node in nodes:
+            if node.text == text and node.children is not None:
+                found.append(node)
+                nodes = node.children
+                break
+        else:
+            break
+    return found
+
+
+class Workspace:
+    """The opened documents shared by the connections.
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.lock = threading.Lock()
+        self.trees = parsecache.TreeCache()
+
+
+    def open(self, uri, text):
+        doc = Document(uri, text)
+        with self.lock:
+            self.documents[uri] = doc
+        return doc
+
+
+    def get(self, uri):
+        with self.lock:
+            return self.documents.get(uri)
+
+
+    def close(self, uri):
+        with self.lock:
+            self.documents.pop(uri, None)
+
+
+    def counterpart(self, doc):
+        """Returns the Document for the corresponding file, or None.
+
+        The opened document is used if possible; otherwise, the file
+        is parsed (or taken from the cache).
+        """
+        for path in counterparts(uri_to_path(doc.uri)):
+            uri = path_to_uri(path)
+            other = self.get(uri)
+            if other is not None:
+                return other
+            if os.path.isfile(path):
+                with open(path, encoding='utf_8') as f:
+                    text = f.read()
+                try:
+                    tree = self.trees.parse(path, source_kind(path))
+                except Exception:
+                    return None
+                return Document(uri, text, tree)
+        return None
+
+
+    def definition(self, doc, line, character):
+        """Returns the LSP Location of the corresponding block, or None.
+        """
+        path = doc.path_at(line, character)
+        if not path:
+            return None
+        other = self.counterpart(doc)
+        if other is None:
+            return None
+        found = find_path(other.tree, [node.text for node in path])
+        if not found:
+            return None
+        node = found[-1]
+        start = other.position(node.start)
+        return {'uri': other.uri, 'range': {'start': start, 'end': start}}
+
+#-----------------------------------------------------------------------
+
+class Connection:
+    """JSON-RPC over the pair of binary streams.
+    """
+
+    def __init__(self, workspace, rfile, wfile):
+        self.workspace = workspace
+        self.rfile = rfile
+        self.wfile = wfile
+        self.wlock = threading.Lock()
+        self.shutdown_requested = False
+
+
+    def read_message(self):
+        """Returns the decoded message, or None at the end of the stream.
+        """
+        length = None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return None
+            line = line.strip()
+            if not line:
+                break                   # end of the headers
+            name, _, value = line.decode('ascii').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        if length is None:
+            return None
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+
+    def send(self, message):
+        message['jsonrpc'] = '2.0'
+        body = json.dumps(message).encode('utf-8')
+        with self.wlock:
+            self.wfile.write('Content-Length: {}\r\n\r\n'.format(
+                             len(body)).encode('ascii'))
+            self.wfile.write(body)
+            self.wfile.flush()
+
+
+    def notify(self, method, params):
+        self.send({'method': method, 'params': params})
+
+
+    def serve(self):
+        """Processes the messages until the exit notification.
+        """
+        while True:
+            message = self.read_message()
+            if message is None or message.get('method') == 'exit':
+                break
+            method = message.get('method')
+            handler = getattr(self, 'on_' + (method or '').replace('/', '_'),
+                              None)
+            is_request = 'id' in message
+            try:
+                if handler is None:
+                    if is_request:
+                        self.send({'id': message['id'], 'error': {
+                                   'code': -32601,
+                                   'message': 'Method not found: {}'.format(method)}})
+                    continue
+                result = handler(message.get('params') or {})
+                if is_request:
+                    self.send({'id': message['id'], 'result': result})
+            except Exception as e:
+                if is_request:
+                    self.send({'id': message['id'], 'error': {
+                               'code': -32603, 'message': str(e)}})
+
+
+    def publish(self, doc):
+        self.notify('textDocument/publishDiagnostics',
+                    {'uri': doc.uri, 'diagnostics': doc.lsp_diagnostics()})
+
+
+    #-------------------------------------------------------------------------
+    def on_initialize(self, params):
+        return {'capabilities': {
+                    'textDocumentSync': 2,      # incremental
+                    'documentSymbolProvider': True,
+                    'definitionProvider': True},
+                'serverInfo': {'name': 'bddtool'}}
+
+
+    def on_initialized(self, params):
+        return None
+
+
+    def on_shutdown(self, params):
+        self.shutdown_requested = True
+        return None
+
+
+    def on_textDocument_didOpen(self, params):
+        td = params['textDocument']
+        self.publish(self.workspace.open(td['uri'], td['text']))
+
+
+    def on_textDocument_didChange(self, params):
+        uri = params['textDocument']['uri']
+        doc = self.workspace.get(uri)
+        if doc is None:
+            doc = self.workspace.open(uri, '')
+        for change in params['contentChanges']:
+            doc.update(change['text'], change.get('range'))
+        self.publish(doc)
+
+
+    def on_textDocument_didClose(self, params):
+        self.workspace.close(params['textDocument']['uri'])
+
+
+    def on_textDocument_documentSymbol(self, params):
+        doc = self.workspace.get(params['textDocument']['uri'])
+        return doc.symbols() if doc is not None else []
+
+
+    def on_textDocument_definition(self, params):
+        doc = self.workspace.get(params['textDocument']['uri'])
+        if doc is None:
+            return None
+        pos = params['position']
+        return self.workspace.definition(doc, pos['line'], pos['character'])
+
+#-----------------------------------------------------------------------
+
+def serve_stdio(workspace):
+    """Serves the client connected to the stdin and the stdout.
+
+    The messages are written to the private duplicate of the stdout
+    descriptor. The descriptor 1 and the sys.stdout are redirected
+    to the stderr; hence, no print() of the analyzers gets into
+    the stream of the messages.
+    """
+    sys.stdout.flush()
+    wfile = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+    Connection(workspace, sys.stdin.buffer, wfile).serve()
+
+
+def serve_socket(path, workspace):
+    """Serves the clients connected to the Unix socket, each in its thread.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+    try:
+        while True:
+            conn, _ = server.accept()
+            rfile = conn.makefile('rb')
+            wfile = conn.makefile('wb')
+            def serve(conn=conn, rfile=rfile, wfile=wfile):
+                try:
+                    Connection(workspace, rfile, wfile).serve()
+                finally:
+                    conn.close()
+            threading.Thread(target=serve, daemon=True).start()
+    finally:
+        server.close()
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Language server for the .feature files and Catch sources.')
+    parser.add_argument('--socket', help='Unix socket path (default: stdio)')
+    args = parser.parse_args()
+
+    workspace = Workspace()
+    if args.socket:
+        try:
+            serve_socket(args.socket, workspace)
+        except KeyboardInterrupt:
+            pass
+    else:
+        serve_stdio(workspace)
@@ -0,0 +1,175 @@
+#!python3
+"""Manifest of the converted files for the incremental regeneration.
+
+The manifest is stored next to the output files. For each input file, it
+remembers the hash of the content that was converted and the output files.
+The input is converted again only when its content changed, when any output
+disappeared, or when the tool or the generator settings changed (see
+the fingerprint()).
+"""
+
+import hashlib
+import json
+import os
+import outfile
+
+
+def file_hash(fname):
+    """Returns the hex SHA-1 of the content of the file.
+    """
+    h = hashlib.sha1()
+    with open(fname, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def fingerprint(fnames, settings):
+    """Returns the hash of the tool sources and of the generator settings.
+
+    The fnames are the source files of the modules used for the conversion.
+    Any change of the code (i.e. new version of the tool) or of the settings
+    (the dictionary with the JSON serializable values) makes all the files
+    to be converted again.
+    """
+    h = hashlib.sha1()
+    for fname in fnames:
+        with open(fname, 'rb') as f:
+            h.update(f.read())
+    h.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+    return h.hexdigest()
+
+
+class Manifest:
+    """Records of the converted input files.
+
+    The records are keyed by the input file name relative to the directory
+    of the manifest. Each record contains the content hash, and the size
+    and the mtime of the input (to avoid hashing of the unchanged files),
+    and the names of the output files. The optional outputs(fname_in,
+    fname_out) returns all the output files of the task (when the conversion
+    writes more of them); by default, only the fname_out is the output.
+    """
+
+    def __init__(self, fname, fingerprint, outputs=None):
+        self.fname = fname
+        self.fingerprint = fingerprint
+        self.outputs = outputs
+        self.dir = os.path.dirname(os.path.abspath(fname))
+        self.files = {}
+        self.pending = {}       # records of the inputs being converted
+
+        # The manifest of the other tool version or the broken one is ignored;
+        # hence, everything is converted again.
+        try:
+            with open(fname, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('fingerprint') == fingerprint:
+                self.files = data['files']
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+
+    def key(self, fname):
+        return os.path.relpath(os.path.abspath(fname), self.dir)
+
+
+    def clear(self):
+        """Forgets all the records -- for the forced full rebuild.
+        """
+        self.files = {}
+
+
+    def stat(self, fname_in):
+        """Returns the record for the current content of the input file.
+        """
+        st = os.stat(fname_in)
+        rec = self.files.get(self.key(fname_in))
+        if rec is not None and rec['size'] == st.st_size \
+           and rec['mtime_ns'] == st.st_mtime_ns:
+            content_hash = rec['hash']      # not touched, no need to read it
+        else:
+            content_hash = file_hash(fname_in)
+        return {'hash': content_hash, 'size': st.st_size,
+                'mtime_ns': st.st_mtime_ns}
+
+
+    def changed(self, fname_in):
+        """Checks whether the input file must be converted again.
+
+        Returns the new record to be remembered after the conversion,
+        or None when the input need not be converted.
+        """
+        new = self.stat(fname_in)
+        rec = self.files.get(self.key(fname_in))
+        if rec is not None and rec['hash'] == new['hash'] \
+           and all(os.path.isfile(os.path.join(self.dir, output))
+                   for output in rec.get('outputs', [rec['output']])):
+            if rec['mtime_ns'] != new['mtime_ns']:
+                rec.update(new)         # touched only, remember the new stat
+            return None
+        return new
+
+
+    def select(self, tasks, prune=True):
+        """Returns the (fname_in, fname_out) tasks that must be converted.
+
+        The records of the inputs that are not in the tasks are forgotten
+        unless prune is False (when the tasks are only the part of the inputs).
+        The new records of the selected inputs wait for the confirm().
+        """
+        if prune:
+            self.prune(fname_in for fname_in, fname_out in tasks)
+        selected = []
+        for fname_in, fname_out in tasks:
+            record = self.changed(fname_in)
+            if record is not None:
+                # The names are taken before the conversion writes the files.
+                if self.outputs is not None:
+                    record['outputs'] = [self.key(fname) for fname
+                                         in self.outputs(fname_in, fname_out)]
+                self.pending[self.key(fname_in)] = record
+                selected.append((fname_in, fname_out))
+        return selected
+
+
+    def confirm(self, results):
+        """Remembers the successfully converted files from the batch.run().
+
+        Passes the (fname_in, fname_out, error) results through. The failed
+        inputs are not remembered; hence, they are converted the next time.
+        """
+        for fname_in, fname_out, error in results:
+            record = self.pending.pop(self.key(fname_in), None)
+            if error is None and record is not None:
+                self.update(fname_in, fname_out, record)
+            yield fname_in, fname_out, error
+
+
+    def update(self, fname_in, fname_out, record):
+        """Remembers the converted input file.
+        """
+        record = dict(record)
+        record['output'] = self.key(fname_out)
+        record.setdefault('outputs', [record['output']])
+        self.files[self.key(fname_in)] = record
+
+
+    def prune(self, fnames_in):
+        """Forgets the records of the inputs that are not in fnames_in.
+        """
+        keys = {self.key(fname) for fname in fnames_in}
+        for key in list(self.files):
+            if key not in keys:
+                del self.files[key]
+
+
+    def save(self):
+        """Writes the manifest via the temporary file.
+
+        The manifest is replaced atomically; hence, the interrupted run
+        does not leave the broken manifest.
+        """
+        with outfile.OutputFile(self.fname) as f:
+            json.dump({'fingerprint': self.fingerprint, 'files': self.files},
+                      f, indent=1, sort_keys=True)
@@ -0,0 +1,92 @@
+#!python3
+"""Output files that are not rewritten when their content does not change.
+
+The generated sources are compiled by make/ninja. Rewriting the file with
+the same content would change its mtime, and all the dependent sources
+would be recompiled for nothing.
+"""
+
+import os
+
+
+def same_content(fname1, fname2):
+    """Checks whether the files exist and have the same content.
+
+    The sizes are compared first; the content is read only when they equal.
+    """
+    try:
+        if os.path.getsize(fname1) != os.path.getsize(fname2):
+            return False
+        with open(fname1, 'rb') as f1, open(fname2, 'rb') as f2:
+            while True:
+                chunk1 = f1.read(1 << 16)
+                if chunk1 != f2.read(1 << 16):
+                    return False
+                if not chunk1:
+                    return True
+    except OSError:
+        return False
+
+
+class OutputFile:
+    """Context manager for writing the text file via the temporary file.
+
+    The content is written to the temporary file in the same directory.
+    When closed, the temporary file is compared with the existing file (the
+    size first, then the content). The identical one is removed; otherwise,
+    it atomically replaces the existing file. If the writing fails,
+    the existing file stays untouched.
+
+        with OutputFile(fname) as f:
+            f.write(...)
+
+    The changed attribute tells whether the file was replaced.
+    """
+
+    def __init__(self, fname, encoding='utf_8'):
+        self.fname = fname
+        self.encoding = encoding
+        self.tmpname = '{}.{}.tmp'.format(fname, os.getpid())
+        self.f = None
+        self.changed = None
+
+
+    def __enter__(self):
+        self.f = open(self.tmpname, 'w', encoding=self.encoding)
+        return self.f
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.f.close()
+        if exc_type is not None:
+            os.remove(self.tmpname)     # the existing file is not touched
+            return False
+
+        if same_content(self.tmpname, self.fname):
+            os.remove(self.tmpname)
+            self.changed = False
+        else:
+            os.replace(self.tmpname, self.fname)
+            self.changed = True
+        return False
+
+
+class LineWriter:
+    """Writes the lines to the text file, separated by the newlines.
+
+    There is no newline after the last line. The instance is called
+    with one line; it is used as the sink of the code generators.
+
+        write = LineWriter(f)
+        write('first line')
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.sep = ''
+
+
+    def __call__(self, line):
+        self.f.write(self.sep)
+        self.f.write(line)
+        self.sep = '\n'
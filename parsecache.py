@@ -0,0 +1,128 @@
+#!python3
+"""In-process memoization of the parsed syntax trees for the library callers.
+
+    import parsecache
+    tree = parsecache.parse_feature('features/x.feature')
+    tree = parsecache.parse_catch('tests/x.hpp')
+
+The file is parsed again only when its size or its mtime changed. The trees
+are shared by the callers; they must not be modified.
+"""
+
+import astcache
+import collections
+import os
+import threading
+
+
+class TreeCache:
+    """Bounded LRU cache of the syntax trees of the files.
+
+    The entries are keyed by the kind ('feature' or 'catch') and the path.
+    The entry is valid while the file has the same size and mtime_ns.
+    The optional disk_cache (astcache.ASTCache) is used for the misses.
+    The hits and the misses count the lookups.
+    """
+
+    def __init__(self, max_entries=256, disk_cache=None):
+        self.max_entries = max_entries
+        self.disk_cache = disk_cache
+        self.entries = collections.OrderedDict()    # the recently used last
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+
+    def parse(self, path, kind):
+        """Returns the syntax tree of the file.
+        """
+        key = (kind, os.path.abspath(path))
+        st = os.stat(path)
+        signature = (st.st_size, st.st_mtime_ns)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # Parsed without the lock; the other threads need not wait.
+        if self.disk_cache is not None:
+            tree = self.disk_cache.parse(path, kind)
+        else:
+            with open(path, encoding='utf_8') as f:
+                tree = astcache.analyzers[kind](f)
+
+        with self.lock:
+            self.entries[key] = (signature, tree)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return tree
+
+
+    def invalidate(self, path=None):
+        """Forgets the tree(s) of the file, or all the trees for None.
+        """
+        with self.lock:
+            if path is None:
+                self.entries.clear()
+                return
+            path = os.path.abspath(path)
+            for key in [key for key in self.entries if key[1] == path]:
+                del self.entries[key]
+
+
+    def stats(self):
+        """Returns the dictionary with the hits, misses, and entries counts.
+        """
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'entries': len(self.entries)}
+
+
+# The extensions of the Catch sources.
+catch_extensions = ('.cpp', '.hpp', '.h')
+
+
+def source_kind(path):
+    """Returns 'feature', 'catch', or None for the other files.
+    """
+    ext = os.path.splitext(path)[1]
+    if ext == '.feature':
+        return 'feature'
+    elif ext in catch_extensions:
+        return 'catch'
+    return None
+
+
+# The cache used by the module-level functions.
+cache = TreeCache()
+
+
+def parse_feature(path):
+    """Returns the syntax tree of the .feature file.
+    """
+    return cache.parse(path, 'feature')
+
+
+def parse_catch(path):
+    """Returns the syntax tree of the Catch source file.
+    """
+    return cache.parse(path, 'catch')
+
+
+def parse(path):
+    """Returns the syntax tree of the file; the kind is given by the extension.
+    """
+    kind = source_kind(path)
+    if kind is None:
+        raise ValueError('Unknown kind of the source: {!r}'.format(path))
+    return cache.parse(path, kind)
+
+
+def invalidate(path=None):
+    """Forgets the cached tree of the file, or all the trees for None.
+    """
+    cache.invalidate(path)
@@ -0,0 +1,200 @@
+#!python3
+"""Feature to the Python unittest skeleton (collected also by pytest).
+
+    python f2c.py --emit python         (pytests/X_test.py)
+
+The generated module contains one TestCase class for the feature. Each
+scenario (and test case) is one test method. The steps are the helper
+methods called by the test; the equal steps of more scenarios share
+the helper. When the scenario branches (e.g. more WHENs after
+the GIVEN), each path from the scenario to its last step is run
+as the subtest from the beginning -- like the Catch sections.
+"""
+
+import re
+
+from syntree import Kind
+
+
+# Prefixes of the helper names for the kinds of the steps.
+helper_prefixes = {
+    Kind.GIVEN: 'given',
+    Kind.AND_GIVEN: 'given',
+    Kind.WHEN: 'when',
+    Kind.AND_WHEN: 'when',
+    Kind.THEN: 'then',
+    Kind.AND_THEN: 'then',
+    Kind.SECTION: 'section',
+}
+
+# Hints inside the helpers.
+helper_hints = {
+    'given': 'set up initial state',
+    'when': 'perform operation',
+    'then': 'assert expected state',
+    'section': 'perform the operation and assert the state',
+}
+
+
+def identifier(text):
+    """Returns the lowercase Python identifier from the free text.
+    """
+    name = re.sub(r'\W+', '_', text.lower()).strip('_')
+    if not name:
+        return 'unnamed'
+    if name[0].isdigit():
+        return '_' + name
+    return name
+
+
+def class_name(text):
+    """Returns the CamelCase class name from the first words of the text.
+    """
+    words = re.findall(r'[^\W_]+', text)[:4]
+    name = ''.join(w[:1].upper() + w[1:] for w in words) + 'Tests'
+    if name[0].isdigit():
+        name = 'Test' + name
+    return name
+
+
+def docstring(text):
+    """Returns the text escaped for the triple-quoted docstring.
+    """
+    return text.replace('\\', '\\\\').replace('"""', '\\"\\"\\"')
+
+
+def step_paths(nodes, prefix=()):
+    """Generates the tuples of the steps from the first one to the last one.
+    """
+    for node in nodes:
+        path = prefix + (node,)
+        if node.children:
+            yield from step_paths(node.children, path)
+        else:
+            yield path
+
+#-----------------------------------------------------------------------
+
+class PythonCodeGenerator:
+    """Converts a syntax tree to the Python unittest skeleton.
+
+    The lines are passed to the emit sink as by the f2c.CatchCodeGenerator.
+    """
+
+    def __init__(self):
+        """Default settings initialization.
+        """
+        self.hint_flag = True
+        self.indent = ' ' * 4
+
+
+    def write_skeleton(self, syntax_tree, emit):
+        """Passes the lines of the test module from a syntax_tree to the emit.
+        """
+        i1 = self.indent
+        i2 = i1 * 2
+        title = None
+        description = []
+        tests = []
+        for node in syntax_tree:
+            if node.kind in (Kind.STORY, Kind.FEATURE):
+                title = node
+            elif node.kind == Kind.DESCRIPTION:
+                description = [line.strip() for line in node.children]
+            else:
+                tests.append(node)
+
+        # The module docstring.
+        emit('#!python3')
+        heading = 'Tests of the feature description.'
+        if title is not None:
+            heading = '{}: {}'.format(title.symbol.capitalize(), title.text)
+        emit('"""' + docstring(heading))
+        while description and not description[-1]:
+            description.pop()
+        if description:
+            emit('')
+            for line in description:
+                emit(docstring(line))
+        emit('"""')
+        emit('')
+        emit('import unittest')
+        emit('')
+        emit('')
+        emit('class {}(unittest.TestCase):'.format(
+             class_name(title.text) if title is not None else 'FeatureTests'))
+
+        if not tests:
+            emit(i1 + 'pass')
+            emit('')
+
+        # The test methods; the helpers are collected for later.
+        helpers = {}            # (prefix, text) --> method name
+        names = set()
+        for node in tests:
+            emit('')
+            emit(i1 + 'def test_{}(self):'.format(self.unique(identifier(node.text),
+                                                              names)))
+            emit(i2 + '"""' + docstring(node.text))
+            emit(i2 + '"""')
+            paths = list(step_paths(node.children))
+            if not paths:
+                emit(i2 + "self.fail('not implemented')")
+            elif len(paths) == 1:
+                for step in paths[0]:
+                    emit(i2 + 'self.{}()'.format(self.helper(step, helpers, names)))
+            else:
+                for path in paths:
+                    label = ' / '.join(step.text for step in path)
+                    emit(i2 + 'with self.subTest({!r}):'.format(label))
+                    for step in path:
+                        emit(i2 + i1 + 'self.{}()'.format(
+                             self.helper(step, helpers, names)))
+            emit('')
+
+        # The helpers for the steps.
+        for (prefix, text), name in helpers.items():
+            emit('')
+            emit(i1 + 'def {}(self):'.format(name))
+            emit(i2 + '"""' + docstring(text))
+            emit(i2 + '"""')
+            if self.hint_flag:
+                emit(i2 + '# ' + helper_hints[prefix])
+            emit(i2 + "self.fail('not implemented')")
+            emit('')
+
+        emit('')
+        emit("if __name__ == '__main__':")
+        emit(i1 + 'unittest.main()')
+
+
+    def helper(self, step, helpers, names):
+        """Returns the name of the helper method for the step.
+        """
+        prefix = helper_prefixes[step.kind]
+        key = (prefix, ' '.join(step.text.split()))
+        name = helpers.get(key)
+        if name is None:
+            name = self.unique(prefix + '_' + identifier(step.text), names)
+            helpers[key] = name
+        return name
+
+
+    def unique(self, name, names):
+        """Returns the name that is not in the names yet, and adds it there.
+        """
+        candidate = name
+        n = 1
+        while candidate in names:
+            n += 1
+            candidate = '{}_{}'.format(name, n)
+        names.add(candidate)
+        return candidate
+
+
+    def skeleton(self, syntax_tree):
+        """Returns list of lines of the test module from a syntax_tree.
+        """
+        out = []
+        self.write_skeleton(syntax_tree, out.append)
+        return out
@@ -0,0 +1,102 @@
+#!python3
+import os
+import unittest
+
+import sys
+sys.path.append('..')
+
+import astcache
+import tempfile
+import textwrap
+
+
+class ASTCacheTests(unittest.TestCase):
+    """Testing the on-disk cache of the syntax trees.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cachedir = os.path.join(self.tmpdir.name, 'cache')
+        self.fname = os.path.join(self.tmpdir.name, 'x.feature')
+        self.write(self.fname, textwrap.dedent("""\
+            Story: story identifier
+              description
+            Scenario: scenario identifier
+               Given: given identifier
+                When: when identifier
+                Then: then identifier
+            """))
+        self.parsed = 0
+        self.orig_parse = astcache.analyzers['feature']
+        astcache.analyzers['feature'] = self.counting_parse
+
+
+    def tearDown(self):
+        astcache.analyzers['feature'] = self.orig_parse
+        self.tmpdir.cleanup()
+
+
+    def counting_parse(self, source):
+        self.parsed += 1
+        return self.orig_parse(source)
+
+
+    def write(self, fname, content):
+        with open(fname, 'w', encoding='utf_8') as f:
+            f.write(content)
+
+
+    def test_hit_and_miss(self):
+        """the same content is parsed only once, also by another instance
+        """
+        cache = astcache.ASTCache(self.cachedir)
+        tree = cache.parse(self.fname, 'feature')
+        self.assertEqual(self.parsed, 1)
+        with open(self.fname, encoding='utf_8') as f:
+            self.assertEqual(tree, astcache.feature_tree(f))
+
+        cache2 = astcache.ASTCache(self.cachedir)
+        tree2 = cache2.parse(self.fname, 'feature')
+        self.assertEqual(self.parsed, 1)
+        self.assertEqual(tree2, tree)
+        self.assertEqual([node.span for node in tree2],
+                         [node.span for node in tree])
+
+        self.write(self.fname, 'Scenario: other\n')
+        self.assertEqual(cache.parse(self.fname, 'feature'),
+                         [('scenario', 'other', [])])
+        self.assertEqual(self.parsed, 2)
+
+
+    def test_broken_entry(self):
+        """broken entry is parsed again
+        """
+        cache = astcache.ASTCache(self.cachedir)
+        tree = cache.parse(self.fname, 'feature')
+        for name in os.listdir(self.cachedir):
+            self.write(os.path.join(self.cachedir, name), 'garbage')
+        self.assertEqual(cache.parse(self.fname, 'feature'), tree)
+        self.assertEqual(self.parsed, 2)
+
+
+    def test_evict(self):
+        """least recently used entries are removed above the limit
+        """
+        cache = astcache.ASTCache(self.cachedir)
+        for n in range(5):
+            self.write(self.fname, 'Scenario: scenario {}\n'.format(n))
+            cache.parse(self.fname, 'feature')
+            key = cache.key('feature', open(self.fname, 'rb').read())
+            os.utime(cache.entry_name(key), ns=(n * 10**9, n * 10**9))
+        sizes = [os.path.getsize(os.path.join(self.cachedir, name))
+                 for name in os.listdir(self.cachedir)]
+        self.assertEqual(len(sizes), 5)
+
+        cache.max_bytes = sum(sizes[:2])
+        cache.evict()
+        self.assertEqual(len(os.listdir(self.cachedir)), 2)
+        self.assertEqual(cache.load(key), [('scenario', 'scenario 4', [])])
+
+
+if __name__ == '__main__':
+    unittest.main()
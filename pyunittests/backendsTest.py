@@ -0,0 +1,133 @@
+#!python3
+import os
+import unittest
+
+import sys
+sys.path.append('..')
+
+import backends
+import f2c
+import fesyn
+import json
+import tempfile
+
+
+feature_text = '''\
+Story: story
+
+  description
+
+Scenario: scenario 1
+  Given: given 1
+    and: and given 1
+   When: when 1
+   Then: then 1
+'''
+
+
+class BackendsTests(unittest.TestCase):
+    """Testing the backends fed by the single syntax tree.
+    """
+
+    def lines(self, name):
+        tree = fesyn.SyntacticAnalyzerForFeature(feature_text).Start()
+        out = []
+        backends.registry[name].write(tree, out.append)
+        return out
+
+
+    def test_registry(self):
+        """backends are registered by name, --emit is validated
+        """
+        self.assertEqual(list(backends.registry)[:4],
+                         ['catch', 'python', 'json', 'markdown'])
+        self.assertEqual(backends.names_arg('json, catch'), ('json', 'catch'))
+        with self.assertRaises(ValueError):
+            backends.names_arg('catch,unknown')
+        self.assertEqual(backends.output_name('markdown', 'features/x.feature', 'r'),
+                         os.path.join('r', 'docs', 'x.md'))
+
+
+    def test_catch(self):
+        """catch backend gives the whole Catch source
+        """
+        lines = self.lines('catch')
+        self.assertEqual(lines[0], '#include "catch.hpp"')
+        self.assertIn('SCENARIO( "scenario 1" ) {', lines)
+        self.assertIn('        GIVEN( "and given 1" ) {', lines)
+
+
+    def test_json(self):
+        """json backend gives the tree with the spans
+        """
+        tree = json.loads('\n'.join(self.lines('json')))
+        self.assertEqual([item['symbol'] for item in tree],
+                         ['story', 'description', 'scenario'])
+        given = tree[2]['children'][0]
+        self.assertEqual((given['text'], given['start'], given['end']),
+                         ('given 1', 5, 9))
+        self.assertEqual(given['children'][0]['symbol'], 'and_given')
+
+
+    def test_markdown(self):
+        """markdown backend gives headings and nested lists
+        """
+        self.assertEqual(self.lines('markdown'), [
+            '# Story: story', '', 'description', '',
+            '## Scenario: scenario 1', '',
+            '- **Given** given 1',
+            '  - **and** and given 1',
+            '    - **When** when 1',
+            '      - **Then** then 1',
+            ''])
+
+
+    def test_feature_to_outputs(self):
+        """one parse feeds all the requested backends
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for d in ('features', 'tests', 'json', 'docs'):
+                os.mkdir(os.path.join(tmpdir, d))
+            fname_in = os.path.join(tmpdir, 'features', 'x.feature')
+            with open(fname_in, 'w', encoding='utf-8') as f:
+                f.write(feature_text)
+            emit = ('json', 'catch', 'markdown')
+            [(fname, fname_out)] = f2c.tasks(os.path.join(tmpdir, 'features'),
+                                             os.path.join(tmpdir, 'tests'), emit)
+            self.assertEqual(fname_out, os.path.join(tmpdir, 'json', 'x.json'))
+            f2c.feature_to_outputs(fname_in, fname_out, emit)
+            for name in ('json/x.json', 'tests/x.cpp', 'docs/x.md'):
+                self.assertTrue(os.path.isfile(os.path.join(tmpdir, name)))
+
+
+    def test_protected_skeletons(self):
+        """existing skeletons of the protected backends are not overwritten
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for d in ('features', 'tests', 'pytests', 'json'):
+                os.mkdir(os.path.join(tmpdir, d))
+            fname_in = os.path.join(tmpdir, 'features', 'm.feature')
+            with open(fname_in, 'w', encoding='utf-8') as f:
+                f.write(feature_text)
+            emit = ('python', 'catch', 'json')
+            for i in range(2):
+                [(fname, fname_out)] = f2c.tasks(os.path.join(tmpdir, 'features'),
+                                                 os.path.join(tmpdir, 'tests'), emit)
+                f2c.feature_to_outputs(fname_in, fname_out, emit)
+                if i == 0:
+                    for name in ('pytests/m_test.py', 'tests/m.cpp', 'json/m.json'):
+                        with open(os.path.join(tmpdir, name), 'a') as f:
+                            f.write('\n# filled in\n')
+
+            self.assertEqual(fname_out, os.path.join(tmpdir, 'pytests', 'm_test.skeleton'))
+            for name in ('pytests/m_test.py', 'tests/m.cpp'):
+                with open(os.path.join(tmpdir, name)) as f:
+                    self.assertTrue(f.read().endswith('# filled in\n'))
+            with open(os.path.join(tmpdir, 'json', 'm.json')) as f:
+                self.assertNotIn('# filled in', f.read())
+            self.assertEqual(sorted(os.listdir(os.path.join(tmpdir, 'tests'))),
+                             ['m.cpp', 'm.skeleton'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+#!python3
+import os
+import unittest
+
+import sys
+sys.path.append('..')
+
+import batch
+import tempfile
+
+
+def copy_upper(fname_in, fname_out):
+    """Conversion used by the tests -- fails for the names with 'bad'.
+    """
+    if 'bad' in fname_in:
+        raise RuntimeError('broken ' + os.path.basename(fname_in))
+    with open(fname_in) as fin, open(fname_out, 'w') as fout:
+        fout.write(fin.read().upper())
+
+
+class BatchTests(unittest.TestCase):
+    """Testing the batch conversion.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.tasks = []
+        for n in range(10):
+            name = 'bad{}.txt' if n in (3, 7) else 'file{}.txt'
+            fname_in = os.path.join(self.tmpdir.name, name.format(n))
+            with open(fname_in, 'w') as f:
+                f.write('content {}'.format(n))
+            self.tasks.append((fname_in, fname_in + '.out'))
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def check_results(self, results):
+        self.assertEqual([(fin, fout) for fin, fout, error in results],
+                         self.tasks)
+        errors = [error for fin, fout, error in results if error]
+        self.assertEqual(errors, ['RuntimeError: broken bad3.txt',
+                                  'RuntimeError: broken bad7.txt'])
+        with open(self.tasks[9][1]) as f:
+            self.assertEqual(f.read(), 'CONTENT 9')
+
+
+    def test_sequential(self):
+        """one job, errors do not stop the batch
+        """
+        self.check_results(list(batch.run(copy_upper, self.tasks, jobs=1)))
+
+
+    def test_parallel(self):
+        """more processes, results in the order of the tasks
+        """
+        self.check_results(list(batch.run(copy_upper, self.tasks, jobs=3)))
+
+
+    def test_parallel_map(self):
+        """results of the function in the order of the arguments
+        """
+        for jobs in (1, 3):
+            self.assertEqual(list(batch.parallel_map(divmod, range(10),
+                                                     [3] * 10, jobs=jobs)),
+                             [divmod(n, 3) for n in range(10)])
+        self.assertEqual(list(batch.parallel_map(divmod, [], [], jobs=3)), [])
+
+
+    def test_report(self):
+        """failed files are listed at the end
+        """
+        lines = []
+        results = batch.run(copy_upper, self.tasks, jobs=1)
+        failed = batch.report(results, out=lambda *args: lines.append(' '.join(args)))
+        self.assertEqual(len(failed), 2)
+        self.assertEqual(len(lines), 10 + 2 + 2)
+        tmpname = os.path.basename(self.tmpdir.name)
+        self.assertEqual(lines[0], '{0}/file0.txt --> {0}/file0.txt.out'.format(
+                                       tmpname).replace('/', os.sep))
+        self.assertEqual(lines[11], '2 file(s) failed:')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#!python3
+import os
+import unittest
+
+import sys
+sys.path.append('..')
+
+import check
+import tempfile
+
+
+feature_text = '''\
+Scenario: scenario 1
+  Given: given 1
+   When: when 1
+   Then: then 1
+'''
+
+catch_text = '''\
+SCENARIO( "scenario 1" ) {
+    GIVEN( "given 1" ) {
+        WHEN( "when 1" ) {
+            THEN( "then 1" ) {
+            }
+        }
+    }
+}
+'''
+
+
+class CheckTests(unittest.TestCase):
+    """Testing the consistency check of the features and the Catch sources.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.features_dir = os.path.join(self.tmpdir.name, 'features')
+        self.tests_dir = os.path.join(self.tmpdir.name, 'tests')
+        os.mkdir(self.features_dir)
+        os.mkdir(self.tests_dir)
+        self.write('features/same.feature', feature_text)
+        self.write('tests/same.cpp', catch_text)
+        self.write('features/drift.feature', feature_text)
+        self.write('tests/drift.hpp', catch_text.replace('then 1', 'then one'))
+        self.write('features/broken.feature', feature_text)
+        self.write('tests/broken.cpp', catch_text.replace('WHEN', 'THEN', 1))
+        self.write('features/missing.feature', feature_text)
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def write(self, name, text):
+        with open(os.path.join(self.tmpdir.name, name), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+    def test_pairs(self):
+        """features are paired with the Catch sources by the name
+        """
+        lst = [(os.path.basename(f), c and os.path.basename(c))
+               for f, c in check.pairs(self.features_dir, self.tests_dir)]
+        self.assertEqual(lst, [('broken.feature', 'broken.cpp'),
+                               ('drift.feature', 'drift.hpp'),
+                               ('missing.feature', None),
+                               ('same.feature', 'same.cpp')])
+
+
+    def test_report(self):
+        """differences and failures are reported, no file is written
+        """
+        before = sorted(os.listdir(self.tests_dir))
+        for jobs in (1, 2):
+            lines = []
+            results = check.run(check.pairs(self.features_dir, self.tests_dir), jobs)
+            differing, failed = check.report(
+                results, out=lambda *args: lines.append(' '.join(args)))
+            self.assertEqual((differing, failed), (1, 2))
+            self.assertIn('broken.cpp: ParseError: ', lines[0])
+            self.assertTrue(lines[1].endswith('drift.hpp: 1 difference(s)'))
+            self.assertEqual(lines[2].strip(), "renamed then 'then 1' --> 'then one'"
+                             " in 'when 1' in 'given 1' in 'scenario 1'")
+            self.assertTrue(lines[3].endswith('missing.feature: missing Catch source'))
+            self.assertTrue(lines[4].endswith('same.cpp: ok'))
+            self.assertEqual(lines[-1], '4 pair(s) checked, 1 differ, 2 failed.')
+        self.assertEqual(sorted(os.listdir(self.tests_dir)), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
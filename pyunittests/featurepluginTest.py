@@ -0,0 +1,90 @@
+#!python3
+import os
+import unittest
+
+import sys
+sys.path.append('..')
+
+import subprocess
+import tempfile
+
+try:
+    import pytest
+except ImportError:
+    pytest = None
+
+
+feature_text = '''\
+Story: vectors
+
+Scenario: sizes
+  Given: an empty vector
+   When: an item is added
+   Then: the size is 1
+   When: two items are added
+   Then: the size is 2
+
+Scenario: missing
+  Given: an empty vector
+   When: nothing
+'''
+
+conftest_text = '''\
+from featureplugin import given, when, then
+
+@given('an empty vector')
+def empty(ctx):
+    ctx.v = []
+
+@when('an item is added')
+def add1(ctx):
+    ctx.v.append(1)
+
+@when('two items are added')
+def add2(ctx):
+    ctx.v.extend([1, 2])
+
+@then('the size is 1')
+def size1(ctx):
+    assert len(ctx.v) == 1
+
+@then('the size is 2')
+def size2(ctx):
+    assert len(ctx.v) == 2
+'''
+
+
+@unittest.skipIf(pytest is None, 'pytest is not installed')
+class FeaturePluginTests(unittest.TestCase):
+    """Testing the pytest collection of the .feature files.
+    """
+
+    def test_collect_and_run(self):
+        """each path of the scenario is one item, missing step fails
+        """
+        tooldir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name, text in (('x.feature', feature_text),
+                               ('conftest.py', conftest_text)):
+                with open(os.path.join(tmpdir, name), 'w', encoding='utf-8') as f:
+                    f.write(text)
+            env = dict(os.environ, PYTHONPATH=tooldir)
+            cache_dir = os.path.join(tmpdir, 'cache')
+            proc = subprocess.run(
+                [sys.executable, '-m', 'pytest', '-p', 'featureplugin',
+                 '-p', 'no:cacheprovider', '-rA', '--feature-cache-dir', cache_dir,
+                 tmpdir], cwd=tmpdir, env=env,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                universal_newlines=True)
+            out = proc.stdout
+            self.assertEqual(proc.returncode, 1, out)
+            self.assertIn('PASSED x.feature::sizes[an empty vector / an item is added'
+                          ' / the size is 1]', out)
+            self.assertIn("FAILED x.feature::missing - Failed: step not implemented:"
+                          " when 'nothing'", out)
+            self.assertIn('1 failed, 2 passed', out)
+            self.assertTrue(os.listdir(cache_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,6 +7,7 @@ import sys
 sys.path.append('..')
 
 import felex
+import io
 
 class LexAnalyzerForFeatureTests(unittest.TestCase):
     """Testing lex analyzer for the .feature BDD sources.
@@ -625,5 +626,35 @@ class LexAnalyzerForFeatureTests(unittest.TestCase):
                                ('$', None, None, None)
                               ])
 
+
+    def test_reset(self):
+        """one lexer reused for more sources, the rules shared
+        """
+        it = iter(felex.Container('Story: text'))
+        self.assertIs(it.rules, iter(felex.Container('')).rules)
+        self.assertEqual(list(it), [('story', 'text', 'Story: text', None),
+                                    ('$', None, None, None)
+                                   ])
+
+        it.reset('Feature: other')
+        self.assertEqual(list(it), [('feature', 'other', 'Feature: other', None),
+                                    ('$', None, None, None)
+                                   ])
+
+
+    def test_file_read_lazily(self):
+        """lines of the file are read only when the iterator gets to them
+        """
+        source = io.StringIO('Story: story\n\nScenario: scenario\n')
+        source.name = 'x.feature'
+        container = felex.Container(source)
+        it = iter(container)
+        self.assertEqual(next(it)[0], 'story')
+        self.assertEqual((container.nread, source.tell()), (1, 13))
+        self.assertEqual([token[0] for token in it],
+                         ['emptyline', 'scenario', '$'])
+        with self.assertRaises(ValueError):
+            list(container)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -672,6 +672,75 @@ class SyntaxFeatureTests(unittest.TestCase):
             ]),
         ])
 
+    def test_long_input(self):
+        """Long descriptions and chains do not exhaust the call stack.
+        """
+        source = 'Story: story title\n' + 'description line\n' * 5000
+        sa = fesyn.SyntacticAnalyzerForFeature(source)
+        tree = sa.Start()
+        self.assertEqual(len(tree), 2)
+        self.assertEqual(len(tree[1][1]), 5001)
+
+        source = ('Scenario: scenario identifier\n'
+                  '   Given: given identifier\n'
+                  '    When: when identifier\n'
+                  '    Then: then identifier\n'
+                  + '     and: and_then identifier\n' * 50)
+        sa = fesyn.SyntacticAnalyzerForFeature(source, max_depth=10)
+        self.assertRaisesRegex(RuntimeError, 'Nesting deeper than 10 levels',
+                               sa.Start)
+
+
+    def test_iter_items(self):
+        """items are generated one by one as they are parsed
+        """
+        source = textwrap.dedent("""\
+            Story: story identifier
+              description
+            Scenario: scenario 1
+               Given: given identifier
+            Scenario: scenario 2
+            Scenario: scenario 3
+            """)
+        sa = fesyn.SyntacticAnalyzerForFeature(source)
+        it = sa.iter_items()
+        self.assertEqual(next(it), ('story', 'story identifier'))
+        self.assertEqual(next(it), ('description', ['  description']))
+        self.assertEqual(next(it), ('scenario', 'scenario 1', [
+                                        ('given', 'given identifier', [])]))
+        # The next scenario was not parsed yet.
+        self.assertEqual(sa.sym, 'scenario')
+        self.assertEqual(sa.text, 'scenario 2')
+        self.assertEqual(sa.syntax_tree, [])
+        self.assertEqual(list(it), [('scenario', 'scenario 2', []),
+                                    ('scenario', 'scenario 3', [])])
+
+        # Errors are reported after the already generated items.
+        sa = fesyn.SyntacticAnalyzerForFeature('Scenario: s\n/*\n')
+        it = sa.iter_items()
+        self.assertEqual(next(it), ('scenario', 's', []))
+        self.assertRaises(RuntimeError, next, it)
+
+
+    def test_recovery(self):
+        """all errors reported in one pass, partial tree returned
+        """
+        source = textwrap.dedent("""\
+            Scenario: scenario 1
+            /* unexpected */
+            Scenario: scenario 2
+            // unexpected
+            """)
+        sa = fesyn.SyntacticAnalyzerForFeature(source, recover=True)
+        tree = sa.Start()
+        self.assertEqual(tree, [('scenario', 'scenario 1', []),
+                                ('scenario', 'scenario 2', [])])
+        self.assertEqual([(d.line, d.column, d.expected, d.symbol)
+                          for d in sa.diagnostics],
+                         [(2, 1, ('$',), 'ccommentoneliner'),
+                          (4, 1, ('$',), 'cppcomment')])
+
+
     def test_comment_block(self):
         """C-comments and C++ comments used in .feature
         """
@@ -0,0 +1,153 @@
+#!python3
+import os
+import unittest
+
+import sys
+sys.path.append('..')
+
+import fesyn
+import incremental
+import tsyn
+
+
+feature_text = '''\
+Story: story
+
+  description
+
+Scenario: scenario 1
+  Given: given 1
+   When: when 1
+   Then: then 1
+
+Scenario: scenario 2
+  Given: given 2
+   When: when 2
+   Then: then 2
+
+Scenario: scenario 3
+  Given: given 3
+'''
+
+catch_text = '''\
+// Story: story
+SCENARIO( "scenario 1" ) {
+    GIVEN( "given 1" ) {
+    }
+}
+
+SCENARIO( "scenario 2" ) {
+    GIVEN( "given 2" ) {
+    }
+}
+
+SCENARIO( "scenario 3" ) {
+    GIVEN( "given 3" ) {
+    }
+}
+'''
+
+
+def spans(nodes):
+    """Returns the tree with the spans as nested tuples.
+    """
+    lst = []
+    for node in nodes:
+        children = node.children if node.symbol != 'description' else None
+        lst.append((node.symbol, node.text, node.start, node.end,
+                    spans(children or [])))
+    return lst
+
+
+def position(text, offset):
+    """Returns the (line, character) of the offset, both from 0.
+    """
+    return (text.count('\n', 0, offset),
+            offset - text.rfind('\n', 0, offset) - 1)
+
+
+class IncrementalTests(unittest.TestCase):
+    """Testing the incremental reparsing against the full analysis.
+    """
+
+    def edit(self, src, old, new):
+        """Replaces the old text by the new one, checks the result.
+        """
+        text = src.text
+        start = text.index(old)
+        end = start + len(old)
+        src.edit(position(text, start), position(text, end), new)
+        text = text[:start] + new + text[end:]
+        self.assertEqual(src.text, text)
+
+        if isinstance(src, incremental.FeatureSource):
+            sa = fesyn.SyntacticAnalyzerForFeature(text, recover=True)
+        else:
+            sa = tsyn.SyntacticAnalyzerForCatch(text, recover=True)
+        self.assertEqual(spans(src.tree), spans(sa.Start()))
+        self.assertEqual(src.diagnostics, sa.diagnostics)
+
+
+    def test_feature_step(self):
+        """changed step reparses only its scenario
+        """
+        src = incremental.FeatureSource(feature_text)
+        tree = list(src.tree)
+        self.edit(src, 'when 2', 'when two')
+        self.assertEqual(src.reparsed, 1)
+        self.assertEqual(src.tree[3].children[0].children[0].text, 'when two')
+        self.assertIs(src.tree[2], tree[2])     # reused
+        self.assertIs(src.tree[4], tree[4])
+
+
+    def test_feature_lines(self):
+        """inserted and removed lines move the spans behind the edit
+        """
+        src = incremental.FeatureSource(feature_text)
+        self.edit(src, '   Then: then 1\n', '   Then: then 1\n    And: and 1\n\n')
+        self.assertEqual(src.reparsed, 1)
+        self.assertEqual(src.tree[4].span, (16, 18))
+        self.edit(src, 'Scenario: scenario 2\n', '')
+        self.edit(src, 'description', 'Scenario: scenario 0')
+        self.edit(src, 'Story: story\n', '')
+
+
+    def test_feature_diagnostics(self):
+        """diagnostics behind the edit are moved
+        """
+        src = incremental.FeatureSource(feature_text.replace('Given: given 3',
+                                                             'When: when 3'))
+        self.assertEqual(len(src.diagnostics), 1)
+        self.edit(src, 'Then: then 1\n', 'Then: then 1\n\n\n')
+        self.assertEqual(src.diagnostics[0].line, 18)
+        self.assertIn('line 18,', src.diagnostics[0].message)
+        self.edit(src, 'When: when 3', 'Given: given 3')
+        self.assertEqual(src.diagnostics, [])
+
+
+    def test_catch_edits(self):
+        """edited Catch source gives the same tree as the full analysis
+        """
+        src = incremental.CatchSource(catch_text)
+        self.edit(src, 'given 2', 'given two')
+        self.assertEqual(src.reparsed, 1)
+        self.edit(src, '    }\n}\n\nSCENARIO( "scenario 3" )', '\n')
+        self.edit(src, 'SCENARIO( "scenario 1" ) {', 'SCENARIO( "scenario 1" ) {\n{')
+        self.edit(src, 'SCENARIO( "scenario 2"', 'TEST_CASE( "scenario 2"')
+        self.edit(src, '// Story', 'GIVEN( // Story')
+
+
+    def test_catch_macro_arguments(self):
+        """header inside the macro arguments is not the restart point
+        """
+        src = incremental.CatchSource(catch_text.replace(
+            '\nSCENARIO( "scenario 2" ) {\n    GIVEN( "given 2" ) {',
+            'GIVEN(\nSCENARIO( "a" ) {\n}\n'
+            'SCENARIO( "scenario 2" ) {\n    GIVEN( "given 2" )\n    {'))
+        self.assertTrue(src.diagnostics)
+        self.edit(src, 'given 2', 'given two')
+        self.edit(src, 'given 3', 'given three')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+#!python3
+import os
+import unittest
+
+import sys
+sys.path.append('..')
+
+import lineindex
+
+class LineIndexTests(unittest.TestCase):
+    """Testing the line/column lookup for the source offsets.
+    """
+
+    def test_empty_source(self):
+        """empty source has only the first line
+        """
+        index = lineindex.LineIndex('')
+        self.assertEqual(index.newlines, [])
+        self.assertEqual(index.position(0), (1, 1))
+
+
+    def test_positions(self):
+        """lines and columns from 1, newline belongs to its line
+        """
+        source = 'ab\ncd\n\nef'
+        index = lineindex.LineIndex(source)
+        self.assertEqual(index.newlines, [2, 5, 6])
+        self.assertEqual(index.position(0), (1, 1))
+        self.assertEqual(index.position(2), (1, 3))     # the newline
+        self.assertEqual(index.position(3), (2, 1))
+        self.assertEqual(index.position(6), (3, 1))
+        self.assertEqual(index.position(8), (4, 2))
+        self.assertEqual(index.position(9), (4, 3))     # end of data
+        self.assertEqual(index.lineno(9), 4)
+        self.assertEqual(index.offset(4, 2), 8)
+        self.assertEqual(index.offset(3, 1), 6)
+        self.assertEqual(index.offset(1, 1), 0)
+
+
+    def test_replace(self):
+        """updated table equals the one of the edited source
+        """
+        source = 'ab\ncd\n\nef\ngh'
+        for start, end, text in [(0, 0, 'x\n'), (1, 4, ''), (3, 8, 'a\nb\nc'),
+                                 (11, 11, '\n'), (2, 3, 'y')]:
+            index = lineindex.LineIndex(source)
+            index.replace(start, end, text)
+            edited = source[:start] + text + source[end:]
+            self.assertEqual(index.newlines, lineindex.LineIndex(edited).newlines)
+
+
+if __name__ == '__main__':
+    unittest.main()
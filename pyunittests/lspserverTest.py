@@ -0,0 +1,190 @@
+#!python3
+import os
+import unittest
+
+import sys
+sys.path.append('..')
+
+import io
+import json
+import lspserver
+import subprocess
+import tempfile
+
+
+feature_text = '''\
+Story: story
+
+Scenario: scenario 1
+  Given: given 1
+   When: when 1
+   Then: then 1
+'''
+
+catch_text = '''\
+SCENARIO( "scenario 1" ) {
+    GIVEN( "given 1" ) {
+        WHEN( "when 1" ) {
+            THEN( "then 1" ) {
+            }
+        }
+    }
+}
+'''
+
+
+def frame(message):
+    message['jsonrpc'] = '2.0'
+    body = json.dumps(message).encode('utf-8')
+    return 'Content-Length: {}\r\n\r\n'.format(len(body)).encode('ascii') + body
+
+
+def unframe(data):
+    messages = []
+    rfile = io.BytesIO(data)
+    conn = lspserver.Connection(None, rfile, None)
+    while True:
+        message = conn.read_message()
+        if message is None:
+            return messages
+        messages.append(message)
+
+
+class LanguageServerTests(unittest.TestCase):
+    """Testing the language server driven via the in-memory streams.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        for d in ('features', 'tests'):
+            os.mkdir(os.path.join(self.tmpdir.name, d))
+        self.feature = os.path.join(self.tmpdir.name, 'features', 'x.feature')
+        self.catch = os.path.join(self.tmpdir.name, 'tests', 'x.cpp')
+        with open(self.feature, 'w', encoding='utf_8') as f:
+            f.write(feature_text)
+        with open(self.catch, 'w', encoding='utf_8') as f:
+            f.write(catch_text)
+        self.feature_uri = lspserver.path_to_uri(self.feature)
+        self.catch_uri = lspserver.path_to_uri(self.catch)
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def session(self, *messages):
+        """Returns the responses and the notifications sent by the server.
+        """
+        rfile = io.BytesIO(b''.join(frame(m) for m in messages)
+                           + frame({'method': 'exit'}))
+        wfile = io.BytesIO()
+        lspserver.Connection(lspserver.Workspace(), rfile, wfile).serve()
+        return unframe(wfile.getvalue())
+
+
+    def did_open(self, uri, text):
+        return {'method': 'textDocument/didOpen', 'params': {'textDocument': {
+                'uri': uri, 'languageId': 'x', 'version': 1, 'text': text}}}
+
+
+    def test_initialize(self):
+        """initialize reports the capabilities, unknown method is an error
+        """
+        out = self.session({'id': 1, 'method': 'initialize', 'params': {}},
+                           {'id': 2, 'method': 'unknown/method'},
+                           {'id': 3, 'method': 'shutdown'})
+        self.assertEqual(out[0]['id'], 1)
+        self.assertTrue(out[0]['result']['capabilities']['definitionProvider'])
+        self.assertEqual(out[1]['error']['code'], -32601)
+        self.assertEqual(out[2], {'id': 3, 'result': None, 'jsonrpc': '2.0'})
+
+
+    def test_diagnostics(self):
+        """syntax errors are published after open and change
+        """
+        broken = 'Scenario: s\n  When: w\n  Given: g\n'
+        out = self.session(self.did_open(self.feature_uri, broken),
+                           {'method': 'textDocument/didChange', 'params': {
+                            'textDocument': {'uri': self.feature_uri, 'version': 2},
+                            'contentChanges': [{'text': feature_text}]}})
+        self.assertEqual(out[0]['method'], 'textDocument/publishDiagnostics')
+        diags = out[0]['params']['diagnostics']
+        self.assertEqual(len(diags), 1)
+        self.assertEqual(diags[0]['range']['start'], {'line': 1, 'character': 2})
+        self.assertEqual(out[1]['params']['diagnostics'], [])
+
+
+    def test_incremental_change(self):
+        """range changes are applied to the document
+        """
+        change = {'range': {'start': {'line': 4, 'character': 9},
+                            'end': {'line': 4, 'character': 15}},
+                  'text': 'when one'}
+        out = self.session(self.did_open(self.feature_uri, feature_text),
+                           {'method': 'textDocument/didChange', 'params': {
+                            'textDocument': {'uri': self.feature_uri, 'version': 2},
+                            'contentChanges': [change]}},
+                           {'id': 1, 'method': 'textDocument/documentSymbol',
+                            'params': {'textDocument': {'uri': self.feature_uri}}})
+        self.assertEqual(out[1]['params']['diagnostics'], [])
+        scenario = out[2]['result'][1]
+        when = scenario['children'][0]['children'][0]
+        self.assertEqual(when['name'], 'when one')
+        self.assertEqual(when['range']['start'], {'line': 4, 'character': 0})
+
+
+    def test_document_symbols(self):
+        """symbols are nested, Catch offsets are converted to lines
+        """
+        out = self.session(self.did_open(self.catch_uri, catch_text),
+                           {'id': 1, 'method': 'textDocument/documentSymbol',
+                            'params': {'textDocument': {'uri': self.catch_uri}}})
+        symbols = out[1]['result']
+        self.assertEqual([s['name'] for s in symbols], ['scenario 1'])
+        given = symbols[0]['children'][0]
+        self.assertEqual(given['name'], 'given 1')
+        self.assertEqual(given['range']['start'], {'line': 1, 'character': 4})
+        self.assertEqual(given['range']['end'], {'line': 6, 'character': 5})
+
+
+    def test_definition(self):
+        """step of the feature leads to the Catch block, and back
+        """
+        out = self.session(self.did_open(self.feature_uri, feature_text),
+                           {'id': 1, 'method': 'textDocument/definition',
+                            'params': {'textDocument': {'uri': self.feature_uri},
+                                       'position': {'line': 4, 'character': 5}}})
+        location = out[1]['result']
+        self.assertEqual(location['uri'], self.catch_uri)
+        self.assertEqual(location['range']['start'], {'line': 2, 'character': 8})
+
+        out = self.session(self.did_open(self.catch_uri, catch_text),
+                           {'id': 1, 'method': 'textDocument/definition',
+                            'params': {'textDocument': {'uri': self.catch_uri},
+                                       'position': {'line': 3, 'character': 14}}})
+        location = out[1]['result']
+        self.assertEqual(location['uri'], self.feature_uri)
+        self.assertEqual(location['range']['start'], {'line': 5, 'character': 0})
+
+
+    def test_stdio(self):
+        """only the framed messages are written to the stdout
+        """
+        text = 'SCENARIO( "a" ) {\n  { int x; }\n}\n'
+        messages = [{'id': 1, 'method': 'initialize', 'params': {}},
+                    self.did_open(self.catch_uri, text),
+                    {'id': 2, 'method': 'shutdown'},
+                    {'method': 'exit'}]
+        tooldir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        proc = subprocess.run(
+            [sys.executable, os.path.join(tooldir, 'lspserver.py')],
+            input=b''.join(frame(m) for m in messages),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
+        out = unframe(proc.stdout)
+        self.assertEqual([m.get('id') for m in out], [1, None, 2])
+        self.assertEqual(out[1]['method'], 'textDocument/publishDiagnostics')
+        self.assertEqual(b''.join(frame(m) for m in out), proc.stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+#!python3
+import os
+import unittest
+
+import sys
+sys.path.append('..')
+
+import manifest
+import tempfile
+
+
+class ManifestTests(unittest.TestCase):
+    """Testing the selection of the changed files via the manifest.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.tmpdir.name, 'manifest')
+        self.tasks = []
+        for n in range(3):
+            fname_in = os.path.join(self.tmpdir.name, 'in{}.txt'.format(n))
+            self.write(fname_in, 'content {}'.format(n))
+            self.tasks.append((fname_in, fname_in + '.out'))
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def write(self, fname, content):
+        with open(fname, 'w') as f:
+            f.write(content)
+
+
+    def convert(self, mf, tasks, failing=()):
+        """Simulates the batch.run() of the tasks, saves the manifest.
+        """
+        results = []
+        for fname_in, fname_out in tasks:
+            error = None
+            if fname_in in failing:
+                error = 'RuntimeError: broken'
+            else:
+                self.write(fname_out, 'converted')
+            results.append((fname_in, fname_out, error))
+        list(mf.confirm(results))
+        mf.save()
+
+
+    def test_only_changed(self):
+        """only new, changed, failed, or missing outputs are selected
+        """
+        mf = manifest.Manifest(self.fname, 'v1')
+        self.assertEqual(mf.select(self.tasks), self.tasks)
+        self.convert(mf, self.tasks, failing=[self.tasks[2][0]])
+
+        mf = manifest.Manifest(self.fname, 'v1')
+        self.assertEqual(mf.select(self.tasks), [self.tasks[2]])
+        self.convert(mf, [self.tasks[2]])
+
+        # Nothing changed.
+        mf = manifest.Manifest(self.fname, 'v1')
+        self.assertEqual(mf.select(self.tasks), [])
+
+        # Changed content, the same content, removed output.
+        self.write(self.tasks[0][0], 'changed content')
+        self.write(self.tasks[1][0], 'content 1')
+        os.remove(self.tasks[2][1])
+        mf = manifest.Manifest(self.fname, 'v1')
+        self.assertEqual(mf.select(self.tasks), [self.tasks[0], self.tasks[2]])
+
+
+    def test_fingerprint_and_force(self):
+        """other tool version or forced rebuild selects all files
+        """
+        mf = manifest.Manifest(self.fname, 'v1')
+        self.convert(mf, mf.select(self.tasks))
+
+        mf = manifest.Manifest(self.fname, 'v2')
+        self.assertEqual(mf.select(self.tasks), self.tasks)
+
+        mf = manifest.Manifest(self.fname, 'v1')
+        mf.clear()
+        self.assertEqual(mf.select(self.tasks), self.tasks)
+
+
+    def test_more_outputs(self):
+        """input is converted again when any of its outputs disappeared
+        """
+        def outputs(fname_in, fname_out):
+            return [fname_out, fname_in + '.json']
+
+        mf = manifest.Manifest(self.fname, 'v1', outputs)
+        selected = mf.select(self.tasks)
+        for fname_in, fname_out in selected:
+            self.write(fname_in + '.json', 'converted')
+        self.convert(mf, selected)
+
+        mf = manifest.Manifest(self.fname, 'v1', outputs)
+        self.assertEqual(mf.select(self.tasks), [])
+        os.remove(self.tasks[1][0] + '.json')
+        mf = manifest.Manifest(self.fname, 'v1', outputs)
+        self.assertEqual(mf.select(self.tasks), [self.tasks[1]])
+
+
+
+    def test_fingerprint(self):
+        """fingerprint depends on the tool sources and on the settings
+        """
+        fname = self.tasks[0][0]
+        fp = manifest.fingerprint([fname], {'a': 1})
+        self.assertEqual(fp, manifest.fingerprint([fname], {'a': 1}))
+        self.assertNotEqual(fp, manifest.fingerprint([fname], {'a': 2}))
+        self.write(fname, 'new version')
+        self.assertNotEqual(fp, manifest.fingerprint([fname], {'a': 1}))
+
+
+if __name__ == '__main__':
+    unittest.main()
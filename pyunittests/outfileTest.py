@@ -0,0 +1,72 @@
+#!python3
+import os
+import unittest
+
+import sys
+sys.path.append('..')
+
+import io
+import outfile
+import tempfile
+
+
+class OutputFileTests(unittest.TestCase):
+    """Testing the output files rewritten only when changed.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.tmpdir.name, 'out.cpp')
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def write(self, content):
+        of = outfile.OutputFile(self.fname)
+        with of as f:
+            f.write(content)
+        return of.changed
+
+
+    def test_unchanged_not_rewritten(self):
+        """the same content keeps the file (and its mtime)
+        """
+        self.assertTrue(self.write('abc\n'))
+        os.utime(self.fname, ns=(1000000000, 1000000000))
+        self.assertFalse(self.write('abc\n'))
+        self.assertEqual(os.stat(self.fname).st_mtime_ns, 1000000000)
+
+        self.assertTrue(self.write('abd\n'))        # the same size
+        self.assertTrue(self.write('abcd\n'))
+        with open(self.fname) as f:
+            self.assertEqual(f.read(), 'abcd\n')
+        self.assertEqual(os.listdir(self.tmpdir.name), ['out.cpp'])
+
+
+    def test_failed_writing(self):
+        """the existing file is kept when the writing fails
+        """
+        self.write('abc\n')
+        with self.assertRaises(RuntimeError):
+            with outfile.OutputFile(self.fname) as f:
+                f.write('partial')
+                raise RuntimeError('broken')
+        with open(self.fname) as f:
+            self.assertEqual(f.read(), 'abc\n')
+        self.assertEqual(os.listdir(self.tmpdir.name), ['out.cpp'])
+
+
+    def test_line_writer(self):
+        """lines are separated by the newlines, none after the last one
+        """
+        f = io.StringIO()
+        write = outfile.LineWriter(f)
+        for line in ('a', '', 'b'):
+            write(line)
+        self.assertEqual(f.getvalue(), 'a\n\nb')
+
+
+if __name__ == '__main__':
+    unittest.main()
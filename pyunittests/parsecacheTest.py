@@ -0,0 +1,88 @@
+#!python3
+import os
+import unittest
+
+import sys
+sys.path.append('..')
+
+import parsecache
+import tempfile
+
+
+class TreeCacheTests(unittest.TestCase):
+    """Testing the in-memory cache of the syntax trees.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fnames = []
+        for n in range(3):
+            fname = os.path.join(self.tmpdir.name, 'x{}.feature'.format(n))
+            self.write(fname, 'Scenario: scenario {}\n'.format(n), n)
+            self.fnames.append(fname)
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def write(self, fname, content, mtime):
+        with open(fname, 'w', encoding='utf_8') as f:
+            f.write(content)
+        os.utime(fname, ns=(mtime * 10**9, mtime * 10**9))
+
+
+    def test_hits_and_misses(self):
+        """unchanged file is not parsed again
+        """
+        cache = parsecache.TreeCache()
+        tree = cache.parse(self.fnames[0], 'feature')
+        self.assertEqual(tree, [('scenario', 'scenario 0', [])])
+        self.assertIs(cache.parse(self.fnames[0], 'feature'), tree)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'entries': 1})
+
+        # Changed mtime.
+        self.write(self.fnames[0], 'Scenario: changed 0\n', 100)
+        self.assertEqual(cache.parse(self.fnames[0], 'feature'),
+                         [('scenario', 'changed 0', [])])
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 2, 'entries': 1})
+
+        # Explicit invalidation.
+        cache.invalidate(self.fnames[0])
+        self.assertIsNot(cache.parse(self.fnames[0], 'feature'), tree)
+        self.assertEqual(cache.misses, 3)
+        cache.invalidate()
+        self.assertEqual(cache.stats()['entries'], 0)
+
+
+    def test_lru_bound(self):
+        """least recently used trees are dropped
+        """
+        cache = parsecache.TreeCache(max_entries=2)
+        cache.parse(self.fnames[0], 'feature')
+        cache.parse(self.fnames[1], 'feature')
+        cache.parse(self.fnames[0], 'feature')      # recently used
+        cache.parse(self.fnames[2], 'feature')      # drops fnames[1]
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 3, 'entries': 2})
+        cache.parse(self.fnames[0], 'feature')
+        cache.parse(self.fnames[1], 'feature')
+        self.assertEqual(cache.stats(), {'hits': 2, 'misses': 4, 'entries': 2})
+
+
+    def test_module_functions(self):
+        """parse_feature() and parse_catch() use the module cache
+        """
+        fname = os.path.join(self.tmpdir.name, 'x.hpp')
+        self.write(fname, 'TEST_CASE( "test case" ) {\n}\n', 1)
+        parsecache.invalidate()
+        self.assertEqual(parsecache.parse_catch(fname),
+                         [('test_case', 'test case', [])])
+        self.assertEqual(parsecache.parse_feature(self.fnames[1]),
+                         [('scenario', 'scenario 1', [])])
+        parsecache.parse_catch(fname)
+        self.assertEqual(parsecache.cache.stats()['entries'], 2)
+        parsecache.invalidate()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#!python3
+import os
+import unittest
+
+import sys
+sys.path.append('..')
+
+import fesyn
+import pyskeleton
+import types
+
+
+feature_text = '''\
+Story: vectors can be sized
+
+  description
+
+Scenario: sizes
+  Given: an empty vector
+   When: an item is added
+   Then: the size is 1
+   When: two items are added
+   Then: the size is 2
+
+Scenario: "quoted" 1
+  Given: an   empty vector
+'''
+
+
+def load(lines):
+    """Returns the module built from the generated lines.
+    """
+    module = types.ModuleType('generated')
+    exec(compile('\n'.join(lines), 'generated', 'exec'), module.__dict__)
+    return module
+
+
+class PythonSkeletonTests(unittest.TestCase):
+    """Testing the Python unittest skeleton generator.
+    """
+
+    def test_names(self):
+        """identifiers and class names from the free text
+        """
+        self.assertEqual(pyskeleton.identifier('"quoted" 1'), 'quoted_1')
+        self.assertEqual(pyskeleton.identifier('1 more'), '_1_more')
+        self.assertEqual(pyskeleton.identifier('--'), 'unnamed')
+        self.assertEqual(pyskeleton.class_name('vectors can be sized and resized'),
+                         'VectorsCanBeSizedTests')
+
+
+    def test_skeleton(self):
+        """one test per scenario, the branches as the subtests
+        """
+        tree = fesyn.SyntacticAnalyzerForFeature(feature_text).Start()
+        lines = pyskeleton.PythonCodeGenerator().skeleton(tree)
+        self.assertEqual(lines[1], '"""Story: vectors can be sized')
+        self.assertIn("        with self.subTest('an empty vector / two items are added"
+                      " / the size is 2'):", lines)
+        self.assertEqual(sum(1 for line in lines
+                             if line == '    def given_an_empty_vector(self):'), 1)
+
+        module = load(lines)
+        cls = module.VectorsCanBeSizedTests
+        self.assertTrue(hasattr(cls, 'test_quoted_1'))
+        result = unittest.TestResult()
+        unittest.defaultTestLoader.loadTestsFromTestCase(cls).run(result)
+        self.assertEqual(result.testsRun, 2)
+        self.assertEqual(len(result.failures), 3)     # 2 subtests, 1 test
+
+
+    def test_empty(self):
+        """feature without scenarios gives the valid module
+        """
+        module = load(pyskeleton.PythonCodeGenerator().skeleton([]))
+        self.assertTrue(issubclass(module.FeatureTests, unittest.TestCase))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,239 @@
+#!python3
+import os
+import unittest
+
+import sys
+sys.path.append('..')
+
+import random
+import shard
+import tempfile
+import tsyn
+
+
+def feature_text(n, step='when'):
+    """Returns the feature with n scenarios.
+    """
+    lines = ['Feature: feature with {} scenarios'.format(n), '']
+    for i in range(1, n + 1):
+        lines.append('Scenario: scenario {}'.format(i))
+        lines.append('  Given: given {}'.format(i))
+        lines.append('   When: {} {}'.format(step if i == 1 else 'when', i))
+        lines.append('   Then: then {}'.format(i))
+        lines.append('')
+    return '\n'.join(lines)
+
+
+class ShardTests(unittest.TestCase):
+    """Testing the skeletons packed into the shards.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.features_dir = os.path.join(self.tmpdir.name, 'features')
+        self.tests_dir = os.path.join(self.tmpdir.name, 'tests')
+        self.shards_dir = os.path.join(self.tmpdir.name, 'shards')
+        os.mkdir(self.features_dir)
+        os.mkdir(self.tests_dir)
+        os.mkdir(self.shards_dir)
+        self.write('features/a.feature', feature_text(5))
+        self.write('features/b.feature', feature_text(1))
+        self.write('features/c.feature', feature_text(6))
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def write(self, name, text):
+        with open(os.path.join(self.tmpdir.name, name), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+    def fnames(self):
+        return [os.path.join(self.features_dir, name)
+                for name in ('a.feature', 'b.feature', 'c.feature')]
+
+
+    def chunks(self):
+        chunks = []
+        for fname in self.fnames():
+            lst, error = shard.feature_chunks(fname)
+            self.assertIsNone(error)
+            chunks.extend(lst)
+        return chunks
+
+
+    def shard_names(self):
+        return sorted(name for name in os.listdir(self.shards_dir)
+                      if name.startswith(shard.shard_prefix))
+
+
+    def test_partition(self):
+        """shards balanced by the line counts, known scenarios stay
+        """
+        rnd = random.Random(1)
+        for count, n in ((40, 4), (100, 8), (2000, 16)):
+            chunks = [shard.Chunk('f.feature', '', 'scenario {}'.format(i),
+                                  ['line'] * rnd.randint(10, 200))
+                      for i in range(count)]
+            loads = [0] * n
+            for chunk, i in zip(chunks, shard.partition(chunks, n)):
+                loads[i] += len(chunk.lines)
+            self.assertLess(max(loads), 1.05 * sum(loads) / n)
+
+        # The huge scenario gets its own shard.
+        chunks = [shard.Chunk('f.feature', '', str(i), ['line'] * size)
+                  for i, size in enumerate([10, 500, 10, 10, 10])]
+        self.assertEqual(shard.partition(chunks, 2), [1, 0, 1, 1, 1])
+
+        # The known scenarios stay, the new ones go to the lightest shard.
+        slots = {shard.chunk_key(c): i for c, i in zip(chunks, [1, 0, 1, 1, 1])}
+        chunks[0] = chunks[0]._replace(lines=['line'] * 50)
+        chunks.append(shard.Chunk('f.feature', '', 'new', ['line'] * 5))
+        self.assertEqual(shard.partition(chunks, 2, slots), [1, 0, 1, 1, 1, 1])
+
+        # Too unbalanced -- all are placed again.
+        chunks = [shard.Chunk('f.feature', '', str(i), ['line'] * 10) for i in range(4)]
+        slots = {shard.chunk_key(c): 0 for c in chunks}
+        self.assertEqual(shard.partition(chunks, 2, slots), [0, 1, 0, 1])
+        self.assertEqual(shard.partition([], 3), [])
+
+
+    def test_feature_chunks(self):
+        """one chunk for each scenario, the errors are returned
+        """
+        lst, error = shard.feature_chunks(self.fnames()[0])
+        self.assertIsNone(error)
+        self.assertEqual(len(lst), 5)
+        self.assertEqual(lst[0].title, 'Feature: feature with 5 scenarios')
+        self.assertEqual(lst[0].lines[1], 'SCENARIO( "scenario 1" ) {')
+
+        self.write('features/broken.feature', 'Scenario: x\n  Then: y\n  Given: z\n')
+        lst, error = shard.feature_chunks(
+            os.path.join(self.features_dir, 'broken.feature'))
+        self.assertIsNone(lst)
+        self.assertTrue(error.startswith('ParseError: '))
+
+
+    def test_write_shards(self):
+        """all scenarios are written, the shards are valid Catch sources
+        """
+        written, removed, edited = shard.write_shards(self.chunks(), 3, self.shards_dir)
+        self.assertEqual(len(written), 3)
+        self.assertEqual(removed, [])
+        self.assertTrue(all(changed for fname, changed in written))
+        scenarios = []
+        for fname, changed in written:
+            with open(fname, encoding='utf-8') as f:
+                self.assertEqual(f.readline(), '#include "catch.hpp"\n')
+                f.seek(0)
+                tree = tsyn.SyntacticAnalyzerForCatch(f).Start()
+            scenarios.extend(node.text for node in tree)
+        self.assertEqual(len(scenarios), 12)
+
+
+    def test_stable_shards(self):
+        """edit dirties only its shard, the stale shards are removed
+        """
+        for i in range(4):
+            self.write('features/f{}.feature'.format(i), feature_text(30))
+        fnames = [os.path.join(self.features_dir, 'f{}.feature'.format(i))
+                  for i in range(4)]
+
+        def chunks():
+            return [c for fname in fnames for c in shard.feature_chunks(fname)[0]]
+
+        written, removed, edited = shard.write_shards(chunks(), 4, self.shards_dir)
+        self.assertEqual(len(written), 4)
+        before = self.shard_names()
+
+        # Nothing changed -- the same names, nothing rewritten.
+        written, removed, edited = shard.write_shards(chunks(), 4, self.shards_dir)
+        self.assertEqual(self.shard_names(), before)
+        self.assertFalse(any(changed for fname, changed in written))
+
+        # One scenario grows by a step -- only its shard is replaced.
+        text = feature_text(30).replace('  Given: given 1\n',
+                                        '  Given: given 1\n    And: more\n', 1)
+        self.write('features/f0.feature', text)
+        written, removed, edited = shard.write_shards(chunks(), 4, self.shards_dir)
+        after = self.shard_names()
+        self.assertEqual(len(removed), 1)
+        self.assertEqual(len(set(before) & set(after)), 3)
+        self.assertEqual(sum(changed for fname, changed in written), 1)
+
+        # Fewer shards.
+        written, removed, edited = shard.write_shards(chunks(), 1, self.shards_dir)
+        self.assertEqual(len(self.shard_names()), 1)
+        self.assertEqual(len(removed), 4)
+
+
+    def test_run(self):
+        """shards are not written when any feature fails
+        """
+        self.write('features/broken.feature', 'Scenario: x\n  Then: y\n  Given: z\n')
+        fnames = self.fnames() + [os.path.join(self.features_dir, 'broken.feature')]
+        for jobs in (1, 2):
+            lines = []
+            failed = shard.run(fnames, 2, self.shards_dir, jobs,
+                               out=lambda *args: lines.append(' '.join(args)))
+            self.assertEqual([os.path.basename(f) for f, e in failed],
+                             ['broken.feature'])
+            self.assertEqual(self.shard_names(), [])
+            self.assertIn('1 file(s) failed', lines[1])
+
+        lines = []
+        failed = shard.run(self.fnames(), 2, self.shards_dir, 1,
+                           tests_dir=self.tests_dir,
+                           out=lambda *args: lines.append(' '.join(args)))
+        self.assertEqual(failed, [])
+        self.assertEqual(len(self.shard_names()), 2)
+        self.assertEqual(lines[0], '3 feature(s), 12 scenario(s) -->')
+        self.assertFalse(any('Warning' in line for line in lines))
+
+        # The per-feature source defines the same scenarios.
+        self.write('tests/b.cpp', '')
+        lines = []
+        failed = shard.run(self.fnames(), 2, self.shards_dir, 1,
+                           tests_dir=self.tests_dir,
+                           out=lambda *args: lines.append(' '.join(args)))
+        self.assertEqual(failed, [])
+        self.assertTrue(lines[-2].startswith('Warning: 1 per-feature source(s)'))
+        self.assertTrue(lines[-1].endswith('b.cpp'))
+
+
+    def test_edited_shard(self):
+        """edited or unknown shard is neither overwritten, nor removed
+        """
+        written, removed, edited = shard.write_shards(self.chunks(), 2, self.shards_dir)
+        fname = written[0][0]
+        with open(fname, encoding='utf-8') as f:
+            text = f.read()
+        with open(fname, 'w', encoding='utf-8') as f:
+            f.write(text.replace('REQUIRE(false)', 'REQUIRE(v.empty())'))
+
+        self.write('features/a.feature', feature_text(5, step='act'))
+        before = self.shard_names()
+        written, removed, edited = shard.write_shards(self.chunks(), 2, self.shards_dir)
+        self.assertEqual((written, removed, edited), ([], [], [fname]))
+        self.assertEqual(self.shard_names(), before)
+        with open(fname, encoding='utf-8') as f:
+            self.assertIn('REQUIRE(v.empty())', f.read())
+
+        lines = []
+        failed = shard.run(self.fnames(), 2, self.shards_dir, 1,
+                           out=lambda *args: lines.append(' '.join(args)))
+        self.assertEqual(failed, [(fname, 'edited shard')])
+        self.assertIn('1 shard(s) edited', lines[1])
+
+        # The shard that was not generated is not touched either.
+        os.remove(fname)
+        self.write('shards/shard_mine.cpp', '')
+        written, removed, edited = shard.write_shards(self.chunks(), 2, self.shards_dir)
+        self.assertEqual(len(edited), 1)
+        self.assertTrue(edited[0].endswith('shard_mine.cpp'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+#!python3
+import os
+import unittest
+
+import sys
+sys.path.append('..')
+
+import spantoken
+
+class SpanTokenTests(unittest.TestCase):
+    """Testing the tokens with lazily created lexem and value.
+    """
+
+    def test_tuple_behaviour(self):
+        """the token behaves like the 4-tuple
+        """
+        source = ' SCENARIO( "identifier" )'
+        tok = spantoken.SpanToken('stringlit', source, 10, 23, 12, 22)
+        self.assertEqual(tok, ('stringlit', 'identifier', ' "identifier"', None))
+        self.assertEqual(tok[1], 'identifier')
+        self.assertEqual(tok[2], ' "identifier"')
+        self.assertEqual(len(tok), 4)
+
+        symbol, value, lexem, extra_info = tok
+        self.assertEqual(symbol, 'stringlit')
+        self.assertEqual(value, 'identifier')
+        self.assertEqual(lexem, ' "identifier"')
+        self.assertIsNone(extra_info)
+
+        self.assertEqual(repr(tok),
+                         repr(('stringlit', 'identifier', ' "identifier"', None)))
+        self.assertEqual(hash(tok),
+                         hash(('stringlit', 'identifier', ' "identifier"', None)))
+
+
+    def test_none_spans(self):
+        """missing spans mean None for the lexem or the value
+        """
+        tok = spantoken.SpanToken('$', None, None, None, None, None)
+        self.assertEqual(tok, ('$', None, None, None))
+
+        tok = spantoken.SpanToken('lpar', '(', 0, 1, None, None)
+        self.assertEqual(tok, ('lpar', None, '(', None))
+
+
+    def test_strtoken(self):
+        """tokens built from strings that are not in the source
+        """
+        tok = spantoken.strtoken('error', 'message', "('comment', '', '/*', None)")
+        self.assertEqual(tok, ('error', 'message',
+                               "('comment', '', '/*', None)", None))
+
+        tok = spantoken.strtoken('$', None, None)
+        self.assertEqual(tok, ('$', None, None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+#!python3
+import os
+import unittest
+
+import sys
+sys.path.append('..')
+
+import fesyn
+import marshal
+import syntree
+import textwrap
+import tsyn
+
+from syntree import Kind, Node
+
+class SyntaxTreeNodeTests(unittest.TestCase):
+    """Testing the syntax tree nodes and their legacy tuple form.
+    """
+
+    def test_legacy_tuples(self):
+        """node behaves like the legacy tuple
+        """
+        then = Node(Kind.THEN, 't', [])
+        when = Node(Kind.WHEN, 'w', [then])
+        self.assertEqual(when, ('when', 'w', [('then', 't', [])]))
+        sym, text, body = when
+        self.assertEqual((sym, text), ('when', 'w'))
+        self.assertIs(body[0], then)
+        self.assertEqual(when.astuple(), ('when', 'w', [('then', 't', [])]))
+
+        story = Node(Kind.STORY, 's')
+        self.assertEqual(len(story), 2)
+        self.assertEqual(story, ('story', 's'))
+
+        descr = Node(Kind.DESCRIPTION, None, ['line 1', 'line 2'])
+        self.assertEqual(descr, ('description', ['line 1', 'line 2']))
+        self.assertEqual(descr[1], ['line 1', 'line 2'])
+        with self.assertRaises(IndexError):
+            descr[2]
+
+
+    def test_hash_ignores_spans(self):
+        """equal subtrees with different spans hash equally
+        """
+        a = Node(Kind.GIVEN, 'g', [Node(Kind.WHEN, 'w', [], 3, 4)], 1, 5)
+        b = Node(Kind.GIVEN, 'g', [Node(Kind.WHEN, 'w', [], 7, 8)], 6, 9)
+        self.assertEqual(a, b)
+        self.assertEqual(hash(a), hash(b))
+        self.assertEqual(len({a, b}), 1)
+        self.assertNotEqual(a, Node(Kind.AND_GIVEN, 'g', [Node(Kind.WHEN, 'w', [])]))
+
+
+    def test_move(self):
+        """spans of the whole subtree are moved in place
+        """
+        given = Node(Kind.GIVEN, 'g', [Node(Kind.WHEN, 'w', [], 3, 4)], 2, 5)
+        descr = Node(Kind.DESCRIPTION, None, ['a'], 0, 1)
+        given.move(10)
+        descr.move(-1)
+        self.assertEqual(given.span, (12, 15))
+        self.assertEqual(given.children[0].span, (13, 14))
+        self.assertEqual(descr.span, (-1, 0))
+        self.assertEqual(descr.children, ['a'])
+
+
+    def test_merge_scenarios(self):
+        """scenarios with the same first step share the prefix of the steps
+        """
+        tree = fesyn.SyntacticAnalyzerForFeature(textwrap.dedent('''\
+            Story: story
+
+            Scenario: a
+              Given: g
+               When: w
+               Then: t1
+
+            Scenario: other
+              Given: x
+
+            Scenario: b
+              Given: g
+               When: w
+               Then: t2
+            ''')).Start()
+        before = syntree.totuples(tree)
+        merged = syntree.merge_scenarios(tree)
+        self.assertEqual(syntree.totuples(merged), [
+            ('story', 'story'),
+            ('scenario', 'a; b', [
+                ('given', 'g', [
+                    ('when', 'w', [('then', 't1', []), ('then', 't2', [])])])]),
+            ('scenario', 'other', [('given', 'x', [])]),
+        ])
+        self.assertEqual(syntree.totuples(tree), before)    # not modified
+        self.assertIs(merged[2], tree[2])
+
+
+    def test_pack(self):
+        """compact form is made of plain tuples and converts back
+        """
+        tree = [Node(Kind.STORY, 's', None, 0, 1),
+                Node(Kind.DESCRIPTION, None, ['a', ''], 1, 3),
+                Node(Kind.SCENARIO, 'sc', [Node(Kind.GIVEN, 'g', [], 4, 5)], 3, 5)]
+        packed = marshal.loads(marshal.dumps([node.pack() for node in tree]))
+        tree2 = [syntree.unpack(item) for item in packed]
+        self.assertEqual(tree2, tree)
+        self.assertEqual(tree2[2].children[0].span, (4, 5))
+        self.assertIs(tree2[1].kind, Kind.DESCRIPTION)
+
+
+    def test_feature_spans(self):
+        """spans of the feature nodes are line indices
+        """
+        source = textwrap.dedent("""\
+            Story: story identifier
+              description
+
+            Scenario: scenario identifier
+               Given: given identifier
+                When: when identifier
+                Then: then identifier
+
+            Scenario: scenario 2
+            """)
+        tree = fesyn.SyntacticAnalyzerForFeature(source).Start()
+        self.assertEqual([node.span for node in tree],
+                         [(0, 1), (1, 2), (3, 7), (8, 9)])
+        given = tree[2].children[0]
+        self.assertEqual(given.kind, Kind.GIVEN)
+        self.assertEqual(given.span, (4, 7))
+        self.assertEqual(syntree.totuples(tree)[3], ('scenario', 'scenario 2', []))
+
+
+    def test_catch_spans(self):
+        """spans of the Catch nodes are char offsets
+        """
+        source = textwrap.dedent('''\
+            SCENARIO( "scenario identifier" ) {
+                GIVEN( "given identifier" ) {
+                }
+            }
+            ''')
+        tree = tsyn.SyntacticAnalyzerForCatch(source).Start()
+        scenario = tree[0]
+        self.assertEqual(scenario.span, (0, source.rindex('}') + 1))
+        given = scenario.children[0]
+        self.assertEqual(source[given.start:given.end],
+                         'GIVEN( "given identifier" ) {\n    }')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -76,7 +76,7 @@ class LexAnalyzerForCatchTests(unittest.TestCase):
         source = '/*'
         lst = list(tlex.Container(source))
         self.assertEqual(len(lst), 2)   # one error item plus endofdata
-        self.assertEqual(lst, [('error', "'<str>', 1: '*/' expected",
+        self.assertEqual(lst, [('error', "'<str>', 1:3: '*/' expected",
                                  "('comment', '', '/*', None)", None),
                                ('$', None, None, None)
                               ])
@@ -254,7 +254,7 @@ class LexAnalyzerForCatchTests(unittest.TestCase):
         source = r'"not closed'
         lst = list(tlex.Container(source))
         self.assertEqual(len(lst), 2)
-        self.assertEqual(lst, [('error', '\'<str>\', 1: \'"\' expected',
+        self.assertEqual(lst, [('error', '\'<str>\', 1:12: \'"\' expected',
                   "('stringlit', 'not closed', '\"not closed', None)", None),
                                ('$', None, None, None)
                               ])
@@ -637,5 +637,84 @@ class LexAnalyzerForCatchTests(unittest.TestCase):
         ])
 
 
+    def test_reset(self):
+        """one lexer reused for more sources, the rules shared
+        """
+        it = iter(tlex.Container('// Story: text'))
+        self.assertIs(it.rules, iter(tlex.Container('')).rules)
+        self.assertEqual(list(it), [('story', 'text', '// Story: text', None),
+                                    ('$', None, None, None)
+                                   ])
+
+        it.reset('SCENARIO')
+        self.assertEqual(list(it), [('scenario', None, 'SCENARIO', None),
+                                    ('$', None, None, None)
+                                   ])
+
+
+class SkimmingLexAnalyzerForCatchTests(unittest.TestCase):
+    """Testing the skimming engine that skips the non-Catch code.
+    """
+
+    def test_skipped_code(self):
+        """C++ code, literals and directives skipped, braces kept
+        """
+        source = textwrap.dedent('''\
+            #include "catch.hpp"
+            #define BLOCK { \\
+                }
+            SCENARIO( "scenario identifier" ) {
+                std::vector<int> v{ 1'000, 2 };
+                char c = '}';
+                auto s = R"x(})x";
+                x = a / b * c - "{";
+                GIVEN( "given identifier" ) {
+                }
+            }''')
+        lst = [tok[0] for tok in tlex.Container(source, 'skim')]
+        self.assertEqual(lst, [
+            'scenario', 'lpar', 'stringlit', 'rpar',
+            'lbrace',
+            'lbrace', 'rbrace',
+            'given', 'lpar', 'stringlit', 'rpar',
+            'lbrace', 'rbrace',
+            'rbrace',
+            '$'])
+
+
+    def test_comments(self):
+        """comments after code skipped are separated by a newline token
+        """
+        source = textwrap.dedent('''\
+            // Story: story identifier
+            //  As a user
+
+            // other comment
+            int x; /* } */
+            ''')
+        lst = list(tlex.Container(source, 'skim'))
+        self.assertEqual(lst, [
+            ('story', 'story identifier', '// Story: story identifier\n', None),
+            ('comment', '  As a user', '//  As a user\n', None),
+            ('newline', '', '\n', None),
+            ('comment', ' other comment', '// other comment\n', None),
+            ('newline', '', 'int x; ', None),
+            ('comment', ' } ', '/* } */', None),
+            ('$', None, None, None)
+        ])
+
+
+class LexAnalyzerForCatchTestsFsa(LexAnalyzerForCatchTests):
+    """The same tests for the finite automaton engine (tlex.Iterator).
+    """
+
+    def setUp(self):
+        self.saved_engine = tlex.defaultEngine
+        tlex.defaultEngine = 'fsa'
+
+    def tearDown(self):
+        tlex.defaultEngine = self.saved_engine
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,164 @@
+#!python3
+import os
+import unittest
+
+import sys
+sys.path.append('..')
+
+import fesyn
+import subprocess
+import tempfile
+import treediff
+import tsyn
+
+
+feature_text = '''\
+Story: story
+
+  description
+     of the story
+
+Scenario: scenario 1
+  Given: given 1
+    and: and given 1
+   When: when 1
+   Then: then 1
+
+Scenario: scenario 2
+  Given: given 2
+   When: when 2
+   Then: then 2
+'''
+
+catch_text = '''\
+// Story: story
+//
+//  description of
+//  the story
+
+SCENARIO( "scenario 1" ) {
+    GIVEN( "given 1" ) {
+        GIVEN( "and given 1" ) {
+            WHEN( "when 1" ) {
+                THEN( "then 1" ) {
+                }
+            }
+        }
+    }
+}
+
+SCENARIO( "scenario 2" ) {
+    GIVEN( "given 2" ) {
+        WHEN( "when 2" ) {
+            AND_WHEN( "and when 2" ) {
+                THEN( "then 2" ) {
+                }
+            }
+        }
+    }
+}
+'''
+
+
+def feature(text):
+    return fesyn.SyntacticAnalyzerForFeature(text).Start()
+
+
+def catch(text):
+    return tsyn.SyntacticAnalyzerForCatch(text).Start()
+
+
+def ops(changes):
+    return [(c.op, c.symbol, c.left, c.right) for c in changes]
+
+
+class TreeDiffTests(unittest.TestCase):
+    """Testing the comparison of the normalized syntax trees.
+    """
+
+    def test_equal(self):
+        """equal trees after the normalization give no changes
+        """
+        tree = feature(feature_text)
+        self.assertEqual(treediff.diff(tree, feature(feature_text)), [])
+        text = feature_text.replace('    and: and given 1\n', '') \
+                           .replace('   Then: then 2', '    and: x\n   Then: then 2')
+        self.assertEqual(treediff.diff(feature(text), feature(text)), [])
+        self.assertEqual(treediff.digest(feature(text)),
+                         treediff.digest(feature(text.replace('given 2', 'given   2 '))))
+
+
+    def test_feature_and_catch(self):
+        """nested GIVEN, AND_WHEN, and the description lines are normalized
+        """
+        text = feature_text.replace('   Then: then 2', '    and: and when 2\n   Then: then 2')
+        changes = treediff.diff(feature(text), catch(catch_text))
+        self.assertEqual(ops(changes), [('changed', 'description',
+                                         'description\nof the story',
+                                         'description of\nthe story')])
+        changes = treediff.diff(feature(feature_text), catch(catch_text))
+        self.assertIn(('added', 'when', None, 'and when 2'), ops(changes))
+        self.assertEqual(changes[-1].path, ('scenario 2', 'given 2', 'when 2'))
+
+
+    def test_renamed_and_removed(self):
+        """renamed items are paired by their children
+        """
+        text = feature_text.replace('Scenario: scenario 1', 'Scenario: first') \
+                           .replace('Then: then 2', 'Then: then two')
+        changes = treediff.diff(feature(feature_text), feature(text))
+        self.assertEqual(ops(changes), [
+            ('renamed', 'scenario', 'scenario 1', 'first'),
+            ('renamed', 'then', 'then 2', 'then two')])
+        self.assertEqual(changes[0].left_start, 5)
+        self.assertEqual(changes[0].right_start, 5)
+
+        text = feature_text[:feature_text.index('Scenario: scenario 2')]
+        self.assertEqual(ops(treediff.diff(feature(feature_text), feature(text))),
+                         [('removed', 'scenario', 'scenario 2', None)])
+
+
+    def test_reordered(self):
+        """swapped scenarios are reported as reordered
+        """
+        i = feature_text.index('Scenario: scenario 1')
+        j = feature_text.index('Scenario: scenario 2')
+        text = feature_text[:i] + feature_text[j:] + '\n' + feature_text[i:j]
+        changes = treediff.diff(feature(feature_text), feature(text))
+        self.assertEqual(ops(changes), [
+            ('reordered', 'scenario', 'scenario 1', 'scenario 1')])
+        self.assertEqual(treediff.longest_increasing([3, None, 0, 1, 4, 2]),
+                         {2, 3, 5})
+
+
+    def test_command(self):
+        """exit status 1 for the changes, 2 when a file cannot be compared
+        """
+        tooldir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            left = os.path.join(tmpdir, 'left.feature')
+            right = os.path.join(tmpdir, 'right.feature')
+            broken = os.path.join(tmpdir, 'broken.feature')
+            for fname, text in ((left, feature_text),
+                                (right, feature_text.replace('given 1', 'given one')),
+                                (broken, 'Scenario: x\n  Then: y\n  Given: z\n')):
+                with open(fname, 'w', encoding='utf-8') as f:
+                    f.write(text)
+
+            def run(*args):
+                return subprocess.run([sys.executable, os.path.join(tooldir, 'treediff.py')]
+                                      + list(args), stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE, universal_newlines=True)
+
+            self.assertEqual(run(left, left).returncode, 0)
+            self.assertEqual(run(left, right).returncode, 1)
+            for args, error in (((left, broken), 'ParseError: '),
+                                ((left, os.path.join(tmpdir, 'missing.feature')),
+                                 'FileNotFoundError: ')):
+                proc = run(*args)
+                self.assertEqual(proc.returncode, 2)
+                self.assertTrue(proc.stderr.startswith(error))
+                self.assertNotIn('Traceback', proc.stderr)
+
+if __name__ == '__main__':
+    unittest.main()
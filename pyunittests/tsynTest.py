@@ -220,6 +220,90 @@ class SyntaxCatchTests(unittest.TestCase):
         ])
 
 
+    def test_error_position(self):
+        """The error message tells the line and the column of the token.
+        """
+        source = textwrap.dedent('''\
+            SCENARIO( "scenario identifier" ) {
+                GIVEN "given identifier" ) {
+                }
+            }''')
+        sa = tsyn.SyntacticAnalyzerForCatch(source)
+        with self.assertRaisesRegex(RuntimeError, 'at line 2, column 11'):
+            sa.Start()
+
+
+    def test_long_input(self):
+        """Many ignored tokens do not exhaust the call stack, deep nesting fails.
+        """
+        source = ('TEST_CASE( "test case identifier" ) {\n'
+                  + '    xxx(); // comment\n' * 5000
+                  + '}\n')
+        sa = tsyn.SyntacticAnalyzerForCatch(source, engine='scanner')
+        tree = sa.Start()
+        self.assertEqual(tree, [('test_case', 'test case identifier', [])])
+
+        source = 'SCENARIO( "scenario identifier" ) {' + '{' * 50 + '}' * 51
+        sa = tsyn.SyntacticAnalyzerForCatch(source, max_depth=10)
+        self.assertRaisesRegex(RuntimeError, 'Nesting deeper than 10 levels',
+                               sa.Start)
+
+
+    def test_iter_items(self):
+        """items are generated one by one as they are parsed
+        """
+        source = textwrap.dedent('''\
+            // Story: story identifier
+            //  description
+            SCENARIO( "scenario 1" ) {
+                GIVEN( "given identifier" ) {
+                }
+            }
+            TEST_CASE( "test case 2" ) {
+            }
+            ''')
+        sa = tsyn.SyntacticAnalyzerForCatch(source)
+        it = sa.iter_items()
+        self.assertEqual(next(it), ('story', 'story identifier'))
+        self.assertEqual(next(it), ('description', ['  description']))
+        self.assertEqual(next(it), ('scenario', 'scenario 1', [
+                                        ('given', 'given identifier', [])]))
+        # The test case was not parsed yet.
+        self.assertEqual(sa.sym, 'test_case')
+        self.assertEqual(list(it), [('test_case', 'test case 2', [])])
+
+
+    def test_recovery(self):
+        """all errors reported in one pass, partial tree returned
+        """
+        source = textwrap.dedent('''\
+            SCENARIO( "scenario 1" ) {
+                GIVEN( "given identifier" {
+                    xxx();
+                }
+            }
+            TEST_CASE( ) {
+            }
+            TEST_CASE( "test case 3" ) {
+            }
+            ''')
+        sa = tsyn.SyntacticAnalyzerForCatch(source)
+        self.assertRaises(RuntimeError, sa.Start)
+
+        sa = tsyn.SyntacticAnalyzerForCatch(source, recover=True)
+        tree = sa.Start()
+        # The test case with the broken heading is not in the tree.
+        self.assertEqual(tree, [('scenario', 'scenario 1', []),
+                                ('test_case', 'test case 3', [])])
+        self.assertEqual(len(sa.diagnostics), 2)
+        d = sa.diagnostics[0]
+        self.assertEqual((d.source_name, d.line, d.column), ('<str>', 2, 31))
+        self.assertEqual(d.expected, ('rpar',))
+        self.assertEqual(d.symbol, 'lbrace')
+        self.assertEqual(sa.diagnostics[1][1:5], (6, 12, ('stringlit',), 'rpar'))
+        self.assertIn('at line 6, column 12', str(sa.diagnostics[1]))
+
+
     def test_case_with_cpp_body_inside_the_body(self):
         """Body of the scenario in {} can contain nested {} not from Catch constructs.
         """
@@ -239,6 +323,46 @@ class SyntaxCatchTests(unittest.TestCase):
         ])
 
 
+    def test_sibling_sections(self):
+        """More THEN, AND_WHEN, and nested GIVEN sections at the same level.
+        """
+        source = textwrap.dedent('''\
+            SCENARIO( "merged" ) {
+                GIVEN( "g" ) {
+                    GIVEN( "g2" ) {
+                    }
+                    WHEN( "w" ) {
+                        THEN( "t1" ) {
+                        }
+                        THEN( "t2" ) {
+                            AND_THEN( "a1" ) {
+                            }
+                            AND_THEN( "a2" ) {
+                            }
+                        }
+                        AND_WHEN( "w2" ) {
+                        }
+                    }
+                }
+            }''')
+        tree = tsyn.SyntacticAnalyzerForCatch(source).Start()
+        self.assertEqual(tree, [
+            ('scenario', 'merged', [
+                ('given', 'g', [
+                    ('and_given', 'g2', []),
+                    ('when', 'w', [
+                        ('then', 't1', []),
+                        ('then', 't2', [
+                            ('and_then', 'a1', []),
+                            ('and_then', 'a2', []),
+                        ]),
+                        ('and_when', 'w2', []),
+                    ]),
+                ]),
+            ])
+        ])
+
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
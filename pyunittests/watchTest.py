@@ -0,0 +1,66 @@
+#!python3
+import os
+import unittest
+
+import sys
+sys.path.append('..')
+
+import tempfile
+import watch
+
+
+class WatcherTests(unittest.TestCase):
+    """Testing the detection of the changed files.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.tmpdir.name, 'a.feature')
+        self.write(self.fname, 'Scenario: a\n')
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def write(self, fname, content):
+        with open(fname, 'w') as f:
+            f.write(content)
+
+
+    def check_watcher(self, watcher):
+        try:
+            self.assertEqual(watcher.wait(0.05), set())
+
+            other = os.path.join(self.tmpdir.name, 'b.feature')
+            self.write(self.fname, 'Scenario: changed\n')
+            self.write(other, 'Scenario: b\n')
+            self.write(os.path.join(self.tmpdir.name, 'ignored.txt'), 'x')
+            changes = next(watch.debounced(watcher, 0.05))
+            self.assertEqual(changes, {self.fname, other})
+
+            os.remove(other)
+            self.assertEqual(watcher.wait(1.0), {other})
+        finally:
+            watcher.close()
+
+
+    def test_polling(self):
+        """polling watcher finds created, modified, and removed files
+        """
+        self.check_watcher(watch.PollingWatcher([self.tmpdir.name],
+                                                ['*.feature'], interval=0.01))
+
+
+    def test_inotify(self):
+        """inotify watcher finds created, modified, and removed files
+        """
+        try:
+            watcher = watch.InotifyWatcher([self.tmpdir.name], ['*.feature'])
+        except (OSError, AttributeError):
+            self.skipTest('inotify not available')
+        self.check_watcher(watcher)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,325 @@
+#!python3
+"""Catch skeletons of all the features packed into N translation units.
+
+    python f2c.py --shards N
+
+The scenarios (and test cases) of all the features are taken in the order
+of the feature files. The skeleton of each one is generated separately;
+its line count is its estimated compile cost. The scenarios are placed,
+the biggest first, into the shard with the fewest lines (see partition())
+-- a big feature is split, small features are packed together. The shard
+of each scenario is remembered; in the next run, only the new scenarios
+are placed. Hence, the edit that grows or shrinks one scenario does not
+move any scenario to another shard -- unless the shards get too unbalanced.
+
+The shards are the generated-only output in their own directory
+(shards/shard_<hash>.cpp, the name derived from the content); they are
+not meant to be edited -- the per-feature skeletons are. The build
+compiles either the shards, or the per-feature tests/*.cpp (with
+the tests/TestMain.cpp in both cases); the scenarios are defined in both.
+The unchanged shards keep their names and are not rewritten; the edit
+dirties only the shard with the edited scenario. The shards that are
+no longer generated are removed.
+
+The hashes of the written shards are recorded in the shards/.shards.manifest.
+When any shard differs from the record (i.e. it was edited), nothing
+is overwritten or removed.
+"""
+
+import collections
+import glob
+import hashlib
+import itertools
+import json
+import os
+
+import batch
+import f2c
+import fesyn
+import manifest
+import outfile
+import syntree
+
+from parsecache import catch_extensions
+from syntree import Kind
+
+
+# The skeleton of one scenario (or test case). The title is the story
+# or the feature of its file (like 'Feature: title'), or the empty string.
+# The name is the name of the scenario.
+Chunk = collections.namedtuple('Chunk', ['fname', 'title', 'name', 'lines'])
+
+shard_prefix = 'shard_'
+manifest_name = '.shards.manifest'
+
+# The biggest shard may exceed the one of the fresh placement that much
+# before all the scenarios are placed again (see partition()).
+rebalance_ratio = 1.2
+
+
+def feature_chunks(fname_in, cache=None, merge=False):
+    """Returns (chunks, error) for the feature file.
+
+    The exception is converted to the error message (as in
+    the batch.convert_file()). The cache is the optional astcache.ASTCache
+    (or parsecache.TreeCache) with the syntax trees. With the merge, the scenarios
+    are merged first (see syntree.merge_scenarios()).
+    """
+    try:
+        if cache is not None:
+            tree = cache.parse(fname_in, 'feature')
+        else:
+            with open(fname_in, encoding='utf_8') as fin:
+                tree = fesyn.SyntacticAnalyzerForFeature(fin).Start()
+    except Exception as e:
+        return None, '{}: {}'.format(type(e).__name__, e)
+    if merge:
+        tree = syntree.merge_scenarios(tree)
+
+    cg = f2c.CatchCodeGenerator()
+    title = ''
+    chunks = []
+    for node in tree:
+        if node.kind in (Kind.STORY, Kind.FEATURE):
+            title = '{}: {}'.format(node.symbol.capitalize(), node.text)
+        elif node.kind != Kind.DESCRIPTION:
+            chunks.append(Chunk(fname_in, title, node.text, cg.skeleton([node])))
+    return chunks, None
+
+
+def chunk_key(chunk):
+    """Returns the identity of the chunk (the file base name and the scenario name).
+
+    It does not change when the steps of the scenario are edited.
+    """
+    return os.path.basename(chunk.fname) + '\n' + chunk.name
+
+
+def partition(chunks, n, slots=None):
+    """Returns the list of the shard indices (0 to n-1) for the chunks.
+
+    The slots maps the chunk_key() to the shard index of the previous run.
+    The known chunks stay in their shards; the new ones are placed, the biggest
+    first, into the shard with the fewest lines. When the biggest shard
+    gets over rebalance_ratio of the biggest one after placing all
+    the chunks that way, the latter is used.
+    """
+    sizes = [len(chunk.lines) for chunk in chunks]
+    result, loads = place(sizes, n, [(slots or {}).get(chunk_key(chunk))
+                                     for chunk in chunks])
+    if slots:
+        fresh, fresh_loads = place(sizes, n, [None] * len(chunks))
+        if max(loads) > rebalance_ratio * max(fresh_loads):
+            return fresh
+    return result
+
+
+def place(sizes, n, indices):
+    """Returns the shard indices and the line counts of the shards.
+
+    The indices are the known shards of the items, or None for the new items.
+    """
+    loads = [0] * n
+    result = [None] * len(sizes)
+    for i, index in enumerate(indices):
+        if index is not None and index < n:
+            result[i] = index
+            loads[index] += sizes[i]
+
+    new = sorted((i for i, index in enumerate(result) if index is None),
+                 key=lambda i: -sizes[i])
+    for i in new:
+        index = loads.index(min(loads))
+        result[i] = index
+        loads[index] += sizes[i]
+    return result, loads
+
+
+def shard_lines(chunks):
+    """Returns the lines of the shard source for the chunks.
+
+    The scenarios of each feature are preceded by the plain comment
+    with the file name and the title. (The story/feature comment
+    of the Catch source is recognized only at its beginning.)
+    """
+    lines = ['#include "catch.hpp"']
+    fname = None
+    for chunk in chunks:
+        if chunk.fname != fname:
+            fname = chunk.fname
+            lines.append('')
+            comment = '// ----- ' + os.path.basename(fname)
+            if chunk.title:
+                comment += ' -- ' + chunk.title
+            lines.append(comment)
+        lines.extend(chunk.lines)
+    return lines
+
+
+def shard_name(lines):
+    """Returns the file name derived from the content of the shard.
+    """
+    h = hashlib.sha1('\n'.join(lines).encode('utf-8'))
+    return shard_prefix + h.hexdigest()[:12] + '.cpp'
+
+
+class ShardManifest:
+    """Record of the shards written to the directory.
+
+    The files maps the name of the shard to the hash of its content.
+    The slots maps the chunk_key() of each scenario to the index of its shard,
+    the shards is their number.
+    """
+
+    def __init__(self, shards_dir):
+        self.dir = shards_dir
+        self.fname = os.path.join(shards_dir, manifest_name)
+        self.files = {}
+        self.slots = {}
+        self.shards = None
+
+        # The broken record is ignored; then all the existing shards
+        # look edited, and they are not touched.
+        try:
+            with open(self.fname, encoding='utf-8') as f:
+                data = json.load(f)
+            self.files = data['files']
+            self.slots = data['slots']
+            self.shards = data['shards']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+
+    def edited(self):
+        """Returns the sorted list of the shards that differ from the record.
+
+        The shard that is not recorded at all counts as the edited one.
+        """
+        lst = []
+        for fname in sorted(glob.glob(os.path.join(self.dir, shard_prefix + '*.cpp'))):
+            if self.files.get(os.path.basename(fname)) != manifest.file_hash(fname):
+                lst.append(fname)
+        return lst
+
+
+    def save(self):
+        """Writes the record via the temporary file (see manifest.Manifest).
+        """
+        with outfile.OutputFile(self.fname) as f:
+            json.dump({'files': self.files, 'slots': self.slots,
+                       'shards': self.shards}, f, indent=1, sort_keys=True)
+
+
+def feature_sources(fnames, tests_dir):
+    """Returns the list of the existing per-feature Catch sources.
+
+    They define the same scenarios as the shards (tests/X.cpp for
+    features/X.feature, or .hpp, .h).
+    """
+    lst = []
+    for fname in fnames:
+        name = os.path.splitext(os.path.basename(fname))[0]
+        for ext in catch_extensions:
+            fname_catch = os.path.join(tests_dir, name + ext)
+            if os.path.isfile(fname_catch):
+                lst.append(fname_catch)
+    return lst
+
+
+def write_shards(chunks, n, shards_dir):
+    """Writes the chunks as n shards to the shards_dir.
+
+    Returns the list of (fname, changed) of the shards, the list
+    of the removed stale shards, and the list of the edited shards
+    (see ShardManifest.edited()). When some shard was edited, nothing
+    is written nor removed. The empty shards are not written.
+    """
+    mf = ShardManifest(shards_dir)
+    edited = mf.edited()
+    if edited:
+        return [], [], edited
+
+    # The scenarios stay in their shards unless the number changed.
+    indices = partition(chunks, n, mf.slots if mf.shards == n else None)
+    shards = [[] for i in range(n)]
+    for chunk, i in zip(chunks, indices):
+        shards[i].append(chunk)
+
+    written = []
+    for shard in shards:
+        if not shard:
+            continue
+        lines = shard_lines(shard)
+        fname = os.path.join(shards_dir, shard_name(lines))
+        of = outfile.OutputFile(fname)
+        with of as fout:
+            write = outfile.LineWriter(fout)
+            for line in lines:
+                write(line)
+        written.append((fname, of.changed))
+
+    names = {os.path.basename(fname) for fname, changed in written}
+    removed = []
+    for fname in sorted(glob.glob(os.path.join(shards_dir, shard_prefix + '*.cpp'))):
+        if os.path.basename(fname) not in names:
+            os.remove(fname)
+            removed.append(fname)
+
+    mf.files = {os.path.basename(fname): manifest.file_hash(fname)
+                for fname, changed in written}
+    mf.slots = {chunk_key(chunk): i for chunk, i in zip(chunks, indices)}
+    mf.shards = n
+    mf.save()
+    return written, removed, []
+
+
+def run(fnames, n, shards_dir, jobs=None, cache=None, merge=False,
+        tests_dir=None, out=print):
+    """Generates the shards from the feature files, logs the result.
+
+    The features are parsed in the processes (see the batch.parallel_map()).
+    When any feature fails, the shards are not written -- its scenarios
+    would be missing. The per-feature sources in the optional tests_dir
+    are reported (see feature_sources()). Returns the list of the failed
+    (fname, error), including the edited shards.
+    """
+    results = batch.parallel_map(feature_chunks, fnames, itertools.repeat(cache),
+                                 itertools.repeat(merge), jobs=jobs)
+    chunks = []
+    failed = []
+    for fname, (lst, error) in zip(fnames, results):
+        if error is None:
+            chunks.extend(lst)
+        else:
+            failed.append((fname, error))
+
+    if failed:
+        out('-----------------------------------------------------------')
+        out('{} file(s) failed, the shards were not written:'.format(len(failed)))
+        for fname, error in failed:
+            out(batch.short_name(fname) + ':', error)
+        return failed
+
+    written, removed, edited = write_shards(chunks, n, shards_dir)
+    if edited:
+        out('-----------------------------------------------------------')
+        out('{} shard(s) edited, nothing was overwritten; the shards are'
+            ' generated only (fill in the per-feature skeletons):'.format(len(edited)))
+        for fname in edited:
+            out(batch.short_name(fname))
+        return [(fname, 'edited shard') for fname in edited]
+
+    out('{} feature(s), {} scenario(s) -->'.format(len(fnames), len(chunks)))
+    for fname, changed in written:
+        out('   ', batch.short_name(fname) + ('' if changed else ' (unchanged)'))
+    for fname in removed:
+        out('    removed', batch.short_name(fname))
+
+    if tests_dir is not None:
+        sources = feature_sources(fnames, tests_dir)
+        if sources:
+            out('Warning: {} per-feature source(s) define the same scenarios;'
+                ' compile either them, or the shards:'.format(len(sources)))
+            for fname in sources:
+                out('   ', batch.short_name(fname))
+    return failed
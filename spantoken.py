@@ -0,0 +1,97 @@
+#!python3
+"""Lexical tokens that refer to the source buffer instead of holding strings.
+"""
+
+
+class SpanToken:
+    """Lexical token (symbol, value, lexem, extra_info) with lazy strings.
+
+    The lexem and the value are stored only as the (start, end) offsets
+    to the source string. The strings are sliced from the source only
+    when accessed. This way, the tokens that are skipped by the syntactic
+    analyzer cost no string allocation.
+
+    The start or the vstart set to None means the lexem or the value is None.
+    The token behaves like the 4-tuple (indexing, unpacking, comparison
+    with tuples); hence, it can be used instead of the tuple tokens.
+    """
+
+    __slots__ = ('symbol', 'source', 'start', 'end', 'vstart', 'vend',
+                 'extra_info')
+
+    def __init__(self, symbol, source, start, end, vstart, vend,
+                 extra_info=None):
+        self.symbol = symbol
+        self.source = source
+        self.start = start
+        self.end = end
+        self.vstart = vstart
+        self.vend = vend
+        self.extra_info = extra_info
+
+
+    @property
+    def lexem(self):
+        if self.start is None:
+            return None
+        return self.source[self.start:self.end]
+
+
+    @property
+    def value(self):
+        if self.vstart is None:
+            return None
+        return self.source[self.vstart:self.vend]
+
+
+    def __getitem__(self, index):
+        if index == 0:
+            return self.symbol
+        elif index == 1:
+            return self.value
+        elif index == 2:
+            return self.lexem
+        elif index == 3:
+            return self.extra_info
+        return self.astuple()[index]
+
+
+    def __len__(self):
+        return 4
+
+
+    def __iter__(self):
+        return iter(self.astuple())
+
+
+    def astuple(self):
+        """Returns the materialized (symbol, value, lexem, extra_info).
+        """
+        return (self.symbol, self.value, self.lexem, self.extra_info)
+
+
+    def __eq__(self, other):
+        if isinstance(other, (tuple, SpanToken)):
+            return self.astuple() == tuple(other)
+        return NotImplemented
+
+
+    def __hash__(self):
+        return hash(self.astuple())
+
+
+    def __repr__(self):
+        return repr(self.astuple())
+
+
+def strtoken(symbol, value, lexem, extra_info=None):
+    """Builds the SpanToken from the strings that are not in the source.
+
+    Used for tokens like errors where the value and the lexem are formatted
+    messages. The value and the lexem are joined into one buffer.
+    """
+    buf = (value or '') + (lexem or '')
+    vstart = None if value is None else 0
+    start = None if lexem is None else len(buf) - len(lexem)
+    return SpanToken(symbol, buf, start, len(buf), vstart,
+                     0 if value is None else len(value), extra_info)
@@ -0,0 +1,233 @@
+#!python3
+"""Syntax tree nodes shared by the fesyn and tsyn syntactic analyzers.
+
+The analyzers build the trees of Node objects. A Node also behaves like
+the legacy tuple form of the tree items -- (symbol, text) for story
+and feature, ('description', lines), and (symbol, text, children)
+for the other items -- so that the code generators can process it without
+changes. The astuple() returns the legacy form with the nested tuples
+and lists.
+"""
+
+import enum
+
+
+class Kind(enum.IntEnum):
+    """Kinds of the syntax tree items.
+    """
+    STORY       = 1
+    FEATURE     = 2
+    DESCRIPTION = 3
+    TEST_CASE   = 4
+    SECTION     = 5
+    SCENARIO    = 6
+    GIVEN       = 7
+    AND_GIVEN   = 8
+    WHEN        = 9
+    AND_WHEN    = 10
+    THEN        = 11
+    AND_THEN    = 12
+
+
+# Conversion from the legacy symbol to the kind and back.
+kind_of = {kind.name.lower(): kind for kind in Kind}
+symbol_of = [None] + [kind.name.lower() for kind in Kind]
+
+#-----------------------------------------------------------------------
+
+class Node:
+    """One item of the syntax tree.
+
+    The kind is the Kind value, the text is the identifier of the item.
+    The children is the list of the nested nodes; for the description
+    item, it is the list of the description lines, and for the story
+    and feature items it is None. The start and the end describe the span
+    of the item in the source -- the line indices for the feature sources,
+    the char offsets for the Catch sources.
+    """
+
+    __slots__ = ('kind', 'text', 'children', 'start', 'end')
+
+    def __init__(self, kind, text, children=None, start=None, end=None):
+        self.kind = kind
+        self.text = text
+        self.children = children
+        self.start = start
+        self.end = end
+
+
+    @property
+    def symbol(self):
+        return symbol_of[self.kind]
+
+
+    @property
+    def span(self):
+        return self.start, self.end
+
+
+    def astuple(self):
+        """Returns the legacy tuple form of the subtree.
+        """
+        if self.kind == Kind.DESCRIPTION:
+            return (symbol_of[self.kind], self.children)
+        elif self.children is None:
+            return (symbol_of[self.kind], self.text)
+        return (symbol_of[self.kind], self.text,
+                [child.astuple() for child in self.children])
+
+
+    def key(self):
+        """Returns the hashable form of the subtree (without the spans).
+        """
+        if self.kind == Kind.DESCRIPTION:
+            return (self.kind, tuple(self.children))
+        elif self.children is None:
+            return (self.kind, self.text)
+        return (self.kind, self.text,
+                tuple(child.key() for child in self.children))
+
+
+    def pack(self):
+        """Returns the compact form of the subtree made of the plain tuples.
+
+        The form can be serialized by the marshal module. See unpack().
+        """
+        if self.kind == Kind.DESCRIPTION:
+            children = tuple(self.children)
+        elif self.children is None:
+            children = None
+        else:
+            children = tuple(child.pack() for child in self.children)
+        return (int(self.kind), self.text, children, self.start, self.end)
+
+
+    def move(self, delta):
+        """Moves the spans of the subtree by delta (in place).
+        """
+        if self.start is not None:
+            self.start += delta
+        if self.end is not None:
+            self.end += delta
+        if self.children is not None and self.kind != Kind.DESCRIPTION:
+            for child in self.children:
+                child.move(delta)
+
+
+    # The Node can be used instead of the legacy tuple.
+    def __getitem__(self, index):
+        if index == 0:
+            return symbol_of[self.kind]
+        elif index == 1:
+            if self.kind == Kind.DESCRIPTION:
+                return self.children
+            return self.text
+        elif index == 2 and self.children is not None \
+             and self.kind != Kind.DESCRIPTION:
+            return self.children
+        raise IndexError('Node index out of range')
+
+
+    def __len__(self):
+        if self.children is None or self.kind == Kind.DESCRIPTION:
+            return 2
+        return 3
+
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+    def __eq__(self, other):
+        if isinstance(other, Node):
+            return self.key() == other.key()
+        elif isinstance(other, tuple):
+            return self.astuple() == other
+        return NotImplemented
+
+
+    def __hash__(self):
+        return hash(self.key())
+
+
+    def __repr__(self):
+        return repr(self.astuple())
+
+#-----------------------------------------------------------------------
+
+def totuples(tree):
+    """Converts the list of nodes to the legacy list of tuples.
+    """
+    return [node.astuple() for node in tree]
+
+
+def unpack(packed):
+    """Returns the Node from the compact form made by the Node.pack().
+    """
+    kind, text, children, start, end = packed
+    kind = Kind(kind)
+    if kind == Kind.DESCRIPTION:
+        children = list(children)
+    elif children is not None:
+        children = [unpack(child) for child in children]
+    return Node(kind, text, children, start, end)
+
+#-----------------------------------------------------------------------
+
+def merge_scenarios(tree):
+    """Returns the tree where the scenarios with the same first step are merged.
+
+    The scenarios that start with the same single step (like the same GIVEN)
+    become one scenario at the place of the first of them. Their steps form
+    the prefix tree -- the equal steps (the same kind and text) at the same
+    level are merged, the different ones branch. Catch runs each branch
+    as the section from the beginning; hence, the shared setup is written
+    (and compiled) only once. The name of the merged scenario is made of
+    the names of the original ones. The nodes of the given tree are not
+    modified; the unchanged subtrees are shared.
+    """
+    result = []
+    merged = {}         # (kind, text) of the first step --> (index, names)
+    for node in tree:
+        if node.kind != Kind.SCENARIO or len(node.children) != 1:
+            result.append(node)
+            continue
+        first = node.children[0]
+        key = (first.kind, first.text)
+        if key not in merged:
+            merged[key] = (len(result), [node.text])
+            result.append(node)
+            continue
+
+        # The first scenario is copied when the second one is merged in.
+        i, names = merged[key]
+        scenario = result[i]
+        if len(names) == 1:
+            scenario = Node(scenario.kind, scenario.text, scenario.children,
+                            scenario.start, scenario.end)
+            result[i] = scenario
+        scenario.children = merge_steps(scenario.children, node.children)
+        names.append(node.text)
+        scenario.text = '; '.join(names)
+    return result
+
+
+def merge_steps(steps, other):
+    """Returns the list of the steps with the other steps merged in.
+
+    The equal steps are merged recursively, the others are appended.
+    The given nodes are not modified.
+    """
+    result = list(steps)
+    index = {(node.kind, node.text): i for i, node in enumerate(result)}
+    for node in other:
+        i = index.get((node.kind, node.text))
+        if i is None:
+            index[(node.kind, node.text)] = len(result)
+            result.append(node)
+        else:
+            step = result[i]
+            result[i] = Node(step.kind, step.text,
+                             merge_steps(step.children, node.children),
+                             step.start, step.end)
+    return result
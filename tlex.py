@@ -2,8 +2,12 @@
 """Lexical analysis for the Catch test sources.
 """
 
+import collections
 import re
 
+from lineindex import LineIndex
+from spantoken import SpanToken, strtoken
+
 # The Catch-defined identifiers are considered keywords for this purpose.
 # The following dictionary contains transformation of the Catch identifier
 # to the related symbols.
@@ -23,7 +27,7 @@ known_id = {
 # If recognized, the 'comment' is changed to 'story' or 'feature'.
 # The matched label may have more forms (think about more human languages
 # in the comment). The subpaterns for labels are only described here.
-# The related full patterns are constructed in the buildRegexMatchFunctions()
+# The related full patterns are constructed in the buildRuleTable()
 # below.
 rulesRex = [
     # Labels that identify portions via free text (inside comments
@@ -51,44 +55,76 @@ def build_str_closures(s, lexid, iterator):
 
 #-----------------------------------------------------------------------
 
-def build_rex_closures(pattern, lexsym):
-    """Builds the pair of closures for the regex pattern.
-    """
-    # Unlike the above build_str_closures(), it works directly with a string
-    # variable and positions -- i.e. can be used independently on Container/Iterator
-    # of the lexical analyzer. The result function also returns a tuple
-    # with more elements.
-
-    def match_rex(source, pos):
-        # Actually returns a match object that can be interpreted
-        # in a boolean context as True/False (matches/does not match).
-        rex = re.compile(pattern, re.IGNORECASE)
-        return rex.match(source[pos:])
+# The compiled rules are immutable; hence, one instance can be shared
+# by all iterators (also from more threads).
+RuleTable = collections.namedtuple('RuleTable', [
+    'comment_rexes', 'token_rex', 'skim_rex', 'string_rex', 'char_rex',
+    'rawstring_rex', 'directive_rex'])
 
-    def result_rex(source, pos):
-        m = match_rex(source, pos)      # see the match_rex() above
-        text = m.group('text')          # the matched text
-        return lexsym, text
 
-    return (match_rex, result_rex)
-
-#-----------------------------------------------------------------------
+def buildRuleTable():
+    """Builds the table of the compiled regular expressions.
 
-def buildRegexMatchFunctions():
-    """Builds the list of (match_fn, result_fn) closures for regular expressions.
+    The comment_rexes is the tuple of (compiled_regex, lexsym) used for
+    recognizing the story/feature inside the comment value. The token_rex
+    recognizes whole tokens for the ScanningIterator. The other regular
+    expressions are used by the SkimmingIterator.
     """
-    functions = []
+    comment_rexes = []
 
     for pat, lexid in rulesRex:
         # Variant for a single line.
         pattern = r'\s*' + pat + r':\s*(?P<text>.+?)\s*$'
-        functions.append(build_rex_closures(pattern, lexid))
+        comment_rexes.append((re.compile(pattern, re.IGNORECASE), lexid))
 
         # Variant for a multi line.
         pattern = r'\s*' + pat + r':\s*(?P<text>.+?)\s*\n'
-        functions.append(build_rex_closures(pattern, lexid))
-
-    return functions
+        comment_rexes.append((re.compile(pattern, re.IGNORECASE), lexid))
+
+    # The regex for the scanning engine. Leading spaces and tabs are captured
+    # by the 'ws' group as they become a part of the lexem. Exactly one
+    # of the other named groups identifies the kind of the token.
+    token_rex = re.compile(r'''
+        (?P<ws>[ \t]*)
+        (?:
+            (?P<newline>\n)
+          | (?P<cppcomment>//(?P<cppcomment_text>[^\n]*)\n?)
+          | (?P<ccomment>/\*(?P<ccomment_text>[\s\S]*?)\*/)
+          | (?P<stringlit>"(?P<stringlit_text>(?:[^"\\]|\\[\s\S])*)")
+          | (?P<identifier>[^\W\d]\w*)
+          | (?P<num>\d+)
+          | (?P<directive>\#[\s\S](?:[^\\\n]|\\[\s\S])*(?P<directive_end>\n)?)
+          | (?P<eq>==)
+          | (?P<punct>[(){},:;=])
+        )?''', re.VERBOSE)
+
+    # The regex for the skimming engine searches for the next interesting
+    # place in the source. The Catch identifiers must be whole words.
+    keywords = sorted(known_id, key=len, reverse=True)
+    skim_rex = re.compile(r'''
+            (?P<lbrace>\{)
+          | (?P<rbrace>\})
+          | (?P<dquote>")
+          | (?P<squote>')
+          | (?P<slash>/)
+          | (?P<hash>\#)
+          | (?P<keyword>\b(?:''' + '|'.join(keywords) + r''')\b)
+        ''', re.VERBOSE)
+
+    # The rest of the string literal after the opening dquote, the char
+    # literal, the opening of the raw string literal R"delimiter( after
+    # the dquote, and the preprocessor directive with the continuation lines.
+    string_rex = re.compile(r'(?:[^"\\]|\\[\s\S])*"')
+    char_rex = re.compile(r"'(?:[^'\\\n]|\\.)*'")
+    rawstring_rex = re.compile(r'([^()\\\s]{0,16})\(')
+    directive_rex = re.compile(r'\#(?:[^\\\n]|\\[\s\S])*\n?')
+
+    return RuleTable(tuple(comment_rexes), token_rex, skim_rex, string_rex,
+                     char_rex, rawstring_rex, directive_rex)
+
+
+# The rules are built only once when the module is imported.
+ruleTable = buildRuleTable()
 
 #-----------------------------------------------------------------------
 
@@ -97,12 +133,18 @@ class Iterator:
     """
     def __init__(self, container, startpos):
         self.container = container
+        self.rules = ruleTable  # shared, compiled only once
+        self.rewind(startpos)
+
+
+    def rewind(self, startpos=0):
+        """Restarts the iteration over the (possibly reloaded) container.
+        """
         self.pos = startpos
 
         self.source = self.container.source
         self.srclen = len(self.container.source)
         self.source_name = self.container.source_name
-        self.lineno = 1
 
         self.status = 0         # of the finite automaton
         self.symbol = None
@@ -110,20 +152,60 @@ class Iterator:
         self.lexemlst = []
         self.extra_info = None
 
-        self.regex_match_fns = buildRegexMatchFunctions()
+
+    def reset(self, source):
+        """Reuses the iterator (and its container) for another source.
+        """
+        self.container.reset(source)
+        self.rewind(0)
 
 
     def __iter__(self):
         return self
 
 
+    @property
+    def lineno(self):
+        """Line number of the current position (for error messages).
+        """
+        return self.container.lineindex().lineno(self.pos)
+
+
+    def offset(self, token):
+        """Returns the offset of the token returned as the last one.
+
+        The leading spaces of the lexem are not counted.
+        """
+        symbol, value, lexem, extra_info = token
+        offset = self.pos
+        if lexem is not None and symbol != 'error':
+            # The lexem was consumed just before the current position.
+            offset -= len(lexem.lstrip(' \t'))
+        return offset
+
+
+    def position(self, token):
+        """Returns (line, column) of the token returned as the last one.
+        """
+        return self.container.position(self.offset(token))
+
+
+    def resumable(self):
+        """Checks whether the iteration started at the offset of the last token
+        returns the same tokens as this iterator.
+
+        The tokens do not depend on the previous ones.
+        """
+        return True
+
+
     def notImplemented(self, msg=''):
         source_name = self.source_name
-        line_no = self.lineno
+        line_no, column = self.container.position(self.pos - 1)
         raise NotImplementedError(('status={}: {!r}\n'
-                                   'line no. {}, source {!r}').format(
+                                   'line no. {}, column {}, source {!r}').format(
                                        self.status, msg,
-                                       line_no, source_name))
+                                       line_no, column, source_name))
 
 
     def lextoken(self):
@@ -164,9 +246,9 @@ class Iterator:
         current = self.lextoken()
 
         source_name = self.source_name
-        line_no = self.lineno
-        error_token = ('error', '{!r}, {}: {!r} expected'.format(
-                                 source_name, line_no, s),
+        line_no, column = self.container.position(self.pos)
+        error_token = ('error', '{!r}, {}:{}: {!r} expected'.format(
+                                 source_name, line_no, column, s),
                         repr(current), None)
 
 
@@ -180,10 +262,10 @@ class Iterator:
         assert self.symbol == 'comment'
         value = ''.join(self.valuelst)
 
-        for match_fn, result_fn in self.regex_match_fns:
-            pos = 0
-            if match_fn(value, pos):
-                symbol, new_value = result_fn(value, pos)
+        for rex, symbol in self.rules.comment_rexes:
+            m = rex.match(value)
+            if m:
+                new_value = m.group('text')
                 assert symbol == 'story' or symbol == 'feature'
                 assert self.symbol == 'comment'
 
@@ -204,8 +286,6 @@ class Iterator:
         c = self.source[self.pos]
         self.lexemlst.append(c)
         self.pos += 1           # advanced to the next one
-        if c == '\n':
-            self.lineno += 1    # line counter for error messages
 
 
     def back_from_lexem(self):
@@ -214,8 +294,6 @@ class Iterator:
         c = self.lexemlst[-1]
         del self.lexemlst[-1]
         self.pos -= 1           # back to the previous one
-        if c == '\n':
-            self.lineno -= 1    # line counter for error messages
         return c
 
 
@@ -470,13 +548,461 @@ class Iterator:
 
 #-----------------------------------------------------------------------
 
+# Symbols of the one-char terminals recognized by the ScanningIterator.
+punctuation = {
+    '(':    'lpar',
+    ')':    'rpar',
+    '{':    'lbrace',
+    '}':    'rbrace',
+    ',':    'comma',
+    ':':    'colon',
+    ';':    'semic',
+    '=':    'assignment',
+}
+
+
+class ScanningIterator:
+    """Iterates over the Container and returns lexical elements.
+
+    Unlike the Iterator, it does not process the source char by char.
+    The whole tokens are recognized by the compiled regex from the rule table.
+    The stream of the lexical tokens is the same as the one returned
+    by the Iterator. The tokens are SpanToken objects that refer
+    to the source; the lexem and value strings are created only on access.
+    """
+    def __init__(self, container, startpos):
+        self.container = container
+        self.rules = ruleTable  # shared, compiled only once
+        self.rewind(startpos)
+
+
+    def rewind(self, startpos=0):
+        """Restarts the iteration over the (possibly reloaded) container.
+        """
+        self.pos = startpos
+
+        self.source = self.container.source
+        self.srclen = len(self.container.source)
+        self.source_name = self.container.source_name
+
+        self.status = 0         # 0 = scanning, 800 = end of data, 1000 = done
+
+
+    @property
+    def lineno(self):
+        """Line number of the current position (for error messages).
+
+        It is not updated for each token. It is found only when needed.
+        """
+        return self.container.lineindex().lineno(self.pos)
+
+
+    def offset(self, token):
+        """Returns the offset of the token without the leading spaces.
+        """
+        if token.start is not None and token.symbol != 'error':
+            return token.end - len(token.lexem.lstrip(' \t'))
+        return self.pos
+
+
+    def position(self, token):
+        """Returns (line, column) of the token (without the leading spaces).
+        """
+        return self.container.position(self.offset(token))
+
+
+    def resumable(self):
+        """Checks whether the iteration started at the offset of the last token
+        returns the same tokens as this iterator.
+
+        The tokens do not depend on the previous ones.
+        """
+        return True
+
+
+    def reset(self, source):
+        """Reuses the iterator (and its container) for another source.
+        """
+        self.container.reset(source)
+        self.rewind(0)
+
+
+    def __iter__(self):
+        return self
+
+
+    def notImplemented(self, status, pos):
+        """Reports the unexpected char at the pos like the Iterator does.
+        """
+        self.pos = pos + 1      # the char was consumed by the Iterator
+        line_no, column = self.container.position(pos)
+        raise NotImplementedError(('status={}: {!r}\n'
+                                   'line no. {}, column {}, source {!r}').format(
+                                       status, self.source[pos],
+                                       line_no, column, self.source_name))
+
+
+    def token(self, symbol, start, end, vstart=None, vend=None):
+        """Forms the lexical token from the spans in the source.
+
+        The empty lexem is None. The empty value is None except for the symbols
+        where the Iterator uses the empty string.
+        """
+        if start == end:
+            start = None
+        if vstart == vend and symbol not in ('stringlit', 'newline', 'comment'):
+            vstart = None
+        return SpanToken(symbol, self.source, start, end, vstart, vend)
+
+
+    def comment_or_feature(self, start, end, vstart, vend):
+        """Returns the comment token or the story/feature token.
+        """
+        for rex, symbol in self.rules.comment_rexes:
+            m = rex.match(self.source, vstart, vend)
+            if m:
+                vstart, vend = m.span('text')
+                return SpanToken(symbol, self.source, start, end, vstart, vend)
+        return SpanToken('comment', self.source, start, end, vstart, vend)
+
+
+    def expected(self, s, current):
+        """Forms error lexical token.
+        """
+        line_no, column = self.container.position(self.pos)
+        return strtoken('error', '{!r}, {}:{}: {!r} expected'.format(
+                                     self.source_name, line_no, column, s),
+                        repr(current))
+
+
+    def incomplete(self, wsend):
+        """Returns the token for unfinished construct at the end of data.
+
+        The Iterator returns or the error token, or (for some of the
+        unfinished constructs) the end-of-data token with the collected
+        lexem and value. The same is reproduced here.
+        """
+        source = self.source
+        start = self.pos
+        end = self.srclen
+        rest = source[wsend:]
+        self.pos = end
+        self.status = 1000      # unless the error token is returned below
+
+        c = rest[0]
+        if c == '/':
+            if len(rest) == 1:
+                return self.token('$', start, end)
+            # Unclosed comment. The Iterator waits for the slash when
+            # the last char is a star.
+            if len(rest) > 2 and rest.endswith('*'):
+                return self.token('$', start, end, wsend + 2, end - 1)
+            self.status = 800
+            return self.expected('*/', ('comment', rest[2:],
+                                        source[start:], None))
+        elif c == '"':
+            # Unclosed string literal. The Iterator waits for the escaped
+            # char when the last char is the lone backslash.
+            body = rest[1:]
+            if (len(body) - len(body.rstrip('\\'))) % 2 == 1:
+                return self.token('$', start, end, wsend + 1, end)
+            self.status = 800
+            return self.expected('"', ('stringlit', body,
+                                       source[start:], None))
+        else:
+            # The preprocessor directive with the lone '#' or with the lone
+            # backslash at the end.
+            assert c == '#'
+            return self.token('$', start, end, wsend, end)
+
+
+    def __next__(self):
+        """Returns lexical tokens (symbol, value, lexem, extra_info).
+        """
+        if self.status == 1000:
+            raise StopIteration
+
+        if self.status == 800:
+            self.status = 1000
+            return SpanToken('$', None, None, None, None, None)
+
+        source = self.source
+        start = self.pos
+        m = self.rules.token_rex.match(source, start)
+        wsend = m.end('ws')
+        kind = m.lastgroup
+
+        if kind == 'ws':
+            # Nothing recognized after the optional spaces and tabs.
+            if wsend == self.srclen:
+                self.pos = wsend
+                self.status = 1000
+                return self.token('$', start, wsend)
+            c = source[wsend]
+            if c in '/"#' and (c != '/' or wsend + 1 == self.srclen
+                               or source[wsend + 1] == '*'):
+                return self.incomplete(wsend)
+            if c == '/':
+                self.notImplemented(1, wsend + 1)
+            self.notImplemented(0, wsend)
+
+        end = m.end()
+
+        # The regex classes differ from the str methods used by the Iterator
+        # for the digits that are not decimal (like superscripts). The rare
+        # cases are fixed here.
+        if kind == 'identifier':
+            c = source[wsend]
+            if not (c.isalpha() or c == '_'):
+                if not c.isdigit():
+                    self.notImplemented(0, wsend)
+                kind = 'num'
+                end = wsend
+        if kind == 'num':
+            while end < self.srclen and source[end].isdigit():
+                end += 1
+
+        if kind == 'directive':
+            if m.group('directive_end') is None and end < self.srclen:
+                # The lone backslash at the end of data follows.
+                return self.incomplete(wsend)
+            self.pos = end
+            return self.token('preprocessor_directive', start, end, wsend, end)
+
+        self.pos = end
+
+        if kind == 'identifier':
+            symbol = known_id.get(m.group('identifier'), None)
+            if symbol:
+                return SpanToken(symbol, source, start, end, None, None)
+            return SpanToken('identifier', source, start, end, wsend, end)
+        elif kind == 'punct':
+            return SpanToken(punctuation[source[wsend]], source, start, end,
+                             None, None)
+        elif kind == 'newline':
+            return SpanToken('newline', source, start, end, end, end)
+        elif kind == 'cppcomment':
+            vstart, vend = m.span('cppcomment_text')
+            return self.comment_or_feature(start, end, vstart, vend)
+        elif kind == 'ccomment':
+            vstart, vend = m.span('ccomment_text')
+            return self.comment_or_feature(start, end, vstart, vend)
+        elif kind == 'stringlit':
+            vstart, vend = m.span('stringlit_text')
+            return SpanToken('stringlit', source, start, end, vstart, vend)
+        elif kind == 'num':
+            return SpanToken('num', source, start, end, wsend, end)
+        elif kind == 'eq':
+            return SpanToken('eq', source, start, end, None, None)
+        else:
+            raise NotImplementedError('Unknown token kind: {}'.format(kind))
+
+#-----------------------------------------------------------------------
+
+class SkimmingIterator(ScanningIterator):
+    """Iterates over the Catch-related lexical elements only.
+
+    The syntactic analyzer of the Catch sources needs only the comments,
+    the Catch identifiers (see known_id) with their arguments, and the braces.
+    Other C++ code is skipped using the regex search. The string literals,
+    char literals, comments, and preprocessor directives are skipped
+    as a whole; hence, the braces inside them are not mistaken for
+    the block structure.
+
+    The arguments of the Catch macros are tokenized as by the ScanningIterator.
+    The skipped code after a comment is reported as one 'newline' token
+    so that the consecutive comments can be still recognized.
+    """
+
+    def rewind(self, startpos=0):
+        """Restarts the iteration over the (possibly reloaded) container.
+        """
+        ScanningIterator.rewind(self, startpos)
+        self.argdepth = None        # parenthesis level in macro arguments
+        self.after_comment = False  # the last token was a comment
+
+
+    def resumable(self):
+        """Checks whether the iteration started at the offset of the last token
+        returns the same tokens as this iterator.
+
+        It is true for the Catch identifier found when skimming the code,
+        not for the one inside the arguments of another Catch macro.
+        """
+        return self.argdepth == 0
+
+
+    def skipped_to(self, pos):
+        """Returns the separator token if code after the comment was skipped.
+        """
+        if self.after_comment:
+            self.after_comment = False
+            gap = self.source[self.pos:pos]
+            if gap.strip(' \t'):
+                start = self.pos
+                self.pos = pos
+                return SpanToken('newline', self.source, start, pos, pos, pos)
+        return None
+
+
+    def is_digit_separator(self, pos):
+        """Checks whether the quote at pos is inside a number like 1'000.
+        """
+        source = self.source
+        i = pos - 1
+        while i >= 0 and (source[i].isalnum() or source[i] in "'._"):
+            i -= 1
+        return pos > 0 and source[i + 1].isdigit()
+
+
+    def string_end(self, pos):
+        """Returns the end of the string literal with the dquote at pos.
+
+        Returns None when the literal is not closed.
+        """
+        source = self.source
+        if pos > 0 and source[pos - 1] == 'R':
+            # Possibly the raw string literal R"delimiter(...)delimiter".
+            m = self.rules.rawstring_rex.match(source, pos + 1)
+            if m:
+                closing = ')' + m.group(1) + '"'
+                end = source.find(closing, m.end())
+                return None if end < 0 else end + len(closing)
+
+        m = self.rules.string_rex.match(source, pos + 1)
+        return m.end() if m else None
+
+
+    def macro_argument(self):
+        """Returns the token from the arguments of the Catch macro.
+        """
+        token = ScanningIterator.__next__(self)
+        symbol = token[0]
+        if symbol == 'lpar':
+            self.argdepth += 1
+        elif symbol == 'rpar':
+            self.argdepth -= 1
+        elif symbol == 'newline' and self.argdepth > 0:
+            pass
+        elif self.argdepth == 0 or symbol in ('$', 'error'):
+            self.argdepth = None    # no arguments, back to skimming
+        if self.argdepth == 0:
+            self.argdepth = None    # arguments closed, back to skimming
+        return token
+
+
+    def __next__(self):
+        """Returns lexical tokens (symbol, value, lexem, extra_info).
+        """
+        if self.argdepth is not None:
+            return self.macro_argument()
+
+        if self.status != 0:
+            return ScanningIterator.__next__(self)
+
+        source = self.source
+        search = self.rules.skim_rex.search
+        pos = self.pos
+        while True:
+            m = search(source, pos)
+            if m is None:
+                # End of data. The spaces after the last token are not
+                # collected as the lexem of the end-of-data token here.
+                self.pos = self.srclen
+                self.status = 1000
+                return SpanToken('$', None, None, None, None, None)
+
+            start = m.start()
+            kind = m.lastgroup
+
+            if kind == 'dquote':
+                end = self.string_end(start)
+                if end is None:
+                    # Not closed. The scanning engine reports the error.
+                    separator = self.skipped_to(start)
+                    if separator:
+                        return separator
+                    self.pos = start
+                    return ScanningIterator.__next__(self)
+                pos = end
+
+            elif kind == 'squote':
+                m = None
+                if not self.is_digit_separator(start):
+                    m = self.rules.char_rex.match(source, start)
+                pos = m.end() if m else start + 1
+
+            elif kind == 'slash':
+                c = source[start + 1:start + 2]
+                if c not in ('/', '*'):
+                    pos = start + 1         # division operator
+                    continue
+                separator = self.skipped_to(start)
+                if separator:
+                    return separator
+                self.pos = start
+                token = ScanningIterator.__next__(self)
+                self.after_comment = token[0] in ('comment', 'story', 'feature')
+                return token
+
+            elif kind == 'hash':
+                linestart = source.rfind('\n', 0, start) + 1
+                if source[linestart:start].strip(' \t'):
+                    pos = start + 1         # not a preprocessor directive
+                else:
+                    pos = self.rules.directive_rex.match(source, start).end()
+
+            else:
+                separator = self.skipped_to(start)
+                if separator:
+                    return separator
+                end = m.end()
+                self.pos = end
+                if kind == 'keyword':
+                    self.argdepth = 0
+                    return SpanToken(known_id[m.group(kind)], source, start,
+                                     end, None, None)
+                return SpanToken(kind, source, start, end, None, None)
+
+#-----------------------------------------------------------------------
+
+# The lexical analysis engine used by the Container when not given
+# explicitly: 'scanner' for the ScanningIterator, 'fsa' for the Iterator
+# (the finite automaton processing the source char by char). The 'skim'
+# engine (the SkimmingIterator) is selected by the syntactic analyzer.
+defaultEngine = 'scanner'
+
+engines = {
+    'fsa':      Iterator,
+    'scanner':  ScanningIterator,
+    'skim':     SkimmingIterator,
+}
+
+#-----------------------------------------------------------------------
+
 class Container:
     """Iterable container for lexical parsing of the Catch-test source.
 
-    The source is passed as a multiline string.
+    The source is passed as a multiline string, or as an open file. The engine
+    is the key to the engines dictionary; the defaultEngine is used when
+    not given.
+
+    The file is read whole. The engines match the regular expressions
+    at the offsets in the source, the tokens refer to the spans of it,
+    and the positions are computed from it (see lineindex); hence,
+    the source text is kept in the memory -- unlike the lines
+    of the .feature file (see felex.Container).
     """
 
-    def __init__(self, source):
+    def __init__(self, source, engine=None):
+        self.engine = engine
+        self.reset(source)
+
+
+    def reset(self, source):
+        """Replaces the source. New iterators will process the new source.
+        """
+        self.index = None       # LineIndex built when needed
         if hasattr(source, 'read'):
             # It is a file object opened for reading lines in text mode.
             self.source = source.read()
@@ -491,8 +1017,28 @@ class Container:
             self.source_name = '<str>'
 
 
+    def lineindex(self):
+        """Returns the LineIndex of the source; built on the first use.
+        """
+        if self.index is None:
+            self.index = LineIndex(self.source)
+        return self.index
+
+
+    def position(self, offset):
+        """Returns (line, column) of the offset in the source.
+        """
+        return self.lineindex().position(offset)
+
+
+    def iterator(self, startpos=0):
+        """Returns the iterator of the engine that starts at the offset.
+        """
+        return engines[self.engine or defaultEngine](self, startpos)
+
+
     def __iter__(self):
-        return Iterator(self, 0)
+        return self.iterator(0)
 
 
 #-----------------------------------------------------------------------
@@ -0,0 +1,253 @@
+#!python3
+"""Comparing the syntax trees from the feature description and from the Catch source.
+
+    import treediff
+    changes = treediff.diff(feature_tree, catch_tree)
+    for change in changes:
+        print(change)
+
+    python treediff.py features/x.feature tests/x.cpp [--json]
+
+Both trees are normalized first. The and_given, and_when, and and_then items
+are compared as given, when, and then -- the nesting already says that
+the step follows the previous one, and the Catch source may express it
+differently than the feature description (GIVEN inside GIVEN, AND_WHEN,
+...). The whitespace in the identifiers is collapsed, the description
+is compared as the non-empty stripped lines.
+
+Each normalized item gets the Merkle-style digest of its subtree (the kind,
+the text, and the digests of the children). The equal subtrees have equal
+digests; hence, the identical scenarios are skipped without visiting
+their steps. The sibling items are paired by the equal digests first,
+then by the equal kind and text (the changed content), and then
+by the equal kind and the equal children (the renamed item). The unpaired
+items are reported as removed (only in the left tree) or added (only
+in the right tree). The pairs that are not in the longest common order
+are reported as reordered.
+
+The exit status of the command is 0 for the equal trees, 1 for the changes,
+and 2 when a file cannot be compared (it cannot be read or parsed).
+"""
+
+import argparse
+import bisect
+import collections
+import hashlib
+import json
+import sys
+
+import parsecache
+
+from syntree import Kind, symbol_of
+
+
+# The kinds compared as the same kind.
+normal_kinds = {
+    Kind.AND_GIVEN: Kind.GIVEN,
+    Kind.AND_WHEN: Kind.WHEN,
+    Kind.AND_THEN: Kind.THEN,
+}
+
+
+class Item:
+    """The normalized syntax tree item with the digests.
+
+    The body is the digest of the children only; the digest covers also
+    the kind and the text. The node is the original one (for its span).
+    """
+
+    __slots__ = ('kind', 'text', 'children', 'body', 'digest', 'node')
+
+    def __init__(self, node):
+        self.node = node
+        self.kind = normal_kinds.get(node.kind, node.kind)
+        if node.kind == Kind.DESCRIPTION:
+            self.text = '\n'.join(' '.join(line.split())
+                                  for line in node.children if line.strip())
+            self.children = []
+        else:
+            self.text = ' '.join((node.text or '').split())
+            self.children = normalize(node.children or [])
+
+        h = hashlib.sha1()
+        for child in self.children:
+            h.update(child.digest)
+        self.body = h.digest()
+
+        h = hashlib.sha1(bytes([self.kind]))
+        h.update(self.body)
+        h.update(self.text.encode('utf-8'))
+        self.digest = h.digest()
+
+
+def normalize(tree):
+    """Returns the list of the normalized items of the tree.
+    """
+    return [Item(node) for node in tree]
+
+
+def digest(tree):
+    """Returns the hex digest of the whole normalized tree.
+
+    The equal digests of two trees mean no differences.
+    """
+    h = hashlib.sha1()
+    for item in normalize(tree):
+        h.update(item.digest)
+    return h.hexdigest()
+
+#-----------------------------------------------------------------------
+
+class Change(collections.namedtuple('Change', ['op', 'symbol', 'path',
+                                               'left', 'right',
+                                               'left_start', 'right_start'])):
+    """One difference between the trees.
+
+    The op is 'added', 'removed', 'renamed', 'changed' (the description),
+    or 'reordered'. The symbol is the normalized kind of the item, the path
+    is the tuple of the texts of the enclosing items (in the left tree).
+    The left and right are the texts of the item (None when missing),
+    the left_start and right_start are the starts of their spans.
+    """
+
+    def __str__(self):
+        where = ''.join(' in {!r}'.format(text) for text in reversed(self.path))
+        if self.op == 'added':
+            what = '{!r}'.format(self.right)
+        elif self.op in ('renamed', 'changed'):
+            what = '{!r} --> {!r}'.format(self.left, self.right)
+        else:
+            what = '{!r}'.format(self.left)
+        return '{} {} {}{}'.format(self.op, self.symbol, what, where)
+
+
+def change(op, path, left, right):
+    """Returns the Change for the items (either may be None).
+    """
+    item = left if left is not None else right
+    return Change(op, symbol_of[item.kind], path,
+                  left.text if left is not None else None,
+                  right.text if right is not None else None,
+                  left.node.start if left is not None else None,
+                  right.node.start if right is not None else None)
+
+
+# Keys for pairing the sibling items; the first pass pairs the identical ones.
+pairing_keys = (
+    lambda item: item.digest,
+    lambda item: (item.kind, item.text),
+    lambda item: (item.kind, item.body),
+)
+
+
+def diff_items(left, right, path, changes):
+    """Appends the changes between the lists of the sibling items.
+    """
+    if len(left) == len(right) and \
+       all(a.digest == b.digest for a, b in zip(left, right)):
+        return
+
+    pair_of = [None] * len(left)        # left index --> right index
+    paired = [False] * len(right)
+    for key in pairing_keys:
+        candidates = collections.defaultdict(collections.deque)
+        for j, b in enumerate(right):
+            if not paired[j]:
+                candidates[key(b)].append(j)
+        if not candidates:
+            break
+        for i, a in enumerate(left):
+            if pair_of[i] is None:
+                queue = candidates.get(key(a))
+                if queue:
+                    j = queue.popleft()
+                    pair_of[i] = j
+                    paired[j] = True
+
+    in_order = longest_increasing(pair_of)
+    for i, a in enumerate(left):
+        j = pair_of[i]
+        if j is None:
+            changes.append(change('removed', path, a, None))
+            continue
+        b = right[j]
+        if a.digest == b.digest and i in in_order:
+            continue
+        if i not in in_order:
+            changes.append(change('reordered', path, a, b))
+        if a.text != b.text:
+            op = 'changed' if a.kind == Kind.DESCRIPTION else 'renamed'
+            changes.append(change(op, path, a, b))
+        if a.body != b.body:
+            diff_items(a.children, b.children, path + (a.text,), changes)
+
+    for j, b in enumerate(right):
+        if not paired[j]:
+            changes.append(change('added', path, None, b))
+
+
+def longest_increasing(indices):
+    """Returns the set of positions of the longest increasing subsequence.
+
+    The None values are skipped.
+    """
+    tails = []          # the smallest tail values of the subsequences
+    tail_pos = []       # and their positions
+    prev = {}           # position --> the previous position
+    for pos, value in enumerate(indices):
+        if value is None:
+            continue
+        k = bisect.bisect_left(tails, value)
+        prev[pos] = tail_pos[k - 1] if k > 0 else None
+        if k == len(tails):
+            tails.append(value)
+            tail_pos.append(pos)
+        else:
+            tails[k] = value
+            tail_pos[k] = pos
+
+    result = set()
+    pos = tail_pos[-1] if tail_pos else None
+    while pos is not None:
+        result.add(pos)
+        pos = prev[pos]
+    return result
+
+
+def diff(left_tree, right_tree):
+    """Returns the list of the Change objects between the syntax trees.
+
+    The empty list means the trees are equal after the normalization.
+    """
+    changes = []
+    diff_items(normalize(left_tree), normalize(right_tree), (), changes)
+    return changes
+
+
+def diff_files(left_path, right_path):
+    """Returns the changes between the files (.feature or Catch sources).
+    """
+    return diff(parsecache.parse(left_path), parsecache.parse(right_path))
+
+#-----------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compares the syntax trees of the .feature and Catch sources.')
+    parser.add_argument('left', help='.feature file or Catch source')
+    parser.add_argument('right', help='.feature file or Catch source')
+    parser.add_argument('--json', action='store_true',
+                        help='print the changes as the JSON list')
+    args = parser.parse_args()
+
+    try:
+        changes = diff_files(args.left, args.right)
+    except Exception as e:
+        print('{}: {}'.format(type(e).__name__, e), file=sys.stderr)
+        sys.exit(2)
+    if args.json:
+        print(json.dumps([c._asdict() for c in changes], indent=2))
+    else:
+        for c in changes:
+            print(c)
+    sys.exit(1 if changes else 0)
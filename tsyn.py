@@ -3,6 +3,13 @@
 
 The methods of the SyntacticAnalyzerForCatch class that start with
 a capital letter do implement recursive parsing of the related nonterminal.
+The repetitions are implemented as loops; only the nesting of the blocks
+in curly braces uses the call stack, and its depth is limited by max_depth.
+
+In the recovery mode (recover=True), the syntax error does not stop
+the analysis. It is recorded in the diagnostics list, and the analysis
+continues behind the rbrace that closes the broken top-level item,
+or from the next SCENARIO or TEST_CASE.
 """
 
 import re
@@ -10,19 +17,29 @@ import sys
 import tlex
 import textwrap
 
-class SyntacticAnalyzerForCatch:
+from diagnostic import Diagnostic, ParseError
 
-    def __init__(self, source):
-        self.source = source
+from syntree import Kind, Node, kind_of
 
-        self.lextoken = None
-        self.sym = None
-        self.value = None
-        self.lexem = None
-        self.lexextra_info = None
+class SyntacticAnalyzerForCatch:
 
-        self.it = iter(tlex.Container(self.source))
-        self.syntax_tree = []   # syntax tree as the list of tuples with lists...
+    def __init__(self, source, engine='skim', max_depth=100, recover=False,
+                 start=0):
+        self.source = source
+        self.max_depth = max_depth  # of the nested blocks in {}
+        self.depth = 0
+        self.recover = recover      # collect the errors instead of raising
+        self.diagnostics = []       # of the errors in the recovery mode
+
+        self.lextoken = None    # (symbol, value, lexem, extra_info)
+        self.sym = None         # symbol like 'scenario'
+
+        # The skimming lexer skips the C++ code that is not related to Catch.
+        # The analysis may start at the offset of a top-level item
+        # (see the incremental module).
+        self.it = tlex.Container(self.source, engine).iterator(start)
+        self.syntax_tree = []   # syntax tree as the list of syntree.Node
+                                # (only the pending items in iter_items())
         self.lex()              # prepare the very first token
 
 
@@ -31,44 +48,163 @@ class SyntacticAnalyzerForCatch:
         """
         try:
             self.lextoken = next(self.it)
-            self.sym, self.value, self.lexem, self.lexextra_info = self.lextoken
+            self.sym = self.lextoken[0]
         except StopIteration:
             pass
 
 
+    # The value and the lexem are taken from the token only when used.
+    # Most of the tokens are skipped, and the lexer creates the strings lazily.
+    @property
+    def value(self):
+        return self.lextoken[1]
+
+
+    @property
+    def lexem(self):
+        return self.lextoken[2]
+
+
+    @property
+    def lexextra_info(self):
+        return self.lextoken[3]
+
+
+    def error(self, expected_symbols, msg):
+        """Raises the ParseError with the diagnostic for the current token.
+
+        The msg is the format with the placeholders for the source name,
+        the line, and the column. The symbol and the value are appended.
+        """
+        line_no, column = self.it.position(self.lextoken)
+        source_name = self.it.source_name
+        msg = msg.format(source_name, line_no, column)
+        msg += '{!r}, {!r}\n'.format(self.sym, self.value)
+        raise ParseError(Diagnostic(source_name, line_no, column,
+                                    expected_symbols, self.sym, self.value, msg))
+
+
+    def recover_from(self, diagnostic):
+        """Records the diagnostic and skips to the next top-level item.
+
+        Used only in the recovery mode. The partially parsed item stays
+        in the syntax tree.
+        """
+        self.diagnostics.append(diagnostic)
+        self.synchronize()
+
+
+    def synchronize(self):
+        """Skips the tokens up to the end of the current top-level item.
+
+        The item ends with the rbrace that closes its block, or just before
+        the next SCENARIO or TEST_CASE (when the braces do not match).
+        """
+        while self.sym not in ('test_case', 'scenario', '$'):
+            if self.sym == 'lbrace':
+                self.depth += 1
+            elif self.sym == 'rbrace':
+                self.depth -= 1
+                if self.depth <= 0:
+                    self.lex()          # the block of the item closed
+                    break
+            self.lex()
+        self.depth = 0
+
+
     def expect(self, *expected_symbols):
         """Checks the symbol and gets the next one or reports error.
         """
         if self.sym in expected_symbols:
             self.lex()
         else:
-            line_no = self.it.lineno
-            source_name = self.it.source_name
-            msg = 'Expected symbol(s): {}\n'.format(expected_symbols)
-            msg += ('Unexpected content in {!r} at line {}:\n'
-                    '{!r}, {!r}\n').format(
-                        source_name, line_no, self.sym, self.value)
-            raise RuntimeError(msg)
+            self.error(expected_symbols,
+                       'Expected symbol(s): {}\n'.format(expected_symbols)
+                       + 'Unexpected content in {!r} at line {}, column {}:\n')
+
+
+    def open_block(self):
+        """Expects the left brace and checks the nesting depth.
+        """
+        if self.depth >= self.max_depth:
+            self.error((), 'Nesting deeper than {} levels in '.format(
+                                self.max_depth)
+                            + '{!r} at line {}, column {}:\n')
+        self.expect('lbrace')
+        self.depth += 1
+
+
+    def close_block(self):
+        """Expects the right brace of the block.
+
+        Returns the offset behind the brace (the end of the block).
+        """
+        end = self.it.offset(self.lextoken) + 1
+        self.expect('rbrace')
+        self.depth -= 1
+        return end
+
+
+    def token_end(self):
+        """Returns the offset behind the lexem of the current token.
+        """
+        return self.it.offset(self.lextoken) + len(self.lexem.lstrip(' \t'))
+
+
+    def node(self):
+        """Returns the node for the current token (without the text yet).
+        """
+        return Node(kind_of[self.sym], None, [], self.it.offset(self.lextoken))
 
 
     #-------------------------------------------------------------------------
     def Start(self):
         """Implements the start nonterminal.
+
+        In the recovery mode, the (possibly partial) tree is returned
+        also for the broken source. See the diagnostics for the problems.
         """
-        self.Feature_or_story()
-        self.Test_case_or_scenario_serie()
-        self.expect('$')
+        self.syntax_tree = list(self.iter_items())
         return self.syntax_tree
 
 
+    def iter_items(self):
+        """Generates the top-level items of the syntax tree as they are parsed.
+
+        The story/feature item and the description come first, then each
+        test case or scenario as soon as its subtree is complete. The analyzer
+        does not keep the generated items; hence, the memory of the tree
+        is bounded by the biggest item. However, the whole source text
+        is kept in the memory (see tlex.Container).
+        """
+        self.Feature_or_story()
+        yield from self.pending_items()
+        while True:
+            yield from self.Test_case_or_scenario_serie()
+            try:
+                self.expect('$')
+                break
+            except ParseError as e:
+                if not self.recover:
+                    raise
+                self.recover_from(e.diagnostic)
+
+
+    def pending_items(self):
+        """Returns the completed top-level items, and forgets them.
+        """
+        items = self.syntax_tree
+        self.syntax_tree = []
+        return items
+
+
     def Ignored_symbols(self):
         """Nonterminal for the sequence of zero or more 'newline' or 'line' tokens.
         """
-        if self.sym in ('comment', 'hash', 'identifier', 'newline',
-                        'stringlit', 'lpar', 'rpar', 'semic', 'assignment',
-                        'num', 'colon'):
+        while self.sym in ('comment', 'hash', 'identifier', 'newline',
+                           'stringlit', 'lpar', 'rpar', 'semic', 'assignment',
+                           'num', 'colon'):
             self.lex()
-            self.Ignored_symbols()
 
 
     #-------------------------------------------------------------------------
@@ -77,35 +213,53 @@ class SyntacticAnalyzerForCatch:
         """
         self.Ignored_symbols()
         if self.sym in ('story', 'feature'):
-            self.syntax_tree.append( (self.sym, self.value) )
+            node = self.node()
+            node.text = self.value
+            node.children = None       # no body, only the description
+            node.end = self.token_end()
+            self.syntax_tree.append(node)
             self.lex()
+            start = self.it.offset(self.lextoken)
             comment_lst = []
-            self.Comments(comment_lst)
+            end = self.Comments(comment_lst)
             if comment_lst:
                 while comment_lst[0] == '':
                     del comment_lst[0]
-                self.syntax_tree.append( ('description', comment_lst) )
+                self.syntax_tree.append(Node(Kind.DESCRIPTION, None,
+                                             comment_lst, start, end))
 
 
     def Comments(self, comment_lst):
         """Nonterminal for collecting the content of comments.
+
+        Returns the offset behind the last comment.
         """
-        if self.sym == 'comment':
+        end = None
+        while self.sym == 'comment':
             comment_lst.append(self.value)
+            end = self.token_end()
             self.lex()
-            self.Comments(comment_lst)
+        return end
 
 
     def Test_case_or_scenario_serie(self):
         """Nonterminal for a serie of test cases or scenarios.
+
+        Generates the items as they are completed.
         """
         self.Ignored_symbols()
-        if self.sym == 'test_case':
-            self.Test_case()
-            self.Test_case_or_scenario_serie()
-        elif self.sym == 'scenario':
-            self.Scenario()
-            self.Test_case_or_scenario_serie()
+        while self.sym in ('test_case', 'scenario'):
+            try:
+                if self.sym == 'test_case':
+                    self.Test_case()
+                else:
+                    self.Scenario()
+            except ParseError as e:
+                if not self.recover:
+                    raise
+                self.recover_from(e.diagnostic)
+            self.Ignored_symbols()      # the next item is known when yielding
+            yield from self.pending_items()
 
 
     #-------------------------------------------------------------------------
@@ -113,12 +267,12 @@ class SyntacticAnalyzerForCatch:
         """Nonterminal for one TEST_CASE.
         """
         assert self.sym == 'test_case'
-        item = [self.sym]               # first element of the item = symbol
+        node = self.node()              # symbol and the start
 
         self.lex()
         self.expect('lpar')
         if self.sym == 'stringlit':
-            item.append(self.value)     # second element = test identification
+            node.text = self.value      # test identification
             self.lex()
         else:
             self.expect('stringlit')
@@ -130,17 +284,14 @@ class SyntacticAnalyzerForCatch:
                 raise NotImplementedError('syntax tree for tags not implemented')
                 self.lex()
             else:
-                expect('stringlit')
+                self.expect('stringlit')
         self.expect('rpar')
-        self.expect('lbrace')
-
-        # Collect the subree of the test_case body.
-        bodylst = []
-        item.append(bodylst)            # third element of the item = subtree
+        self.open_block()
 
-        # Append the test case item to the syntax tree. The bodylst will be
-        # filled later.
-        self.syntax_tree.append(tuple(item))
+        # Append the test case node to the syntax tree. Its children
+        # (the subtree of the body) will be filled later.
+        bodylst = node.children
+        self.syntax_tree.append(node)
 
         # Skip the other lines -- 'section' expected.
         self.Ignored_symbols()
@@ -150,57 +301,53 @@ class SyntacticAnalyzerForCatch:
             self.Block_of_code()
 
         self.Ignored_symbols()
-        self.expect('rbrace')
+        node.end = self.close_block()
 
 
     def Section_serie(self, upperlst):
         """Nonterminal for any other code between the {}.
         """
         self.Ignored_symbols()
-        if self.sym == 'section':
+        while self.sym == 'section':
             self.Section(upperlst)
             self.Ignored_symbols()
-            self.Section_serie(upperlst)
 
 
     def Section(self, upperlst):
         """Nonterminal for SECTION
         """
         assert self.sym == 'section'
-        item = [self.sym]               # first element with the symbol
+        node = self.node()              # symbol and the start
         self.lex()
         self.expect('lpar')
         if self.sym == 'stringlit':
-            item.append(self.value)     # second element with the value
+            node.text = self.value      # the value
             self.lex()
         else:
             self.expect('stringlit')
 
         self.expect('rpar')
-        self.expect('lbrace')
-
-        bodylst = []
-        item.append(bodylst)            # third element with the subtree
+        self.open_block()
 
         # Simplified implementation. The sections are not expected to be nested.
         # Just skip the other lines.
         self.Ignored_symbols()
-        self.expect('rbrace')
+        node.end = self.close_block()
 
         # Output the previously collected symbol, identifier, and body
         # of the section into the syntaxt tree.
-        upperlst.append(tuple(item))
+        upperlst.append(node)
 
     #-------------------------------------------------------------------------
     def Scenario(self):
         """Nonterminal for one SCENARIO.
         """
         assert self.sym == 'scenario'
-        item = [self.sym]               # first element with the symbol
+        node = self.node()              # symbol and the start
         self.lex()
         self.expect('lpar')
         if self.sym == 'stringlit':
-            item.append(self.value)     # second element with the value
+            node.text = self.value      # the value
             self.lex()
         else:
             self.expect('stringlit')
@@ -212,184 +359,183 @@ class SyntacticAnalyzerForCatch:
                 raise NotImplementedError('syntax tree for tags not implemented')
                 self.lex()
             else:
-                expect('stringlit')
+                self.expect('stringlit')
         self.expect('rpar')
-        self.expect('lbrace')
+        self.open_block()
 
-        bodylst = []
-        item.append(bodylst)            # third element with the subtree
-
-        # Append the scenario item to the syntax tree. The bodylst will be
-        # filled later.
-        self.syntax_tree.append(tuple(item))
+        # Append the scenario node to the syntax tree. Its children
+        # will be filled later.
+        bodylst = node.children
+        self.syntax_tree.append(node)
 
         # Skip the other lines -- 'given' expected.
         self.Ignored_symbols()
         if self.sym == 'given':
             self.Given_serie(bodylst)
         elif self.sym == 'lbrace':
-            print('block')
             self.Block_of_code()
 
         self.Ignored_symbols()
-        self.expect('rbrace')
+        node.end = self.close_block()
 
     #-------------------------------------------------------------------------
     def Given_serie(self, upperlst):
         """Zero or more GIVEN items (at the same level).
         """
-        self.Ignored_symbols()      # neccessary for the recursion
-        if self.sym == 'given':
+        self.Ignored_symbols()
+        while self.sym == 'given':
             self.Given(upperlst)
-            self.Given_serie(upperlst)
+            self.Ignored_symbols()
 
 
     def Given(self, upperlst):
         """Nonterminal for one GIVEN definition.
         """
         assert self.sym == 'given'
-        item = [self.sym]               # first element with the symbol
+        node = self.node()              # symbol and the start
         self.lex()
         self.expect('lpar')
         if self.sym == 'stringlit':
-            item.append(self.value)     # second element with the identifier
+            node.text = self.value      # the identifier
             self.lex()
         else:
             self.expect('stringlit')
 
         self.expect('rpar')
-        self.expect('lbrace')
+        self.open_block()
 
-        bodylst = []
-        item.append(bodylst)            # third element with the subtree
-
-        # Append the item to the upperlst. The bodylst will be filled by
+        # Append the node to the upperlst. Its children will be filled by
         # the syntax subtree later.
-        upperlst.append(tuple(item))
+        bodylst = node.children
+        upperlst.append(node)
 
         # Skip the other lines, and process the nested items.
+        # More nested items are the sections run one by one (like
+        # in the merged scenarios).
         self.Ignored_symbols()
-        if self.sym == 'when':
-            self.When_serie(bodylst)    # nested to the given
-        elif self.sym == 'given':
-            self.sym = 'and_given'      # symbol transformation
-            self.And_given(bodylst)     # nested to the given
+        while self.sym in ('when', 'given'):
+            if self.sym == 'when':
+                self.When_serie(bodylst)    # nested to the given
+            else:
+                self.sym = 'and_given'      # symbol transformation
+                self.And_given(bodylst)     # nested to the given
+            self.Ignored_symbols()
 
         self.Ignored_symbols()
-        self.expect('rbrace')
+        node.end = self.close_block()
 
 
     def And_given(self, upperlst):
         """Nonterminal for one AND_GIVEN definition -- always nested.
         """
         assert self.sym == 'and_given'
-        item = [self.sym]               # first element with the symbol
+        node = self.node()              # symbol and the start
         self.lex()
         self.expect('lpar')
         if self.sym == 'stringlit':
-            item.append(self.value)     # second element with the identifier
+            node.text = self.value      # the identifier
             self.lex()
         else:
             self.expect('stringlit')
 
         self.expect('rpar')
-        self.expect('lbrace')
+        self.open_block()
 
-        bodylst = []
-        item.append(bodylst)            # third element with the subtree
-
-        # Append the item to the upperlst. The bodylst will be filled by
+        # Append the node to the upperlst. Its children will be filled by
         # the syntax subtree later.
-        upperlst.append(tuple(item))
+        bodylst = node.children
+        upperlst.append(node)
 
         # Skip the other lines, and process the nested items.
         self.Ignored_symbols()
-        if self.sym == 'when':
-            self.When_serie(bodylst)    # nested to the and_given
-        elif self.sym == 'given':       # Catch does not know AND_GIVEN
-            self.sym = 'and_given'      # symbol transformation
-            self.And_given(bodylst)     # nested to this and_given
+        while self.sym in ('when', 'given'):
+            if self.sym == 'when':
+                self.When_serie(bodylst)    # nested to the and_given
+            else:                           # Catch does not know AND_GIVEN
+                self.sym = 'and_given'      # symbol transformation
+                self.And_given(bodylst)     # nested to this and_given
+            self.Ignored_symbols()
 
         self.Ignored_symbols()
-        self.expect('rbrace')
+        node.end = self.close_block()
 
 
     #-------------------------------------------------------------------------
     def When_serie(self, upperlst):
         """Nonterminal for a serie of WHEN definitions.
         """
-        self.Ignored_symbols()              # neccessary for the recursion
-        if self.sym == 'when':
+        self.Ignored_symbols()
+        while self.sym == 'when':
             self.When(upperlst)
-            self.When_serie(upperlst)
+            self.Ignored_symbols()
 
 
     def When(self, upperlst):
         """Nonterminal for one WHEN definition.
         """
         assert self.sym == 'when'
-        item = [self.sym]               # first element with the symbol
+        node = self.node()              # symbol and the start
         self.lex()
         self.expect('lpar')
         if self.sym == 'stringlit':
-            item.append(self.value)     # second element with the identifier
+            node.text = self.value      # the identifier
             self.lex()
         else:
             self.expect('stringlit')
 
         self.expect('rpar')
-        self.expect('lbrace')
+        self.open_block()
 
-        bodylst = []
-        item.append(bodylst)            # third element with the subtree
-
-        # Append the item to the upperlst. The bodylst will be filled by
+        # Append the node to the upperlst. Its children will be filled by
         # the syntax subtree later.
-        upperlst.append(tuple(item))
+        bodylst = node.children
+        upperlst.append(node)
 
         # Skip the other lines, and process the nested items.
         self.Ignored_symbols()
-        if self.sym == 'then':
-            self.Then(bodylst)          # nested
-        elif self.sym == 'and_when':
-            self.And_when(bodylst)      # nested to this when
+        while self.sym in ('then', 'and_when'):
+            if self.sym == 'then':
+                self.Then(bodylst)          # nested
+            else:
+                self.And_when(bodylst)      # nested to this when
+            self.Ignored_symbols()
 
         self.Ignored_symbols()
-        self.expect('rbrace')
+        node.end = self.close_block()
 
 
     def And_when(self, upperlst):
         """Nonterminal for one AND_WHEN definition.
         """
         assert self.sym == 'and_when'
-        item = [self.sym]               # first element with the symbol
+        node = self.node()              # symbol and the start
         self.lex()
         self.expect('lpar')
         if self.sym == 'stringlit':
-            item.append(self.value)     # second element with the identifier
+            node.text = self.value      # the identifier
             self.lex()
         else:
             self.expect('stringlit')
 
         self.expect('rpar')
-        self.expect('lbrace')
-
-        bodylst = []
-        item.append(bodylst)            # third element with the subtree
+        self.open_block()
 
-        # Append the item to the upperlst. The bodylst will be filled by
+        # Append the node to the upperlst. Its children will be filled by
         # the syntax subtree later.
-        upperlst.append(tuple(item))
+        bodylst = node.children
+        upperlst.append(node)
 
         # Skip the other lines, and process the nested items.
         self.Ignored_symbols()
-        if self.sym == 'then':
-            self.Then(bodylst)          # nested
-        elif self.sym == 'and_when':
-            self.And_when(bodylst)      # nested to this and_when
+        while self.sym in ('then', 'and_when'):
+            if self.sym == 'then':
+                self.Then(bodylst)          # nested
+            else:
+                self.And_when(bodylst)      # nested to this and_when
+            self.Ignored_symbols()
 
         self.Ignored_symbols()
-        self.expect('rbrace')
+        node.end = self.close_block()
 
 
     #-------------------------------------------------------------------------
@@ -397,76 +543,73 @@ class SyntacticAnalyzerForCatch:
         """Nonterminal for one THEN definition.
         """
         assert self.sym == 'then'
-        item = [self.sym]               # first element with the symbol
+        node = self.node()              # symbol and the start
         self.lex()
         self.expect('lpar')
         if self.sym == 'stringlit':
-            item.append(self.value)     # second element with the identifier
+            node.text = self.value      # the identifier
             self.lex()
         else:
             self.expect('stringlit')
 
         self.expect('rpar')
-        self.expect('lbrace')
-
-        bodylst = []
-        item.append(bodylst)            # third element with the subtree
+        self.open_block()
 
-        # Append the item to the upperlst. The bodylst will be filled by
+        # Append the node to the upperlst. Its children will be filled by
         # the syntax subtree later.
-        upperlst.append(tuple(item))
+        bodylst = node.children
+        upperlst.append(node)
 
         # Skip the other lines, and process the nested items.
         self.Ignored_symbols()
-        if self.sym == 'and_then':
+        while self.sym == 'and_then':
             self.And_then(bodylst)      # nested to the previous then-item
+            self.Ignored_symbols()
 
         self.Ignored_symbols()
-        self.expect('rbrace')
+        node.end = self.close_block()
 
 
     def And_then(self, upperlst):
         """Nonterminal for one AND_THEN definition.
         """
         assert self.sym == 'and_then'
-        item = [self.sym]               # first element with the symbol
+        node = self.node()              # symbol and the start
         self.lex()
         self.expect('lpar')
         if self.sym == 'stringlit':
-            item.append(self.value)     # second element with the identifier
+            node.text = self.value      # the identifier
             self.lex()
         else:
             self.expect('stringlit')
 
         self.expect('rpar')
-        self.expect('lbrace')
-
-        bodylst = []
-        item.append(bodylst)            # third element with the subtree
+        self.open_block()
 
-        # Append the item to the upperlst. The bodylst will be filled by
+        # Append the node to the upperlst. Its children will be filled by
         # the syntax subtree later.
-        upperlst.append(tuple(item))
+        bodylst = node.children
+        upperlst.append(node)
 
         # Skip the other lines, and process the nested items.
         self.Ignored_symbols()
-        if self.sym == 'and_then':
+        while self.sym == 'and_then':
             self.And_then(bodylst)      # nested to the previous then-item
+            self.Ignored_symbols()
 
         self.Ignored_symbols()
-        self.expect('rbrace')
+        node.end = self.close_block()
 
     #-------------------------------------------------------------------------
     def Block_of_code(self):
         """C/C++ block of code in curly braces -- or sequence of block or nested.
         """
-        if self.sym == 'lbrace':
-            self.expect('lbrace')
+        while self.sym == 'lbrace':
+            self.open_block()
             self.Ignored_symbols()
             self.Block_of_code()        # nested
-            self.expect('rbrace')
+            self.close_block()
             self.Ignored_symbols()
-            self.Block_of_code()        # sequence
 
 #-----------------------------------------------------------------------
 
@@ -0,0 +1,197 @@
+#!python3
+"""Watching the directories for the changed source files.
+
+The InotifyWatcher uses the Linux inotify (via ctypes; no other package
+is needed). The PollingWatcher compares the size and the mtime of the files
+periodically; it is used where the inotify is not available. Both have
+the same interface: the wait(timeout) returns the set of the changed
+(created, modified, removed) files matching the patterns, possibly empty
+after the timeout.
+"""
+
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import select
+import struct
+import sys
+import time
+
+
+def matches(fname, patterns):
+    return any(fnmatch.fnmatch(fname, pat) for pat in patterns)
+
+
+class PollingWatcher:
+    """Watcher that compares the snapshots of the directories.
+    """
+
+    def __init__(self, dirs, patterns, interval=0.5):
+        self.dirs = [os.path.abspath(d) for d in dirs]
+        self.patterns = patterns
+        self.interval = interval
+        self.snapshot = self.scan()
+
+
+    def scan(self):
+        """Returns the dictionary path --> (size, mtime_ns) of the files.
+        """
+        snapshot = {}
+        for d in self.dirs:
+            try:
+                names = os.listdir(d)
+            except OSError:
+                continue
+            for name in names:
+                if matches(name, self.patterns):
+                    path = os.path.join(d, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue        # removed meanwhile
+                    snapshot[path] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+
+    def wait(self, timeout=None):
+        """Returns the set of the changed files; waits for them up to timeout.
+
+        The None timeout means waiting until something changes.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            delay = self.interval
+            if deadline is not None:
+                delay = min(delay, max(0, deadline - time.monotonic()))
+            time.sleep(delay)
+
+            snapshot = self.scan()
+            changed = {path for path in snapshot.keys() | self.snapshot.keys()
+                       if snapshot.get(path) != self.snapshot.get(path)}
+            self.snapshot = snapshot
+            if changed or (deadline is not None
+                           and time.monotonic() >= deadline):
+                return changed
+
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Watcher using the Linux inotify.
+
+    Raises OSError when the inotify is not available.
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM  = 0x00000040
+    IN_MOVED_TO    = 0x00000080
+    IN_CREATE      = 0x00000100
+    IN_DELETE      = 0x00000200
+    mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    header = struct.Struct('iIII')      # wd, mask, cookie, len
+
+    def __init__(self, dirs, patterns):
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify is available only on Linux')
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+        self.patterns = patterns
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        self.dirs = {}      # watch descriptor --> directory
+        for d in dirs:
+            d = os.path.abspath(d)
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(d), self.mask)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(errno, 'inotify_add_watch failed', d)
+            self.dirs[wd] = d
+
+
+    def wait(self, timeout=None):
+        """Returns the set of the changed files; waits for them up to timeout.
+
+        The None timeout means waiting until something changes.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0, deadline - time.monotonic())
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            changed = self.read_events() if readable else set()
+            if changed or (deadline is not None
+                           and time.monotonic() >= deadline):
+                return changed
+
+
+    def read_events(self):
+        """Returns the set of the files from the pending events.
+        """
+        changed = set()
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return changed
+        pos = 0
+        while pos + self.header.size <= len(data):
+            wd, mask, cookie, length = self.header.unpack_from(data, pos)
+            pos += self.header.size
+            name = os.fsdecode(data[pos:pos + length].rstrip(b'\0'))
+            pos += length
+            if name and wd in self.dirs and matches(name, self.patterns):
+                changed.add(os.path.join(self.dirs[wd], name))
+        return changed
+
+
+    def close(self):
+        os.close(self.fd)
+
+
+def make_watcher(dirs, patterns, interval=0.5):
+    """Returns the InotifyWatcher if possible, the PollingWatcher otherwise.
+    """
+    try:
+        return InotifyWatcher(dirs, patterns)
+    except (OSError, AttributeError):
+        return PollingWatcher(dirs, patterns, interval)
+
+
+def debounced(watcher, delay=0.05):
+    """Generates the sets of the changed files, one set per burst of changes.
+
+    The burst ends when nothing changes for the delay seconds. Editors
+    often save the file in more steps; it is converted only once.
+    """
+    while True:
+        changed = watcher.wait()
+        if not changed:
+            continue
+        while True:
+            more = watcher.wait(delay)
+            if not more:
+                break
+            changed |= more
+        yield changed
+
+
+def run(dirs, patterns, on_change, delay=0.05):
+    """Calls on_change(sorted_paths) for each burst of changes until Ctrl+C.
+    """
+    watcher = make_watcher(dirs, patterns)
+    print('Watching', ', '.join(dirs), '({}) -- Ctrl+C to stop.'.format(
+          type(watcher).__name__))
+    try:
+        for changed in debounced(watcher, delay):
+            on_change(sorted(changed))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()